@@ -2,46 +2,20 @@ import threading
 from pathlib import Path
 import typer
 import logging
-from typing import Optional
-import uvicorn
-import requests
-import time
+from typing import Dict, List, Optional
 import sys
 import signal
 import shutil
-import subprocess
-import json
 import os
 import tempfile
 from rich.console import Console
-from rich.prompt import Confirm
+from .supervisor import Supervisor, SupervisedProcess, STATUS_FILE_NAME
+from .logstore import LogStore, project_logs_dir, MANAGED_APP_LOG_DIR
 
 logger = logging.getLogger(__name__)
 app = typer.Typer()
 console = Console()
 
-class ProcessManager:
-    def __init__(self):
-        self.processes = []
-        self.running = True
-        signal.signal(signal.SIGINT, self.handle_shutdown)
-        signal.signal(signal.SIGTERM, self.handle_shutdown)
-        
-    def add_process(self, process):
-        self.processes.append(process)
-        
-    def handle_shutdown(self, signum, frame):
-        console.log("\n[bold red]Force terminating processes...[/bold red]")
-        self.running = False
-        for process in self.processes:
-            if process.poll() is None:  # If process is still running
-                try:
-                    process.kill()  # Force kill immediately
-                    console.log(f"[red]Killed process {process.pid}[/red]")
-                except Exception as e:
-                    console.log(f"[red]Error killing process: {e}[/red]")
-        sys.exit(1)  # Exit with error code to ensure everything stops
-
 def copy_starter_template(target_dir: Path) -> bool:
     starter_dir = Path(__file__).parent.parent / 'starter'
     if not starter_dir.exists():
@@ -55,99 +29,104 @@ def copy_starter_template(target_dir: Path) -> bool:
         console.log(f"[bold red]Failed to create app directory: {e}[/bold red]")
         return False
 
-def start_managed_app(process_manager, managed_app_dir: Path, port: int, logs_dir: Path):
-    stdout_file = logs_dir / "managed_app_stdout.log"
-    stderr_file = logs_dir / "managed_app_stderr.log"
-    
-    while process_manager.running:
-        console.log(f"[bold blue]Starting managed app from directory: {managed_app_dir} on port {port}[/bold blue]")
-        console.log(f"[blue]Log files:[/blue]")
-        console.log(f"  [dim]stdout:[/dim] {stdout_file}")
-        console.log(f"  [dim]stderr:[/dim] {stderr_file}")
-        
-        with open(stdout_file, 'w') as stdout_f, open(stderr_file, 'w') as stderr_f:
-            process = subprocess.Popen(
-                ["uvicorn", "main:app", "--reload", "--port", str(port)],
-                stdout=stdout_f,
-                stderr=stderr_f,
-                cwd=managed_app_dir
-            )
-            process_manager.add_process(process)
-            
-            while process_manager.running and process.poll() is None:
-                time.sleep(1)
-            
-            if not process_manager.running:
-                break
+def managed_app_process(managed_app_dir: Path, port: int, app_logs_dir: Path) -> SupervisedProcess:
+    """The managed app, its output piped into rotated log segments that outlive the run."""
+    console.log(f"[bold blue]Managed app directory: {managed_app_dir}, port {port}[/bold blue]")
+    console.log(f"[blue]Logs:[/blue] {app_logs_dir}")
+    return SupervisedProcess(
+        "managed-app",
+        ["uvicorn", "main:app", "--reload", "--port", str(port)],
+        cwd=managed_app_dir,
+        # Unbuffered, so lines are timestamped when they are printed
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        stdout_store=LogStore(app_logs_dir, "stdout").open(),
+        stderr_store=LogStore(app_logs_dir, "stderr").open()
+    )
 
-def start_designer_app(process_manager, port: int, managed_app_dir: Path, logs_dir: Path):
+def designer_app_process(port: int, managed_app_dir: Path, logs_dir: Path,
+                         extra_env: Optional[Dict[str, str]] = None,
+                         workers: Optional[int] = None) -> SupervisedProcess:
+    """The designer app: a single --reload worker for development, or workers processes without reload."""
     script_dir = Path(__file__).parent
-    while process_manager.running:
-        console.log(f"[bold blue]Starting designer app from directory: {script_dir} on port {port}[/bold blue]")
-        process = subprocess.Popen(
-            ["uvicorn", "main:app", "--reload", "--port", str(port)],
-            env={
-                **os.environ,
-                "MANAGED_APP_DIR": str(managed_app_dir),
-                "LOGS_DIR": str(logs_dir)
-            },
-            cwd=script_dir
-        )
-        process_manager.add_process(process)
-        
-        while process_manager.running and process.poll() is None:
-            time.sleep(1)
-            
-        if not process_manager.running:
-            break
+    console.log(f"[bold blue]Designer app directory: {script_dir}, port {port}[/bold blue]")
+    if workers:
+        console.log(f"[bold blue]Production mode: {workers} designer workers[/bold blue]")
+        args = ["uvicorn", "main:app", "--port", str(port), "--workers", str(workers)]
+    else:
+        args = ["uvicorn", "main:app", "--reload", "--port", str(port)]
+    return SupervisedProcess(
+        "designer",
+        args,
+        cwd=script_dir,
+        env={
+            **os.environ,
+            "MANAGED_APP_DIR": str(managed_app_dir),
+            "LOGS_DIR": str(logs_dir),
+            **(extra_env or {})
+        },
+        critical=True
+    )
 
 def get_logs_dir() -> Path:
     """Create and return a temporary directory for logs."""
     logs_dir = Path(tempfile.mkdtemp(prefix="appdesigner_logs_"))
     return logs_dir
 
-def manage_processes(managed_app_dir: Path, managed_app_port: int, designer_app_port: int, start_managed_app: bool = False):
-    # Create temporary logs directory
+def manage_processes(managed_app_dir: Path, managed_app_port: int, designer_app_port: int, start_managed_app: bool = False,
+                     telemetry_interval: float = 1.0, probe_url: Optional[str] = None,
+                     designer_workers: Optional[int] = None, project_dirs: Optional[List[Path]] = None):
+    # Create temporary logs directory (run state); the managed app's output is kept in app_logs_dir
     logs_dir = get_logs_dir()
-    process_manager = ProcessManager()
+    app_logs_dir = project_logs_dir(managed_app_dir) / MANAGED_APP_LOG_DIR
+    supervisor = Supervisor(status_file=logs_dir / STATUS_FILE_NAME, log=console.log)
+    
+    def handle_shutdown(signum, frame):
+        console.log("\n[bold red]Stopping processes...[/bold red]")
+        # Stop from a helper thread so the signal handler returns immediately
+        threading.Thread(target=supervisor.stop, daemon=True).start()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
     
     try:
-        designer_app = threading.Thread(
-            target=start_designer_app, 
-            args=(process_manager, designer_app_port, managed_app_dir, logs_dir),
-            daemon=True
-        )
-        
         if start_managed_app:
-            managed_app = threading.Thread(
-                target=start_managed_app, 
-                args=(process_manager, managed_app_dir, managed_app_port, logs_dir),
-                daemon=True
-            )
-            managed_app.start()
-        
-        designer_app.start()
-        
-        while process_manager.running:
-            if not designer_app.is_alive():
-                console.log("[bold red]Designer app has stopped unexpectedly[/bold red]")
-                process_manager.handle_shutdown(None, None)
-            time.sleep(1)
-    except KeyboardInterrupt:
-        process_manager.handle_shutdown(None, None)
+            supervisor.add(managed_app_process(managed_app_dir, managed_app_port, app_logs_dir))
+        designer_env = {"TELEMETRY_INTERVAL": str(telemetry_interval), "APP_LOGS_DIR": str(app_logs_dir)}
+        if probe_url is None and start_managed_app:
+            probe_url = f"http://127.0.0.1:{managed_app_port}/"
+        if probe_url:
+            designer_env["MANAGED_APP_URL"] = probe_url
+        if project_dirs:
+            designer_env["PROJECT_DIRS"] = os.pathsep.join(str(d.resolve()) for d in project_dirs)
+        supervisor.add(designer_app_process(designer_app_port, managed_app_dir, logs_dir, designer_env,
+                                            designer_workers))
+        supervisor.start()
+        exit_code = supervisor.wait()
     finally:
+        supervisor.stop()
         # Clean up temporary logs directory
         shutil.rmtree(logs_dir, ignore_errors=True)
+    if exit_code:
+        console.log("[bold red]Designer app has stopped unexpectedly[/bold red]")
+        sys.exit(exit_code)
 
 @app.command()
 def run(
     managed_app_dir: Path,
     managed_app_port: int = 8000,
     designer_app_port: int = 8001,
-    start_managed_app: bool = False
+    start_managed_app: bool = False,
+    telemetry_interval: float = typer.Option(1.0, help="Seconds between managed app resource samples"),
+    probe_url: Optional[str] = typer.Option(None, help="URL to probe for managed app latency "
+                                                        "(defaults to the managed app root when it is started)"),
+    production: bool = typer.Option(False, help="Serve the designer with several workers and no auto-reload"),
+    workers: Optional[int] = typer.Option(None, help="Designer workers in production mode (defaults to the CPU count)"),
+    project: Optional[List[Path]] = typer.Option(None, help="Another managed directory to serve, under "
+                                                            "/api/projects/{id}/ (repeatable)")
 ):
     if not managed_app_dir.exists():
         console.log(f"[bold red]Managed app directory {managed_app_dir} does not exist[/bold red]")
+        from rich.prompt import Confirm  # Only needed for this prompt
         if Confirm.ask("[bold yellow]Managed app directory does not exist. Do you want to create it from the starter template?[/bold yellow]"):
             if not copy_starter_template(managed_app_dir):
                 console.log("[bold red]Failed to create managed app directory from starter template[/bold red]")
@@ -155,7 +134,53 @@ def run(
         else:
             sys.exit(1)
 
-    manage_processes(managed_app_dir, managed_app_port, designer_app_port, start_managed_app)
+    designer_workers = None
+    if production:
+        designer_workers = workers or os.cpu_count() or 1
+    elif workers:
+        console.log("[yellow]--workers only applies with --production, ignoring it[/yellow]")
 
-if __name__ == "__main__":
+    manage_processes(managed_app_dir, managed_app_port, designer_app_port, start_managed_app,
+                     telemetry_interval, probe_url, designer_workers, project)
+
+@app.command()
+def batch(
+    instruction: str,
+    projects: List[Path] = typer.Argument(..., help="Managed app directories to apply the instruction to"),
+    concurrency: int = typer.Option(4, help="Projects processed at the same time"),
+    requests_per_minute: float = typer.Option(50, help="API requests per minute across all projects, 0 for no limit"),
+    tokens_per_minute: float = typer.Option(0, help="API tokens per minute across all projects, 0 for no limit"),
+    extension: Optional[List[str]] = typer.Option(None, help="File extensions to send (repeatable, "
+                                                             "defaults to the usual source and text files)"),
+    validate: bool = typer.Option(True, help="Check generated files and skip projects whose output is invalid"),
+    report: Path = typer.Option(Path("batch-report.json"), help="Report file, CSV if it ends in .csv, else JSON"),
+    verbose: bool = typer.Option(False, help="Show the agent output of every project")
+):
+    """Apply one instruction to many managed app directories without the web UI."""
+    missing = [project for project in projects if not project.is_dir()]
+    if missing:
+        console.log(f"[bold red]Not a directory: {', '.join(map(str, missing))}[/bold red]")
+        sys.exit(1)
+    # The designer modules import each other from the package directory, as uvicorn runs them
+    sys.path.insert(0, str(Path(__file__).parent))
+    from batch import run_batch, write_report
+    import api.agent
+    api.agent.console.quiet = not verbose
+    rows = run_batch([project.resolve() for project in projects], instruction, concurrency,
+                     requests_per_minute, tokens_per_minute, extension, validate)
+    write_report(rows, report)
+    failed = [row for row in rows if row["outcome"] != "ok"]
+    console.log(f"[bold {'red' if failed else 'green'}]{len(rows) - len(failed)}/{len(rows)} projects ok, "
+                f"report written to {report}[/bold {'red' if failed else 'green'}]")
+    if failed:
+        sys.exit(1)
+
+def main():
+    # "python -m appdesigner DIR" predates the batch command and still means run
+    commands = {"run", "batch"}
+    if len(sys.argv) > 1 and sys.argv[1] not in commands and not sys.argv[1].startswith('-'):
+        sys.argv.insert(1, "run")
     app()
+
+if __name__ == "__main__":
+    main()
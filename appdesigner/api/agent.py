@@ -1,20 +1,52 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
 import os
+import re
+import threading
 import time  # Add this import
-from typing import Optional, List, Dict, Tuple, Any
-from filemanager import FileManager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple, Any, Callable, Iterable
+from filemanager import FileManager, FileManagerError, get_cache_dir, project_id, lock_file
+from compaction import preflight, PromptBudgetError
 from claude import APIAgent
-from history import ChangeHistory
+from history import ChangeHistory, HISTORY_DIR_NAME
+from contextcache import get_context_resolver
+from symbols import get_symbol_index
+from embeddings import get_embedding_index, invalidate_embedding_index, EmbeddingsUnavailable
+import telemetry
+from metrics import stage, INSTRUCTION_SECONDS, INSTRUCTIONS_TOTAL
+from usage import get_usage_ledger
+from sharedstate import get_shared_store
+from logstore import tail_text
+from validation import get_validator, format_errors, VALIDATION_RETRY
+from staging import get_staging_manager, StagingError
+from render import IncrementalRenderer, escape_raw
+from jobs import JobCancelled, WRITE_CHECKPOINT
+from projects import current_project, get_managed_dir, get_app_logs_dir
 from pydantic import BaseModel
 from rich.console import Console
-from markdown import markdown  # Add this import
 
 router = APIRouter()
 history_manager = ChangeHistory()
 console = Console()  # Add console instance
 
+# Concurrent per-file requests of an instruction run with fanout (opt-in per request)
+FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', '4'))
+# Held by the instruction running on a project, in whichever worker process runs it
+INSTRUCTION_LOCK_NAME = "instruction.lock"
+# Output tokens reserved for the answer when checking the prompt budget
+MAX_OUTPUT_TOKENS = 4000
+# Files picked by the embedding index for a query (!) sent without any (0 disables)
+RELATED_CONTEXT_FILES = int(os.getenv('RELATED_CONTEXT_FILES', '3'))
+
+COMPACTED_NOTE = """
+Files with a <compacted> tag are shown in reduced form (whitespace normalised,
+comments stripped or signatures only) to fit the prompt budget. Use them for
+reference only and do not output new content for them.
+"""
+
 def format_size(size_bytes):
     """Convert size in bytes to human readable format"""
     for unit in ['bytes', 'KB', 'MB']:
@@ -24,22 +56,29 @@ def format_size(size_bytes):
     return f"{size_bytes:.1f} GB"
 
 class Agent:
-    def __init__(self):
+    def __init__(self, managed_dir: Optional[Path] = None, project_id: Optional[str] = None):
+        """managed_dir and project_id are given for the projects of a multi-project designer."""
         self.api_agent = APIAgent(system_prompt="""You are a helpful programming assistant.
 When providing file changes:
 1. Only include actual file content between <content> tags
 """)
         self.file_manager = FileManager()
-        self.history = ChangeHistory()
+        self.history = ChangeHistory(str(get_cache_dir(managed_dir) / HISTORY_DIR_NAME) if project_id else None)
         
         # Initialize managed directory from environment
-        managed_dir = os.getenv('MANAGED_APP_DIR')
+        managed_dir = managed_dir or os.getenv('MANAGED_APP_DIR')
         if (managed_dir):
             self.set_managed_directory(Path(managed_dir))
         
-        self.file_changes = []  # Keep this for current changes
-        self.sent_files = []    # Keep this for current files
-        self.current_instruction = None  # Add this for tracking current instruction
+        # Current changes and sent files, shared so any worker can serve them to /logs
+        store = get_shared_store()
+        prefix = f"{project_id}:" if project_id else ""
+        self.file_changes = store.list(f"{prefix}file_changes")
+        self.sent_files = store.list(f"{prefix}sent_files")
+        # One instruction at a time: two concurrent runs would both read the original
+        # files and the last one to write would silently win. The thread lock covers
+        # this process, an flock in the project's cache directory the other workers
+        self._instruction_lock = threading.Lock()
         self.query_system_prompt = """You are a helpful programming assistant.
 Analyze the files and provide clear, concise answers to questions about them.
 Format your response using markdown for better readability.
@@ -84,17 +123,27 @@ Do not suggest or make any changes to the files unless explicitly asked."""
         """Get update suggestions for a file based on reference files."""
         return self.api_agent.get_update_suggestions(content, filename, reference_files)
 
-    def format_file_prompt(self, files_dict: Dict[str, str], instruction: str) -> str:
-        """Format a prompt with file context and instruction."""
+    def _format_files_context(self, files_dict: Dict[str, str], compacted: Optional[Dict[str, str]] = None) -> str:
+        """Format files as <inputfile> blocks, tagging the ones sent in compacted form."""
+        compacted = compacted or {}
         files_context = ""
         for filename, content in files_dict.items():
+            marker = f"<compacted>{compacted[filename]}</compacted>\n" if filename in compacted else ""
             files_context += f"""<inputfile>
 <filename>{filename}</filename>
-<content>
+{marker}<content>
 {content}
 </content>
 </inputfile>
 """
+        if compacted:
+            files_context += COMPACTED_NOTE
+        return files_context
+
+    def format_file_prompt(self, files_dict: Dict[str, str], instruction: str,
+                           compacted: Optional[Dict[str, str]] = None) -> str:
+        """Format a prompt with file context and instruction."""
+        files_context = self._format_files_context(files_dict, compacted)
         return f"""Context (current files):
 {files_context}
 
@@ -112,17 +161,145 @@ Important:
 - Include only the actual file content between the content tags
 """
 
-    def format_query_prompt(self, files_dict: Dict[str, str], question: str) -> str:
-        """Format a prompt for querying about files without modification."""
-        files_context = ""
-        for filename, content in files_dict.items():
-            files_context += f"""<inputfile>
+    def format_plan_prompt(self, files_dict: Dict[str, str], instruction: str,
+                           compacted: Optional[Dict[str, str]] = None) -> str:
+        """Format a short planning prompt that only asks which files to change."""
+        files_context = self._format_files_context(files_dict, compacted)
+        return f"""Context (current files):
+{files_context}
+
+Instruction: {instruction}
+
+Do not write any file content yet. List every file that must be created or modified
+to carry out the instruction, in this exact format:
+<plan>
+<file>path/to/file</file>
+</plan>
+"""
+
+    def format_single_file_prompt(self, files_dict: Dict[str, str], instruction: str,
+                                  filename: str, planned_files: List[str],
+                                  compacted: Optional[Dict[str, str]] = None) -> str:
+        """Format a prompt asking for the new content of one planned file."""
+        files_context = self._format_files_context(files_dict, compacted)
+        return f"""Context (current files):
+{files_context}
+
+Instruction: {instruction}
+
+This instruction is being applied to several files in parallel.
+Files being changed: {', '.join(planned_files)}
+You are responsible only for: {filename}
+
+Provide the complete new content of {filename} in this exact format:
+<outputfile>
 <filename>{filename}</filename>
 <content>
-{content}
+[actual file content here]
 </content>
-</inputfile>
+</outputfile>
+
+Important: 
+- Include only the actual file content between the content tags
+- Keep {filename} consistent with the changes the instruction implies for the other files
 """
+
+    def format_fix_prompt(self, invalid_files: Dict[str, str], errors: Dict[str, List[str]], instruction: str) -> str:
+        """Format a prompt sending generated files that failed validation back for fixing."""
+        files_context = self._format_files_context(invalid_files)
+        return f"""These files were generated for the instruction below but fail validation:
+{files_context}
+
+Instruction: {instruction}
+
+Validation errors:
+{format_errors(errors)}
+
+Fix the errors without making any other change. Provide the complete corrected content of each file in this exact format:
+<outputfile>
+<filename>path/to/file</filename>
+<content>
+[actual file content here]
+</content>
+</outputfile>
+"""
+
+    def validate_changes(self, changes: Dict[str, str], instruction: str, retry: bool,
+                         usage: Optional[List[Dict[str, Any]]] = None
+                         ) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """Check generated files before writing; with retry, send failures back to the model once.
+
+        Fixed files replace their originals in changes. Returns the errors that
+        remain, which block the write, and the warnings, which do not.
+        """
+        validator = get_validator()
+        with stage("validate"):
+            errors, warnings = validator.validate(changes)
+        if not errors or not retry:
+            return errors, warnings
+        console.print(f"[yellow]Validation failed, asking for a fix:[/yellow]\n{format_errors(errors)}")
+        with stage("build_prompt"):
+            prompt = self.format_fix_prompt({f: changes[f] for f in errors}, errors, instruction)
+        raw_response = self.api_agent.request(prompt, usage=usage)
+        with stage("parse"):
+            fixed = self._extract_changes(raw_response)
+        changes.update({filename: content for filename, content in fixed.items() if filename in errors})
+        with stage("validate"):
+            return validator.validate(changes)
+
+    def plan_file_changes(self, files_dict: Dict[str, str], instruction: str,
+                          compacted: Optional[Dict[str, str]] = None,
+                          usage: Optional[List[Dict[str, Any]]] = None,
+                          protected: Iterable[str] = ()) -> Tuple[List[str], str]:
+        """Ask which files an instruction touches. Returns (files, raw response).
+
+        Compacted files and the protected ones (dropped from the prompt) are never planned.
+        """
+        protected = set(protected) | set(compacted or {})
+        prompt = self.format_plan_prompt(files_dict, instruction, compacted)
+        raw_response = self.api_agent.request(prompt, max_tokens=500, usage=usage)
+        planned = []
+        for filename in re.findall(r'<file>(.*?)</file>', raw_response, re.DOTALL):
+            filename = filename.strip()
+            if filename and filename not in planned and filename not in protected:
+                planned.append(filename)
+        return planned, raw_response
+
+    def generate_fanout_changes(self, files_dict: Dict[str, str], instruction: str,
+                                compacted: Optional[Dict[str, str]] = None,
+                                usage: Optional[List[Dict[str, Any]]] = None,
+                                protected: Iterable[str] = ()) -> Tuple[Dict[str, str], str]:
+        """Plan the change, then generate each planned file concurrently.
+
+        Returns the merged change-set and the concatenated raw responses. If
+        any file fails to generate, the whole change-set is rejected.
+        """
+        planned, plan_response = self.plan_file_changes(files_dict, instruction, compacted, usage, protected)
+        console.print(f"\n[yellow]Planned files:[/yellow] {', '.join(planned) or 'none'}")
+        if not planned:
+            return {}, plan_response
+
+        def generate(filename: str) -> Tuple[str, str]:
+            with stage("build_prompt"):
+                prompt = self.format_single_file_prompt(files_dict, instruction, filename, planned, compacted)
+            return filename, self.api_agent.request(prompt, usage=usage)
+
+        changes = {}
+        raw_responses = [plan_response]
+        with ThreadPoolExecutor(max_workers=max(1, min(FANOUT_MAX_WORKERS, len(planned)))) as executor:
+            for filename, raw_response in executor.map(generate, planned):
+                raw_responses.append(raw_response)
+                with stage("parse"):
+                    file_changes = self._extract_changes(raw_response)
+                if filename not in file_changes:
+                    raise ValueError(f"No content generated for {filename}")
+                changes[filename] = file_changes[filename]
+        return changes, "\n".join(raw_responses)
+
+    def format_query_prompt(self, files_dict: Dict[str, str], question: str,
+                            compacted: Optional[Dict[str, str]] = None) -> str:
+        """Format a prompt for querying about files without modification."""
+        files_context = self._format_files_context(files_dict, compacted)
         return f"""Context (current files):
 {files_context}
 
@@ -130,62 +307,193 @@ Question: {question}
 
 Provide a clear, concise answer about the files without modifying them."""
 
-    def process_user_instruction(self, instruction: str, counter: int, files: List[str], directory: Optional[Path] = None) -> Tuple[str, str]:
+    def preflight_files(self, files_dict: Dict[str, str], instruction: str,
+                        compact: bool = True) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Any]]:
+        """Check the prompt against the token budget, compacting files if needed.
+
+        Returns the files to send, the compaction mode of each compacted file and
+        the budget report for the UI (also carried by PromptBudgetError).
+        """
+        if instruction.startswith('!'):
+            fixed_text = self.query_system_prompt + self.format_query_prompt({}, instruction[1:].strip())
+        else:
+            fixed_text = (self.api_agent.system_prompt or '') + self.format_file_prompt({}, instruction)
+        files_dict, compacted, report = preflight(
+            files_dict, fixed_text, output_tokens=MAX_OUTPUT_TOKENS, compact=compact
+        )
+        if report["compacted"]:
+            console.print(f"[yellow]Prompt compacted:[/yellow] {report['original_tokens']:,} -> "
+                          f"{report['final_tokens']:,} tokens (budget {report['budget']:,})")
+        return files_dict, compacted, report
+
+    def related_files(self, instruction: str, files: List[str], count: Optional[int] = None) -> List[str]:
+        """Files related to an instruction, to add to its context.
+
+        count defaults to RELATED_CONTEXT_FILES for a query sent without files
+        and to none otherwise: a change instruction could rewrite files it was
+        not given. Nothing is added without numpy, or while the index is still
+        being built in the background.
+        """
+        if count is None:
+            count = RELATED_CONTEXT_FILES if instruction.startswith('!') and not files else 0
+        if count <= 0:
+            return []
         try:
-            if directory:
-                self.set_managed_directory(directory)
+            index = get_embedding_index(self.file_manager.managed_dir)
+        except EmbeddingsUnavailable:
+            return []
+        return [f["path"] for f in index.related_files(instruction.lstrip('!'), limit=count, exclude=files)]
+
+    def process_user_instruction(self, instruction: str, counter: int, files: List[str], directory: Optional[Path] = None,
+                                 fanout: bool = False, compact: bool = True,
+                                 context: Optional[str] = None, validate: bool = True,
+                                 retry_invalid: Optional[bool] = None, staging: bool = False,
+                                 progress: Optional[Callable[..., None]] = None,
+                                 related: Optional[int] = None) -> Tuple[str, str, Dict[str, Any]]:
+        """Run an instruction. progress, if given, is called with a message at each step
+        (a background job records them, and may raise JobCancelled from it), and with
+        WRITE_CHECKPOINT as second argument right before files are written. related
+        is the number of files to add from the embedding index (see related_files).
+        fanout plans the change and generates each file in its own request,
+        which costs one more request and resends the files per planned file.
+
+        Returns the response, the raw model output and this run's details: its
+        mode, outcome ("error" when the response is an error message), API
+        usages, written files and prompt budget report.
+        """
+        progress = progress or (lambda message, kind=None: None)
+        if directory:
+            self.set_managed_directory(directory)
+        project_lock = self._lock_instructions(progress)
+        started = time.perf_counter()
+        mode = "query" if instruction.startswith('!') else "change"
+        outcome = "error"
+        usages: List[Dict[str, Any]] = []  # One entry per API request
+        written: Dict[str, int] = {}
+        report: Optional[Dict[str, Any]] = None
+
+        def details() -> Dict[str, Any]:
+            return {"mode": mode, "outcome": outcome, "usages": usages, "written": written, "preflight": report}
 
+        try:
             if not self.file_manager.managed_dir:
                 raise ValueError("No managed directory set")
 
-            self.current_instruction = instruction
-            managed_files = {f: self.file_manager.get_file_content(f) for f in files}
+            with stage("related_files"):
+                extra_files = self.related_files(instruction, files, related)
+            if extra_files:
+                console.print(f"[yellow]Adding related files:[/yellow] {', '.join(extra_files)}")
+                progress(f"Added {len(extra_files)} related files")
+                files = list(files) + extra_files
+            with stage("read_files"):
+                managed_files = {f: self.file_manager.get_file_content(f) for f in files}
+            progress(f"Read {len(managed_files)} files")
+            with stage("preflight"):
+                managed_files, compacted, report = self.preflight_files(managed_files, instruction, compact)
+            # Generated/minified files left out of the prompt: the model never saw them
+            dropped = [f["path"] for f in report["files"] if f["action"] == "dropped"]
             
             # Log files being sent to Claude
             console.print("\n[yellow]Sending files to Claude:[/yellow]")
             for filename in managed_files.keys():
                 console.print(f"  - {filename}")
+            progress(f"Sending {len(managed_files)} files to Claude")
             
             # Handle query mode (instructions starting with !)
             if instruction.startswith('!'):
                 question = instruction[1:].strip()  # Remove ! and trim
                 # Create sent_files list without adding to accumulated_sent yet
-                self.sent_files = [f"[{counter}] {instruction}"] + [
+                self.sent_files.set([f"[{counter}] {instruction}"] + [
                     f"Sent {filename} ({format_size(os.path.getsize(os.path.join(self.file_manager.managed_dir, filename)))})"
                     for filename in managed_files.keys()
-                ]
+                ])
                 
                 # Use query-specific prompt
-                prompt = self.format_query_prompt(managed_files, question)
-                # Use query system prompt without keyword arg
-                self.api_agent.system_prompt = self.query_system_prompt
-                raw_response = self.api_agent.request(prompt)
-                # Restore original system prompt
-                self.api_agent.system_prompt = """You are a helpful programming assistant.
-When providing file changes:
-1. Only include actual file content between <content> tags
-"""
+                with stage("build_prompt"):
+                    prompt = self.format_query_prompt(managed_files, question, compacted)
+                # Pass the query system prompt per call so concurrent requests keep theirs;
+                # completed markdown blocks are rendered while the rest streams in
+                renderer = IncrementalRenderer()
+                raw_response = self.api_agent.request(prompt, system_prompt=self.query_system_prompt, usage=usages,
+                                                      on_text=renderer.feed)
                 
                 # Format response as HTML from markdown with code highlighting
-                html_response = markdown(raw_response, extensions=['fenced_code', 'tables', 'codehilite'])
+                with stage("render"):
+                    html_response = renderer.finish()
                 # Add wrapping div for styling
                 formatted_response = f'<div class="query-response">{html_response}</div>'
-                return {"response": formatted_response, "type": "query"}, raw_response
+                outcome = "ok"
+                return {"response": formatted_response, "type": "query"}, raw_response, details()
 
             # Regular instruction handling
             # Create new changes list
-            self.file_changes = [f"[{counter}] {instruction}"]
-            self.sent_files = [f"[{counter}] {instruction}"] + [
+            self.file_changes.set([f"[{counter}] {instruction}"])
+            self.sent_files.set([f"[{counter}] {instruction}"] + [
                 f"Sent {filename} ({format_size(os.path.getsize(os.path.join(self.file_manager.managed_dir, filename)))})"
                 for filename in managed_files.keys()
-            ]
+            ])
+            
+            if fanout:
+                mode = "fanout"
+                changes, raw_response = self.generate_fanout_changes(managed_files, instruction, compacted, usages,
+                                                                     dropped)
+                apply_changes = self.file_manager.apply_change_set
+            else:
+                with stage("build_prompt"):
+                    prompt = self.format_file_prompt(managed_files, instruction, compacted)
+                raw_response = self.api_agent.request(prompt, usage=usages)
+                with stage("parse"):
+                    changes = self._extract_changes(raw_response)
+                apply_changes = self.file_manager.apply_file_changes
             
-            prompt = self.format_file_prompt(managed_files, instruction)
-            raw_response = self.api_agent.request(prompt)
-            changes = self._extract_changes(raw_response)
+            # Never write back a file the model only saw in compacted form, or did not see at all
+            for filename in [f for f in changes if f in compacted or f in dropped]:
+                console.print(f"[red]Ignoring output for {'compacted' if filename in compacted else 'dropped'} file "
+                              f"{filename}[/red]")
+                del changes[filename]
             
+            progress(f"Received changes for {len(changes)} files")
+            if changes and validate:
+                retry = VALIDATION_RETRY if retry_invalid is None else retry_invalid
+                errors, warnings = self.validate_changes(changes, instruction, retry, usages)
+                for filename, file_warnings in warnings.items():
+                    console.print(f"[yellow]Validation warning for {filename}:[/yellow] {'; '.join(file_warnings)}")
+                    self.file_changes.append(f"{filename}: Warning ({'; '.join(file_warnings)})")
+                if errors:
+                    # A broken file would crash the managed app: write none of them
+                    for filename, file_errors in errors.items():
+                        self.file_changes.append(f"{filename}: Rejected ({'; '.join(file_errors)})")
+                    outcome = "invalid"
+                    return f"Generated files failed validation, no changes written:\n{format_errors(errors)}", raw_response, details()
+
+            if changes and staging:
+                # Preview in a shadow copy instead of touching the live app
+                with stage("staging"):
+                    workspace = get_staging_manager(self.file_manager.managed_dir).create(changes, instruction)
+                    try:
+                        status = workspace.start_preview()
+                    except StagingError:
+                        workspace.remove()  # Nobody would know its id to discard it
+                        raise
+                for filename in changes:
+                    self.file_changes.append(f"{filename}: Staged ({workspace.id})")
+                outcome = "ok"
+                return (f"Changes staged in workspace {workspace.id}, preview at {status['url']}\n"
+                        f"Promote with POST /api/staging/{workspace.id}/promote"), raw_response, details()
+
             if changes:
-                results = self.file_manager.apply_file_changes(changes)
+                # From here on a rerun would apply the change a second time
+                progress(f"Writing {len(changes)} files", WRITE_CHECKPOINT)
+                with stage("write"):
+                    results = apply_changes(changes)
+                written = {filename: len(content.encode('utf-8')) for filename, content in changes.items()}
+                resolver = get_context_resolver(self.file_manager.managed_dir)
+                for filename in changes:
+                    resolver.invalidate(filename)
+                get_symbol_index(self.file_manager.managed_dir).invalidate()
+                invalidate_embedding_index(self.file_manager.managed_dir)
+                if current_project() is None:  # Only the default project's app is sampled
+                    telemetry.mark(f"[{counter}] {instruction}: {', '.join(changes)}")
                 # Track file changes with size information
                 for filename, result in results.items():
                     file_path = os.path.join(self.file_manager.managed_dir, filename)
@@ -200,10 +508,62 @@ When providing file changes:
             else:
                 message = "No changes needed"
                 
-            return message, raw_response
+            outcome = "ok"
+            return message, raw_response, details()
 
+        except JobCancelled:
+            outcome = "cancelled"
+            raise
         except Exception as e:
-            return str(e), ""
+            if isinstance(e, PromptBudgetError):
+                report = e.report
+            return str(e), "", details()
+        finally:
+            if project_lock:
+                project_lock.close()
+            self._instruction_lock.release()
+            INSTRUCTION_SECONDS.observe(time.perf_counter() - started, mode=mode)
+            INSTRUCTIONS_TOTAL.inc(mode=mode, outcome=outcome)
+            if usages:
+                self.record_usage(instruction, mode, outcome, usages, written, context, report)
+
+    def _lock_instructions(self, progress: Callable[[str], None]):
+        """Wait until no other instruction runs on the project, in this or another worker.
+
+        Returns the held project lock file (None without a managed directory);
+        close it, then release _instruction_lock, when done.
+        """
+        waiting = "Waiting for the running instruction to finish"
+        waited = not self._instruction_lock.acquire(blocking=False)
+        if waited:
+            progress(waiting)
+            self._instruction_lock.acquire()
+        if not self.file_manager.managed_dir:
+            return None
+        try:
+            path = get_cache_dir(self.file_manager.managed_dir) / INSTRUCTION_LOCK_NAME
+            project_lock = lock_file(path, blocking=False)
+            if project_lock is None:
+                if not waited:
+                    progress(waiting)
+                project_lock = lock_file(path)
+            return project_lock
+        except BaseException:
+            self._instruction_lock.release()
+            raise
+
+    def record_usage(self, instruction: str, mode: str, outcome: str, usages: List[Dict[str, Any]],
+                     written: Dict[str, int], context: Optional[str] = None,
+                     report: Optional[Dict[str, Any]] = None):
+        """Store the token usage of an instruction, attributed to the files sent and written."""
+        report = report or {}
+        prompt_tokens = {f["path"]: f["tokens"] for f in report.get("files", []) if f["tokens"]}
+        try:
+            managed_dir = self.file_manager.managed_dir
+            get_usage_ledger().record(instruction, mode, outcome, usages, prompt_tokens, written, context,
+                                      project_id(managed_dir) if managed_dir else None)
+        except Exception as e:
+            console.print(f"[red]Failed to record token usage: {e}[/red]")
 
     def _extract_changes(self, response: str) -> Dict[str, str]:
         """Extract file changes from response."""
@@ -218,57 +578,97 @@ When providing file changes:
                 print(f"Error extracting changes: {e}")
         return changes
 
-agent = Agent()
+_agent: Optional[Agent] = None
+_agent_lock = threading.Lock()
+
+def get_agent() -> Agent:
+    """Get the agent of the current project, or the shared one, creating it on first use rather than at import."""
+    global _agent
+    project = current_project()
+    if project is not None:
+        return project.agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = Agent()
+        return _agent
 
 class InstructionRequest(BaseModel):
     instruction: str
     counter: int
     files: List[str]  # Add files field
+    fanout: bool = False  # Plan, then generate each file in its own request
+    compact: bool = True  # Compact files when the prompt is over budget
+    context: Optional[str] = None  # Name of the context the files came from, for usage accounting
+    validate_files: bool = True  # Check generated files before writing them
+    retry_invalid: Optional[bool] = None  # Send invalid files back to the model once; None: VALIDATION_RETRY
+    staging: bool = False  # Stage the changes in a previewable shadow copy instead of writing them
+    related: Optional[int] = None  # Files to add from the embedding index; None: RELATED_CONTEXT_FILES for file-less queries
 
 class InstructionResponse(BaseModel):
     response: str
     rawOutput: str
     processingTime: float  # Add this field
+    preflight: Optional[Dict[str, Any]] = None  # Token budget / compaction report
+    outcome: Optional[str] = None  # ok, invalid or error (the response is then the error message)
+
+def run_instruction(request: InstructionRequest,
+                    progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Process an instruction request into an InstructionResponse dict, from an
+    HTTP request or a background job."""
+    start_time = time.perf_counter()  # Monotonic, unaffected by clock changes
+    agent = get_agent()
+
+    if not agent.file_manager.managed_dir:
+        managed_dir = get_managed_dir()
+        if not managed_dir:
+            raise ValueError("No managed directory configured")
+        agent.set_managed_directory(managed_dir)
+
+    response, raw_output, details = agent.process_user_instruction(
+        request.instruction,
+        request.counter,
+        request.files,  # Pass files to the method
+        fanout=request.fanout,
+        compact=request.compact,
+        context=request.context,
+        validate=request.validate_files,
+        retry_invalid=request.retry_invalid,
+        staging=request.staging,
+        progress=progress,
+        related=request.related
+    )
+
+    # Calculate processing time
+    processing_time = round(time.perf_counter() - start_time, 2)
+
+    # Add console logging with timing
+    console.print("\n[bold blue]Processing Result:[/bold blue]")
+    console.print(f"[green]Message:[/green] {response}")
+    console.print(f"[cyan]Processing Time:[/cyan] {processing_time}s")
+    console.print("\n[yellow]Raw Response:[/yellow]")
+    console.print(raw_output)
+
+    # Prepare raw output for frontend display
+    formatted_raw = escape_raw(raw_output)
+
+    # Extract response from dict if it's a query response
+    final_response = response["response"] if isinstance(response, dict) else response
+
+    return {
+        "response": final_response,
+        "rawOutput": formatted_raw,
+        "processingTime": processing_time,  # Add processing time to response
+        "preflight": details["preflight"],
+        "outcome": details["outcome"]
+    }
 
 # Remove /api prefix from route paths
 @router.post("/process-user-instructions", response_model=InstructionResponse)
 async def process_instructions(request: InstructionRequest) -> Dict[str, Any]:
     try:
-        start_time = time.time()  # Start timing
-        
-        if not agent.file_manager.managed_dir:
-            managed_dir = os.getenv('MANAGED_APP_DIR')
-            if not managed_dir:
-                raise ValueError("No managed directory configured")
-            agent.set_managed_directory(Path(managed_dir))
-            
-        response, raw_output = agent.process_user_instruction(
-            request.instruction, 
-            request.counter,
-            request.files  # Pass files to the method
-        )
-        
-        # Calculate processing time
-        processing_time = round(time.time() - start_time, 2)
-        
-        # Add console logging with timing
-        console.print("\n[bold blue]Processing Result:[/bold blue]")
-        console.print(f"[green]Message:[/green] {response}")
-        console.print(f"[cyan]Processing Time:[/cyan] {processing_time}s")
-        console.print("\n[yellow]Raw Response:[/yellow]")
-        console.print(raw_output)
-        
-        # Prepare raw output for frontend display
-        formatted_raw = raw_output.replace('\n', '\\n').replace('\r', '\\r')
-        
-        # Extract response from dict if it's a query response
-        final_response = response["response"] if isinstance(response, dict) else response
-        
-        return {
-            "response": final_response,
-            "rawOutput": formatted_raw,
-            "processingTime": processing_time  # Add processing time to response
-        }
+        # In the thread pool: an instruction takes seconds to minutes, and the
+        # event loop keeps serving log polls and other requests meanwhile
+        return await run_in_threadpool(run_instruction, request)
     except Exception as e:
         error_msg = str(e)
         if "overloaded" in error_msg.lower():
@@ -282,10 +682,29 @@ async def process_instructions(request: InstructionRequest) -> Dict[str, Any]:
         console.print(f"\n[bold red]Error:[/bold red] {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
+class PreflightRequest(BaseModel):
+    instruction: str
+    files: List[str]
+    compact: bool = True
+
+@router.post("/preflight")
+async def preflight_instruction(request: PreflightRequest) -> Dict[str, Any]:
+    """Report prompt token usage and compaction for an instruction without sending it."""
+    agent = get_agent()
+    if not agent.file_manager.managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    try:
+        files = {f: agent.file_manager.get_file_content(f) for f in request.files}
+        return agent.preflight_files(files, request.instruction, request.compact)[2]
+    except PromptBudgetError as e:
+        return e.report
+    except FileManagerError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/history")
 async def get_history():
     """Get the file change history"""
-    changes = history_manager.get_changes()
+    changes = get_agent().history.get_changes() if current_project() else history_manager.get_changes()
     formatted_changes = [{
         "timestamp": change["timestamp"],
         "filename": change["filename"],
@@ -296,35 +715,17 @@ async def get_history():
 
 @router.get("/logs")
 async def get_logs():
-    """Get the complete logs"""
+    """Get the latest managed app output and the pending content logs"""
     try:
-        logs_dir = os.getenv('LOGS_DIR')
-        if not logs_dir:
-            return {"stdout": "", "stderr": "", "files": "", "sent": ""}
-
-        logs_dir = Path(logs_dir)
-        stdout_path = logs_dir / "managed_app_stdout.log"
-        stderr_path = logs_dir / "managed_app_stderr.log"
-
-        # Get complete stdout content
-        stdout_content = ""
-        if (stdout_path.exists()):
-            with open(stdout_path, 'r') as f:
-                stdout_content = f.read()
-
-        # Get complete stderr content
-        stderr_content = ""
-        if (stderr_path.exists()):
-            with open(stderr_path, 'r') as f:
-                stderr_content = f.read()
+        # Only the tail: reading stays O(lines shown) however long the app has run
+        stdout_content = tail_text("stdout", logs_dir=get_app_logs_dir())
+        stderr_content = tail_text("stderr", logs_dir=get_app_logs_dir())
 
         # Just return current changes, accumulation handled by frontend
-        files_content = "\n".join(agent.file_changes)
-        sent_content = "\n".join(agent.sent_files)  # Fix typo in string join
-
-        # Clear current changes after sending
-        agent.file_changes = []
-        agent.sent_files = []
+        agent = get_agent()
+        # Drained atomically: with several workers, the next poll may land on another one
+        files_content = "\n".join(agent.file_changes.drain())
+        sent_content = "\n".join(agent.sent_files.drain())
 
         return {
             "stdout": stdout_content,
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Dict, Tuple, Any, Optional
 from pathlib import Path
 import os
 import json
 import shutil
-import re
 import sys
-from filemanager import FileManager, FileManagerError
+from filemanager import FileManager, FileManagerError, estimate_tokens, content_hash, apply_text_edits, write_text_atomic
+from treewalk import matcher_for_directory, read_files_parallel
+from contextcache import get_context_resolver
+from symbols import get_symbol_index
+from projects import current_project, get_managed_dir
+from httpcache import etag_matches, listing_etag, not_modified, set_cache_headers, stat_etag
+from listing import get_directory_listings, ListingError
 
 router = APIRouter()
 
@@ -24,6 +29,11 @@ managed_dir = os.getenv('MANAGED_APP_DIR')
 if managed_dir:
     file_manager.set_managed_directory(Path(managed_dir))
 
+def get_file_manager() -> FileManager:
+    """The FileManager of the current project, or the one of MANAGED_APP_DIR."""
+    project = current_project()
+    return project.file_manager if project is not None else file_manager
+
 # File utilities
 def read_file_safely(filepath: str) -> Tuple[bool, str]:
     """Try to read a file with different encodings, return success and content."""
@@ -63,42 +73,50 @@ def get_relative_path(file_path: Path, base_dir: Path) -> str:
     except ValueError:
         return str(file_path)
 
-# Add token counting utility
-def estimate_tokens(text: str) -> int:
-    """Estimate token count using GPT tokenization rules."""
-    # Simple estimation: split on whitespace and punctuation
-    tokens = re.findall(r'\w+|[^\w\s]', text)
-    # Add 20% overhead for special tokens and subword tokenization
-    return int(len(tokens) * 1.2)
-
 def scan_directory(base_dir: Path, subpath: str = '') -> List[Dict[str, Any]]:
-    """Recursively scan directory and return all files and directories."""
+    """Scan a single directory level and return its files and directories.
+
+    Entries matched by .gitignore/.appdesignerignore (or the built-in ignores)
+    are hidden, and text files are read in parallel for token estimation.
+    """
     results = []
     target_dir = base_dir / subpath if subpath else base_dir
+    rel_dir = get_relative_path(target_dir, base_dir) if subpath else ''
     
     try:
-        for entry in target_dir.iterdir():  # Use iterdir() instead of glob
-            if entry.name.startswith('.'):
-                continue
-            
-            rel_path = get_relative_path(entry, base_dir)
-            if entry.is_file() and is_text_file(str(entry)):
-                success, content = read_file_safely(str(entry))
-                tokens = estimate_tokens(content) if success else 0
+        matcher = matcher_for_directory(base_dir, rel_dir)
+        text_files = {}
+        with os.scandir(target_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
                 
-                results.append({
-                    "path": rel_path,
-                    "name": entry.name,
-                    "type": "file",
-                    "size": entry.stat().st_size,  # Add file size
-                    "tokens": tokens  # Add token count
-                })
-            elif entry.is_dir():
-                results.append({
-                    "path": rel_path,
-                    "name": entry.name,
-                    "type": "directory"
-                })
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                is_dir = entry.is_dir()
+                if matcher.is_ignored(rel_path, is_dir):
+                    continue
+                if is_dir:
+                    results.append({
+                        "path": rel_path,
+                        "name": entry.name,
+                        "type": "directory"
+                    })
+                elif entry.is_file() and is_text_file(entry.path):
+                    text_files[rel_path] = entry
+
+        contents = read_files_parallel(
+            {rel_path: entry.path for rel_path, entry in text_files.items()},
+            lambda path: read_file_safely(path)[1]
+        )
+        for rel_path, entry in text_files.items():
+            success, content = contents[rel_path]
+            results.append({
+                "path": rel_path,
+                "name": entry.name,
+                "type": "file",
+                "size": entry.stat().st_size,  # Add file size
+                "tokens": estimate_tokens(content) if success else 0  # Add token count
+            })
     except Exception as e:
         print(f"Error scanning directory {target_dir}: {e}")
         return []
@@ -106,11 +124,18 @@ def scan_directory(base_dir: Path, subpath: str = '') -> List[Dict[str, Any]]:
     return sorted(results, key=lambda x: (x['type'] != 'directory', x['path']))
 
 @router.get("/files")
-async def get_files(path: str = '') -> List[Dict[str, str]]:
-    """Get list of files in the managed directory or specified subdirectory."""
+async def get_files(request: Request, response: Response, path: str = '', limit: Optional[int] = None,
+                    cursor: Optional[str] = None, q: Optional[str] = None, sort: str = "name") -> Any:
+    """Get list of files in the managed directory or specified subdirectory.
+
+    With limit, returns one page of the directory's own entries instead:
+    {entries, next_cursor, total}, filtered by q (a name substring) and
+    ordered by sort (name, size or modified). Pass next_cursor back as
+    cursor for the following page.
+    """
     print(f"Scanning directory with path: {path}")  # Debug log
     
-    managed_dir = os.getenv('MANAGED_APP_DIR')
+    managed_dir = get_managed_dir()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
     
@@ -128,18 +153,42 @@ async def get_files(path: str = '') -> List[Dict[str, str]]:
         if not str(target_dir).startswith(str(base_dir)):  # Security check
             raise HTTPException(status_code=403, detail="Access denied")
 
+    if limit is not None:
+        listings = get_directory_listings(base_dir)
+        try:
+            page = listings.page(path, limit, cursor, q, sort)
+        except ListingError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        etag = page.pop("etag")
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_cache_headers(response, etag)
+        return listings.add_tokens(page)
+
+    # Unchanged listings cost one stat per entry instead of reading every file
+    etag = listing_etag(base_dir, path)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
     return scan_directory(base_dir, path)
 
 @router.get("/file")
-async def get_file(path: str) -> Dict[str, Any]:
+async def get_file(request: Request, response: Response, path: str) -> Dict[str, Any]:
     """Get contents of a specific file."""
-    managed_dir = os.getenv('MANAGED_APP_DIR')
+    managed_dir = get_managed_dir()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
 
     file_path = Path(managed_dir) / path
-    if not file_path.exists():
+    try:
+        file_stat = file_path.stat()
+    except OSError:
         raise HTTPException(status_code=404, detail=f"File not found: {path}")
+
+    # Revalidation of an unchanged file is a single stat
+    etag = stat_etag(file_stat)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
     if not is_text_file(str(file_path)):
         raise HTTPException(status_code=400, detail="Not a text file")
@@ -148,13 +197,13 @@ async def get_file(path: str) -> Dict[str, Any]:
     if not success:
         raise HTTPException(status_code=500, detail="Failed to read file")
     
-    # Add file size to response
-    file_stat = file_path.stat()
+    set_cache_headers(response, etag)
     return {
         "path": path, 
         "content": content,
         "size": file_stat.st_size,
-        "tokens": estimate_tokens(content)  # Add token count
+        "tokens": estimate_tokens(content),  # Add token count
+        "hash": content_hash(content)  # Base version for PATCH /api/file
     }
 
 class FileContent(BaseModel):
@@ -163,7 +212,7 @@ class FileContent(BaseModel):
 @router.post("/file")
 async def update_file(path: str, file_content: FileContent) -> Dict[str, str]:
     """Update or create a file with new content."""
-    managed_dir = os.getenv('MANAGED_APP_DIR')
+    managed_dir = get_managed_dir()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
 
@@ -176,18 +225,77 @@ async def update_file(path: str, file_content: FileContent) -> Dict[str, str]:
         # Write content to file
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(file_content.content)
+        get_context_resolver(Path(managed_dir)).invalidate(path)
+        get_symbol_index(Path(managed_dir)).invalidate()
         
         return {
             "status": "success",
-            "message": f"File {path} updated successfully"
+            "message": f"File {path} updated successfully",
+            "hash": content_hash(file_content.content)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update file: {str(e)}")
 
+class TextEdit(BaseModel):
+    start: int
+    end: int
+    text: str
+
+class FilePatch(BaseModel):
+    base_hash: str
+    edits: List[TextEdit]
+
+@router.patch("/file")
+async def patch_file(path: str, patch: FilePatch) -> Dict[str, Any]:
+    """Apply range edits to a file, only if it is still at the version they were made against.
+
+    Offsets are in characters of the content returned by GET /api/file,
+    whose hash is the base_hash. Answers 409 with the current hash when the
+    file changed in between, so the client never overwrites someone else's
+    edit. The request only carries the edited ranges.
+    """
+    managed_dir = get_managed_dir()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+
+    file_path = Path(managed_dir) / path
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    success, content = read_file_safely(str(file_path))
+    if not success:
+        raise HTTPException(status_code=400, detail="Not a text file")
+
+    current_hash = content_hash(content)
+    if current_hash != patch.base_hash:
+        raise HTTPException(status_code=409, detail={
+            "error": "File changed since it was loaded",
+            "hash": current_hash
+        })
+
+    try:
+        new_content = apply_text_edits(content, [(e.start, e.end, e.text) for e in patch.edits])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if new_content != content:
+        try:
+            write_text_atomic(file_path, new_content)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to update file: {str(e)}")
+        get_context_resolver(Path(managed_dir)).invalidate(path)
+        get_symbol_index(Path(managed_dir)).invalidate()
+
+    return {
+        "status": "success",
+        "message": f"File {path} updated successfully",
+        "hash": content_hash(new_content),
+        "size": len(new_content.encode('utf-8'))
+    }
+
 @router.delete("/file")
 async def delete_file(path: str) -> Dict[str, str]:
     """Delete a file or directory."""
-    managed_dir = os.getenv('MANAGED_APP_DIR')
+    managed_dir = get_managed_dir()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
 
@@ -200,6 +308,8 @@ async def delete_file(path: str) -> Dict[str, str]:
             shutil.rmtree(file_path)
         else:
             file_path.unlink()
+        get_context_resolver(Path(managed_dir)).invalidate(path)
+        get_symbol_index(Path(managed_dir)).invalidate()
         
         return {
             "status": "success",
@@ -211,7 +321,7 @@ async def delete_file(path: str) -> Dict[str, str]:
 @router.post("/directory")
 async def create_directory(path: str) -> Dict[str, str]:
     """Create a new directory."""
-    managed_dir = os.getenv('MANAGED_APP_DIR')
+    managed_dir = get_managed_dir()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
 
@@ -232,6 +342,8 @@ class ContextData(BaseModel):
 @router.get("/contexts")
 async def get_contexts() -> Dict[str, Any]:
     """Get all saved contexts."""
+    managed_dir = get_managed_dir()
+    file_manager = get_file_manager()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
     try:
@@ -258,18 +370,35 @@ async def get_contexts() -> Dict[str, Any]:
 @router.post("/contexts")
 async def update_contexts(data: ContextData) -> Dict[str, str]:
     """Update saved contexts."""
+    managed_dir = get_managed_dir()
+    file_manager = get_file_manager()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
     try:
         contexts = {}
         base_dir = Path(managed_dir)
         
+        # Reuse the item types already on disk, only new items need a stat call
+        try:
+            known_types = {
+                item['path']: item['type']
+                for context in file_manager.load_contexts().values()
+                for item in context.get('items', [])
+                if isinstance(item, dict) and 'type' in item
+            }
+        except FileManagerError:
+            known_types = {}
+        
         for name, context in data.contexts.items():
             # Convert items to list and add type information
             items_with_types = []
             for item in context.get('items', []):
-                item_path = base_dir / item
-                item_type = 'directory' if item_path.is_dir() else 'file'
+                if isinstance(item, dict):
+                    item = item['path']
+                item_type = known_types.get(item)
+                if item_type is None:
+                    item_type = 'directory' if (base_dir / item).is_dir() else 'file'
+                    known_types[item] = item_type
                 items_with_types.append({
                     'path': item,
                     'type': item_type
@@ -281,6 +410,7 @@ async def update_contexts(data: ContextData) -> Dict[str, str]:
             }
             
         file_manager.save_contexts(contexts)
+        get_context_resolver(base_dir).retain(contexts)
         return {"status": "success", "message": "Contexts saved successfully"}
     except Exception as e:
         error_detail = {
@@ -293,13 +423,37 @@ async def update_contexts(data: ContextData) -> Dict[str, str]:
         log_error("Failed to save contexts", e)
         raise HTTPException(status_code=500, detail=error_detail)
 
+@router.get("/contexts/{name}/resolved")
+async def get_resolved_context(name: str) -> Dict[str, Any]:
+    """Get a saved context expanded into a flat file list with size and token totals."""
+    managed_dir = get_managed_dir()
+    file_manager = get_file_manager()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    try:
+        contexts = file_manager.load_contexts()
+    except FileManagerError as e:
+        log_error("Failed to load contexts", e)
+        raise HTTPException(status_code=500, detail={
+            "error": "Failed to load contexts",
+            "type": type(e).__name__,
+            "message": str(e),
+            "location": "get_resolved_context"
+        })
+    if name not in contexts:
+        raise HTTPException(status_code=404, detail=f"Context not found: {name}")
+    return get_context_resolver(Path(managed_dir)).resolve(name, contexts[name])
+
 @router.delete("/contexts")
 async def delete_contexts() -> Dict[str, str]:
     """Delete all saved contexts."""
+    managed_dir = get_managed_dir()
+    file_manager = get_file_manager()
     if not managed_dir:
         raise HTTPException(status_code=500, detail="No managed directory configured")
     try:
         file_manager.delete_contexts()
+        get_context_resolver(Path(managed_dir)).invalidate()
         return {"status": "success", "message": "Contexts deleted successfully"}
     except Exception as e:
         error_detail = {
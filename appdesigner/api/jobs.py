@@ -0,0 +1,115 @@
+import asyncio
+import json
+from functools import partial
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from jobs import get_job_queue, release_job_queue, IdempotencyConflict, JobQueue, JOBS_DB_NAME, TERMINAL_STATES, POLL_INTERVAL
+from filemanager import get_cache_dir
+from api.agent import InstructionRequest, run_instruction
+from projects import activate, current_project, get_managed_dir, get_project_registry
+
+router = APIRouter()
+
+INSTRUCTION_JOB = "instruction"
+
+def run_instruction_job(project, payload: Dict[str, Any], progress) -> Dict[str, Any]:
+    activate(project)  # Worker threads serve whichever project queued the job
+    result = run_instruction(InstructionRequest(**payload), progress)
+    if result["outcome"] == "error":
+        raise RuntimeError(result["response"])  # Recorded as a failed job, not a result
+    return result
+
+def get_queue() -> JobQueue:
+    """The job queue of the current project, with its workers started."""
+    managed_dir = get_managed_dir()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    queue = get_job_queue(managed_dir)
+    queue.register(INSTRUCTION_JOB, partial(run_instruction_job, current_project()))
+    queue.start()
+    return queue
+
+def resume_jobs():
+    """Restart the queues of the projects a previous designer process left jobs in."""
+    for project in get_project_registry().list():
+        if not (get_cache_dir(project.managed_dir) / JOBS_DB_NAME).is_file():
+            continue
+        activate(project)
+        if get_job_queue(project.managed_dir).active():
+            get_queue()
+        else:
+            release_job_queue(project.managed_dir)
+    activate(None)
+
+def get_job(queue: JobQueue, job_id: str) -> Dict[str, Any]:
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+class JobRequest(InstructionRequest):
+    idempotency_key: Optional[str] = None  # Or the Idempotency-Key header
+
+# Sync routes: queue calls may wait up to the SQLite timeout for another worker's
+# write transaction, which must not stall the event loop
+
+@router.post("/jobs")
+def submit_job(request: JobRequest, idempotency_key: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Queue an instruction to run in the background.
+
+    Submitting again with the same idempotency key returns the existing job
+    (created is false) rather than running the instruction twice.
+    """
+    key = request.idempotency_key or idempotency_key
+    payload = request.model_dump(exclude={"idempotency_key"})
+    try:
+        return get_queue().submit(INSTRUCTION_JOB, payload, key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/jobs")
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    return get_queue().list(status, max(1, min(limit, 500)))
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str) -> Dict[str, Any]:
+    queue = get_queue()
+    return {**get_job(queue, job_id), "events": queue.events(job_id)}
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    """Cancel a queued job, or stop a running one at its next step."""
+    queue = get_queue()
+    job = get_job(queue, job_id)
+    if job["status"] in TERMINAL_STATES:
+        return job
+    return queue.cancel(job_id)
+
+@router.get("/jobs/{job_id}/stream")
+def stream_job(job_id: str, last_event_id: Optional[int] = Header(None)) -> StreamingResponse:
+    """Follow a job as server-sent events: its progress, then a done event with the job.
+
+    A reconnecting EventSource sends Last-Event-ID and gets only what it missed.
+    """
+    queue = get_queue()
+    get_job(queue, job_id)
+
+    async def events():
+        after = last_event_id or 0
+        while True:
+            for event in await run_in_threadpool(queue.events, job_id, after):
+                after = event["id"]
+                yield f"id: {after}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+            job = await run_in_threadpool(queue.get, job_id)
+            if job["status"] in TERMINAL_STATES:
+                # Events written between the read above and the status check
+                for event in await run_in_threadpool(queue.events, job_id, after):
+                    after = event["id"]
+                    yield f"id: {after}\nevent: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+                yield f"event: done\ndata: {json.dumps(job)}\n\n"
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,33 +1,58 @@
-import os
-from pathlib import Path
 from fastapi import APIRouter, HTTPException
-from typing import Dict
+from typing import Any, Dict, Optional
+from logstore import get_log_store, tail_text, LOG_TAIL_LINES, STREAMS
+from logparse import get_log_index
+from projects import get_app_logs_dir
 
 router = APIRouter()
 
-def get_logs_dir() -> Path:
-    logs_dir = os.environ.get("LOGS_DIR")
-    if not logs_dir:
-        raise HTTPException(status_code=500, detail="Logs directory not configured")
-    return Path(logs_dir)
-
 @router.get("/logs")
 async def get_logs() -> Dict[str, str]:
-    logs_dir = get_logs_dir()
-    stdout_file = logs_dir / "managed_app_stdout.log"
-    stderr_file = logs_dir / "managed_app_stderr.log"
-    
     logs = []
-    
-    for log_file in [stdout_file, stderr_file]:
-        if log_file.exists():
-            try:
-                with open(log_file) as f:
-                    content = f.read()
-                    if content:
-                        logs.append(f"=== {log_file.name} ===")
-                        logs.append(content)
-            except Exception as e:
-                logs.append(f"Error reading {log_file.name}: {str(e)}")
-    
-    return {"logs": "\n".join(logs) if logs else "No logs available"}
\ No newline at end of file
+
+    for stream in STREAMS:
+        content = tail_text(stream, logs_dir=get_app_logs_dir())
+        if content:
+            logs.append(f"=== {stream} ===")
+            logs.append(content)
+
+    return {"logs": "\n".join(logs) if logs else "No logs available"}
+
+@router.get("/logs/lines")
+async def get_log_lines(stream: str = "stdout", tail: Optional[int] = None, since: Optional[float] = None,
+                        after: Optional[int] = None, limit: int = LOG_TAIL_LINES) -> Dict[str, Any]:
+    """Lines of a managed app stream: the last `tail`, those logged at or after
+    the `since` timestamp, or those after sequence number `after` (for polling)."""
+    if stream not in STREAMS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream: {stream}")
+    store = get_log_store(stream, get_app_logs_dir())
+    if store is None:
+        raise HTTPException(status_code=500, detail="App logs directory not configured")
+    limit = max(1, min(limit, 10000))
+    if after is not None:
+        lines = store.after(after, limit)
+    elif since is not None:
+        lines = store.since(since, limit)
+    else:
+        lines = store.tail(min(tail or limit, limit))
+    return {"stream": stream, "last_seq": store.last_seq(), "lines": lines}
+
+@router.get("/logs/search")
+def search_logs(level: Optional[str] = None, status: Optional[int] = None, status_min: Optional[int] = None,
+                path: Optional[str] = None, kind: Optional[str] = None, stream: Optional[str] = None,
+                q: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+                before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+    """Search parsed managed app log records (access lines, log lines, tracebacks), newest first.
+
+    All filters combine; path is a prefix and q a substring of the message.
+    Pass next_before from a response as before to get the next page. Sync, so
+    the index catching up (parsing and a write transaction) runs in the threadpool.
+    """
+    index = get_log_index(get_app_logs_dir())
+    if index is None:
+        raise HTTPException(status_code=500, detail="App logs directory not configured")
+    if kind is not None and kind not in ("access", "log", "traceback"):
+        raise HTTPException(status_code=400, detail=f"Unknown record kind: {kind}")
+    return index.search(level=level, status=status, status_min=status_min, path=path, kind=kind,
+                        stream=stream, query=q, since=since, until=until, before=before,
+                        limit=max(1, min(limit, 1000)))
@@ -0,0 +1,36 @@
+import json
+import os
+import time
+from pathlib import Path
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict
+from supervisor import STATUS_FILE_NAME
+from projects import current_project
+
+router = APIRouter()
+
+@router.get("/processes")
+async def get_processes() -> Dict[str, Any]:
+    """Get the supervisor's view of the designer and managed app processes.
+
+    The managed app is the default project's; other projects only see the designer.
+    """
+    logs_dir = os.getenv('LOGS_DIR')
+    if not logs_dir:
+        raise HTTPException(status_code=500, detail="Logs directory not configured")
+    status_file = Path(logs_dir) / STATUS_FILE_NAME
+    if not status_file.exists():
+        return {"children": {}}
+    try:
+        with open(status_file) as f:
+            status = json.load(f)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read process status: {str(e)}")
+
+    if current_project() is not None:
+        status.get("children", {}).pop("managed-app", None)
+    now = time.time()
+    for child in status.get("children", {}).values():
+        running = child.get("state") == "running" and child.get("started_at")
+        child["uptime"] = round(now - child["started_at"], 1) if running else 0
+    return status
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Any, Dict, List
+from projects import activate, get_project_registry
+
+router = APIRouter()
+
+async def use_project(project_id: str):
+    """Route dependency of /api/projects/{project_id}/...: run the request against that project.
+
+    Async so the project is set in the request's own context, which the
+    endpoint (and anything it runs in the thread pool) inherits.
+    """
+    try:
+        activate(get_project_registry().get(project_id))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Project not found: {project_id}")
+
+class ProjectRequest(BaseModel):
+    path: str
+
+@router.get("/projects")
+async def list_projects() -> List[Dict[str, Any]]:
+    """The managed directories this designer serves; each one's API is under /api/projects/{id}/."""
+    registry = get_project_registry()
+    return [{**project.status(), "default": project.id == registry.default_id} for project in registry.list()]
+
+@router.post("/projects")
+async def register_project(request: ProjectRequest) -> Dict[str, Any]:
+    try:
+        project = get_project_registry().register(request.path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return project.status()
+
+@router.delete("/projects/{project_id}")
+async def unregister_project(project_id: str) -> Dict[str, str]:
+    """Stop serving a project; its files and caches are left in place."""
+    registry = get_project_registry()
+    if project_id == registry.default_id:
+        raise HTTPException(status_code=400, detail="The default project cannot be removed")
+    try:
+        registry.unregister(project_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Project not found: {project_id}")
+    return {"status": "success", "message": f"Project {project_id} removed"}
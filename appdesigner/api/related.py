@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
+from embeddings import get_embedding_index, EmbeddingsUnavailable
+from projects import get_managed_dir
+
+router = APIRouter()
+
+def get_index():
+    managed_dir = get_managed_dir()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    try:
+        return get_embedding_index(managed_dir)
+    except EmbeddingsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/related")
+def get_related(query: str, limit: int = 10, path: Optional[str] = None) -> Dict[str, Any]:
+    """The chunks of the managed files closest in meaning to a query, and their files.
+
+    The first request starts building the index in the background; until it
+    is ready (index.ready), results are empty.
+    """
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    index = get_index()
+    chunks = index.search(query, limit=max(1, min(limit, 100)), path=path)
+    files: Dict[str, float] = {}
+    for chunk in chunks:
+        files.setdefault(chunk["path"], chunk["score"])
+    return {
+        "query": query,
+        "chunks": chunks,
+        "files": [{"path": file_path, "score": score} for file_path, score in files.items()],
+        "index": index.stats(),
+    }
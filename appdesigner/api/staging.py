@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from staging import get_staging_manager, StagingError, StagingConflict, StagingPathError
+from contextcache import get_context_resolver
+from symbols import get_symbol_index
+from projects import get_managed_dir
+
+router = APIRouter()
+
+def get_manager():
+    managed_dir = get_managed_dir()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    return get_staging_manager(managed_dir)
+
+def get_workspace(workspace_id: str):
+    try:
+        return get_manager().get(workspace_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Staging workspace not found: {workspace_id}")
+
+class StagingRequest(BaseModel):
+    changes: Dict[str, str]  # path -> new content
+    instruction: Optional[str] = None
+    start: bool = True  # Start a preview app right away
+
+@router.get("/staging")
+async def list_workspaces() -> List[Dict[str, Any]]:
+    """List the staging workspaces and their preview apps."""
+    return [workspace.status() for workspace in get_manager().list()]
+
+@router.post("/staging")
+async def create_workspace(request: StagingRequest) -> Dict[str, Any]:
+    """Stage a change-set in a shadow copy of the managed directory, optionally previewing it.
+
+    If the preview fails to start the workspace is removed.
+    """
+    try:
+        workspace = get_manager().create(request.changes, request.instruction)
+    except StagingPathError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StagingError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        return workspace.start_preview() if request.start else workspace.status()
+    except StagingError as e:
+        workspace.remove()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/staging/{workspace_id}")
+async def get_workspace_status(workspace_id: str) -> Dict[str, Any]:
+    return get_workspace(workspace_id).status()
+
+@router.post("/staging/{workspace_id}/changes")
+async def stage_more_changes(workspace_id: str, changes: Dict[str, str]) -> Dict[str, Any]:
+    """Add or replace staged files; a running preview reloads them."""
+    workspace = get_workspace(workspace_id)
+    try:
+        workspace.stage(changes)
+    except StagingPathError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return workspace.status()
+
+@router.post("/staging/{workspace_id}/start")
+async def start_preview(workspace_id: str) -> Dict[str, Any]:
+    try:
+        return get_workspace(workspace_id).start_preview()
+    except StagingError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/staging/{workspace_id}/stop")
+async def stop_preview(workspace_id: str) -> Dict[str, Any]:
+    workspace = get_workspace(workspace_id)
+    workspace.stop_preview()
+    return workspace.status()
+
+@router.post("/staging/{workspace_id}/promote")
+async def promote_workspace(workspace_id: str, force: bool = False) -> Dict[str, Any]:
+    """Apply the staged change-set to the live managed directory and remove the workspace.
+
+    Answers 409 if a staged file was changed in the live directory since it
+    was staged, unless force is set.
+    """
+    manager = get_manager()
+    get_workspace(workspace_id)
+    try:
+        results = manager.promote(workspace_id, force)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Staging workspace not found: {workspace_id}")
+    except StagingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except StagingError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    resolver = get_context_resolver(manager.managed_dir)
+    for result in results.values():
+        resolver.invalidate(result["relative_path"])
+    get_symbol_index(manager.managed_dir).invalidate()
+    return {"status": "success", "files": [result["relative_path"] for result in results.values()]}
+
+@router.delete("/staging/{workspace_id}")
+async def discard_workspace(workspace_id: str) -> Dict[str, str]:
+    """Stop the preview app and delete the workspace, leaving the live directory untouched."""
+    get_workspace(workspace_id).remove()
+    return {"status": "success", "message": f"Staging workspace {workspace_id} discarded"}
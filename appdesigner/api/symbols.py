@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List, Optional
+from symbols import get_symbol_index
+from projects import get_managed_dir
+
+router = APIRouter()
+
+def get_index():
+    managed_dir = get_managed_dir()
+    if not managed_dir:
+        raise HTTPException(status_code=500, detail="No managed directory configured")
+    return get_symbol_index(managed_dir)
+
+# Sync routes: a lookup may first refresh the index (walking and parsing the
+# tree), which runs in the threadpool rather than on the event loop
+
+@router.get("/symbols")
+def get_symbols(prefix: str = '', kind: Optional[str] = None, path: Optional[str] = None,
+                limit: int = 50) -> List[Dict[str, Any]]:
+    """Look up classes, functions, routes and selectors by name prefix."""
+    index = get_index()
+    if path and not prefix and not kind:
+        return index.file_symbols(path)
+    return index.lookup(prefix, kind=kind, path=path, limit=min(limit, 500))
+
+@router.get("/symbols/source")
+def get_symbol_source(path: str, name: str) -> Dict[str, Any]:
+    """Get the source lines of one symbol, identified by file and qualified name."""
+    symbol = get_index().get_source(path, name)
+    if symbol is None:
+        raise HTTPException(status_code=404, detail=f"Symbol not found: {name} in {path}")
+    return symbol
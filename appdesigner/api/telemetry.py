@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from typing import Any, Dict, Optional
+from telemetry import get_sampler
+from projects import current_project
+
+router = APIRouter()
+
+@router.get("/telemetry")
+def get_telemetry(since: Optional[float] = None) -> Dict[str, Any]:
+    """Get the managed app's resource and latency samples, optionally only those after since.
+
+    Only the default project's app runs under the supervisor, so other
+    projects get an empty series.
+    """
+    series = get_sampler().get_series(since)
+    if current_project() is not None:
+        series.update(samples=[], markers=[])
+    return series
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List, Optional
+from usage import get_usage_ledger, MODEL_PRICES
+from filemanager import project_id
+from projects import get_managed_dir
+
+router = APIRouter()
+
+def current_project_id() -> Optional[str]:
+    """The ledger's id of the project the request is for."""
+    managed_dir = get_managed_dir()
+    return project_id(managed_dir) if managed_dir else None
+
+@router.get("/usage")
+async def get_usage(group_by: str = "context", since: Optional[float] = None, limit: int = 50) -> Dict[str, Any]:
+    """Aggregate the project's token usage and cost by context, file, day or mode."""
+    try:
+        rows = get_usage_ledger().summary(current_project_id(), group_by, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_by": group_by, "rows": rows}
+
+@router.get("/usage/instructions")
+async def get_recent_usage(limit: int = 50) -> List[Dict[str, Any]]:
+    """Get the project's latest instructions with their per-file token attribution."""
+    return get_usage_ledger().recent(current_project_id(), limit)
+
+@router.get("/usage/prices")
+async def get_prices() -> Dict[str, Dict[str, float]]:
+    """Get the per million token prices used to compute costs."""
+    return {
+        model: dict(zip(("input", "output", "cache_write", "cache_read"), prices))
+        for model, prices in MODEL_PRICES.items()
+    }
@@ -0,0 +1,102 @@
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from rich.console import Console
+from treewalk import walk_tree
+from transport import TokenBucket, RateLimitedTransport, transport_from_env
+from usage import sum_usage
+
+DEFAULT_EXTENSIONS = ['.py', '.js', '.html', '.css', '.json', '.txt', '.md']
+REPORT_FIELDS = ["project", "outcome", "seconds", "requests", "input_tokens", "output_tokens", "cost",
+                 "files_sent", "files_written", "message"]
+console = Console()
+
+def project_files(directory: Path, extensions: List[str]) -> List[str]:
+    """The files of a project to send with the instruction, skipping ignored ones."""
+    extensions = {ext.lower() for ext in extensions}
+    return sorted(rel_path for rel_path, _ in walk_tree(directory) if Path(rel_path).suffix.lower() in extensions)
+
+def run_project(directory: Path, instruction: str, counter: int, requests: Optional[TokenBucket],
+                tokens: Optional[TokenBucket], extensions: List[str], validate: bool = True) -> Dict[str, Any]:
+    """Apply an instruction to one project with its own agent, returning its report row."""
+    from api.agent import Agent  # Deferred: pulls in the whole designer
+    started = time.perf_counter()
+    row = {"project": str(directory), "outcome": "error", "requests": 0, "input_tokens": 0, "output_tokens": 0,
+           "cost": 0.0, "files_sent": 0, "files_written": 0, "message": ""}
+    try:
+        files = project_files(directory, extensions)
+        agent = Agent()
+        agent.api_agent.transport = RateLimitedTransport(transport_from_env(), requests, tokens)
+        message, _, result = agent.process_user_instruction(instruction, counter, files, directory=directory,
+                                                            context=f"batch:{directory.name}", validate=validate)
+        total = sum_usage(result.get("usages", []))
+        row.update(
+            outcome=result.get("outcome", "error"),
+            requests=total["requests"],
+            input_tokens=total["input_tokens"],
+            output_tokens=total["output_tokens"],
+            cost=round(total["cost"], 6),
+            files_sent=len(files),
+            files_written=len(result.get("written", {})),
+            message=message["response"] if isinstance(message, dict) else message
+        )
+    except Exception as e:
+        row["message"] = str(e)
+    row["seconds"] = round(time.perf_counter() - started, 3)
+    return row
+
+def write_report(rows: List[Dict[str, Any]], path: Path):
+    """Write the report as CSV if the path ends in .csv, else as JSON with a summary."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == '.csv':
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return
+    outcomes: Dict[str, int] = {}
+    for row in rows:
+        outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+    latencies = sorted(row["seconds"] for row in rows)
+    summary = {
+        "projects": len(rows),
+        "outcomes": outcomes,
+        "input_tokens": sum(row["input_tokens"] for row in rows),
+        "output_tokens": sum(row["output_tokens"] for row in rows),
+        "cost": round(sum(row["cost"] for row in rows), 6),
+        "median_seconds": latencies[len(latencies) // 2] if latencies else 0,
+        "max_seconds": latencies[-1] if latencies else 0,
+    }
+    with open(path, 'w') as f:
+        json.dump({"summary": summary, "projects": rows}, f, indent=2)
+
+def run_batch(projects: List[Path], instruction: str, concurrency: int = 4, requests_per_minute: float = 50,
+              tokens_per_minute: float = 0, extensions: Optional[List[str]] = None,
+              validate: bool = True) -> List[Dict[str, Any]]:
+    """Apply one instruction to many projects, concurrency at a time, under shared rate limits.
+
+    Projects run in threads: the work is waiting on the API, and file
+    validation already has its own process pool. Rows come back in the
+    order of projects.
+    """
+    extensions = extensions or DEFAULT_EXTENSIONS
+    # A burst of a few seconds' worth, so a full pool does not trip the API limits on start
+    requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 12)) if requests_per_minute else None
+    tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+    counter = int(time.time())
+    rows: Dict[Path, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(run_project, project, instruction, counter, requests, tokens, extensions, validate): project
+            for project in projects
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows[futures[future]] = row
+            color = "green" if row["outcome"] == "ok" else "red"
+            console.print(f"[{done}/{len(projects)}] [{color}]{row['outcome']}[/{color}] {row['project']} "
+                          f"({row['seconds']}s, {row['input_tokens'] + row['output_tokens']:,} tokens)")
+    return [rows[project] for project in projects]
@@ -1,39 +1,78 @@
 import os
-from typing import Optional, List, Tuple
-from anthropic import Anthropic
-from anthropic.types import MessageParam
+import time
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from rich.console import Console
+from transport import Transport, transport_from_env
+from metrics import stage, LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, LLM_REQUESTS_TOTAL, LLM_TOKENS
 
 VERBOSE = os.getenv('VERBOSE_MODE', '').lower() in ('true', '1', 'yes')
+MODEL = "claude-3-5-sonnet-20241022"
 console = Console()
 
 class APIAgent:
-    def __init__(self, api_key: Optional[str] = None, system_prompt: Optional[str] = None):
-        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("API key must be provided or set in ANTHROPIC_API_KEY environment variable")
-        self.client = Anthropic(api_key=self.api_key)
+    def __init__(self, api_key: Optional[str] = None, system_prompt: Optional[str] = None,
+                 transport: Optional[Transport] = None):
+        # The transport is chosen by LLM_TRANSPORT unless given; only the
+        # real API needs a key, replay and synthetic run offline
+        self.api_key = api_key
+        self._transport = transport
         self.system_prompt = system_prompt
+        self.last_usage: Optional[Dict[str, Any]] = None
 
-    def request(self, prompt: str, max_tokens: int = 4000) -> str:
+    @property
+    def transport(self) -> Transport:
+        """Created on first use so importing the app needs neither the SDK nor a key."""
+        if self._transport is None:
+            self._transport = transport_from_env(self.api_key)
+        return self._transport
+
+    @transport.setter
+    def transport(self, transport: Transport):
+        self._transport = transport
+
+    def request(self, prompt: str, max_tokens: int = 4000, system_prompt: Optional[str] = None,
+                usage: Optional[List[Dict[str, Any]]] = None,
+                on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Send a prompt and return the response text.
+
+        system_prompt overrides self.system_prompt for this call only, which
+        keeps concurrent requests from stepping on each other. The token usage
+        and latency of the call are appended to usage when given, and kept in
+        self.last_usage. on_text, if given, also receives the text as it streams in.
+        """
+        system_prompt = system_prompt or self.system_prompt
         if VERBOSE:
-            if self.system_prompt:
+            if system_prompt:
                 console.print("\n[yellow]System Prompt:[/yellow]")
-                console.print(self.system_prompt)
+                console.print(system_prompt)
             console.print("\n[yellow]User Prompt:[/yellow]")
             console.print(prompt)
         
-        messages: List[MessageParam] = [{"role": "user", "content": prompt}]
-        
+        request = {"model": MODEL, "system": system_prompt, "prompt": prompt, "max_tokens": max_tokens}
+        chunks: List[str] = []
+        started = time.perf_counter()
+
+        def receive(text: str):
+            # Streamed so the time to first token can be measured
+            if not chunks:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            chunks.append(text)
+            if on_text:
+                on_text(text)
+
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=max_tokens,
-                system=self.system_prompt,
-                messages=messages
-            )
+            with stage("api_request"):
+                call_usage = self.transport.complete(request, receive)
             
-            response_text = response.content[0].text
+            latency = time.perf_counter() - started
+            LLM_REQUEST_SECONDS.observe(latency)
+            LLM_REQUESTS_TOTAL.inc(outcome="ok")
+            LLM_TOKENS.observe(call_usage["input_tokens"], direction="input")
+            LLM_TOKENS.observe(call_usage["output_tokens"], direction="output")
+            self.last_usage = dict(call_usage, model=MODEL, latency=round(latency, 3))
+            if usage is not None:
+                usage.append(self.last_usage)
+            response_text = "".join(chunks)
             
             if VERBOSE:
                 console.print("\n[yellow]Claude Response:[/yellow]")
@@ -45,6 +84,7 @@ class APIAgent:
             # Check for overloaded error
             error_str = str(e)
             if "overloaded_error" in error_str or "Error code: 529" in error_str:
+                LLM_REQUESTS_TOTAL.inc(outcome="overloaded")
                 raise Exception("Claude API is currently overloaded. Please try again in a few moments.")
+            LLM_REQUESTS_TOTAL.inc(outcome="error")
             raise e
-
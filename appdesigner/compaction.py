@@ -0,0 +1,244 @@
+import ast
+import io
+import os
+import re
+import tokenize
+from typing import Any, Dict, List, Optional, Tuple
+from filemanager import estimate_tokens
+
+# Total prompt budget: system + files + instruction + reserved output tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '150000'))
+# Files smaller than this are not worth turning into an outline
+OUTLINE_MIN_TOKENS = int(os.getenv('OUTLINE_MIN_TOKENS', '1500'))
+
+GENERATED_NAMES = re.compile(r'(\.min\.(js|css)|\.map|-lock\.json|\.lock)$')
+GENERATED_MARKERS = ('@generated', 'do not edit', 'auto-generated', 'autogenerated')
+OUTLINE_EXTENSIONS = {'.py', '.js', '.jsx', '.ts', '.tsx'}
+JS_DECLARATION = re.compile(
+    r'^\s*(export\s+)?(default\s+)?(async\s+)?(function\b|class\b|'
+    r'(const|let|var)\s+\w+\s*=\s*(async\s+)?(\([^)]*\)|\w+)\s*=>|'
+    r'(static\s+)?(async\s+)?(get\s+|set\s+)?\w+\s*\([^)]*\)\s*\{)'
+)
+JS_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'function'}
+
+class PromptBudgetError(Exception):
+    """Raised when a prompt cannot be compacted below the token budget."""
+
+    def __init__(self, message: str, report: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.report = report
+
+def strip_whitespace(content: str) -> str:
+    """Drop trailing whitespace and collapse runs of blank lines."""
+    lines = [line.rstrip() for line in content.splitlines()]
+    result = []
+    for line in lines:
+        if not line and result and not result[-1]:
+            continue
+        result.append(line)
+    return '\n'.join(result).strip('\n') + '\n'
+
+def _strip_python_comments(content: str) -> str:
+    try:
+        tokens = [tok for tok in tokenize.generate_tokens(io.StringIO(content).readline)
+                  if tok.type != tokenize.COMMENT]
+        return tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return content
+
+def _strip_c_comments(content: str, line_comments: bool = True) -> str:
+    """Remove /* */ (and optionally //) comments outside of string literals."""
+    result = []
+    i, n = 0, len(content)
+    quote = None
+    while i < n:
+        c = content[i]
+        if quote:
+            result.append(c)
+            if c == '\\' and i + 1 < n:
+                result.append(content[i + 1])
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in '"\'`':
+            quote = c
+            result.append(c)
+        elif content.startswith('/*', i):
+            end = content.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif line_comments and content.startswith('//', i) and (i == 0 or content[i - 1] != ':'):
+            end = content.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        else:
+            result.append(c)
+        i += 1
+    return ''.join(result)
+
+def strip_comments(path: str, content: str) -> str:
+    """Remove comments for the languages we can do so safely."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.py':
+        return _strip_python_comments(content)
+    if ext in ('.js', '.jsx', '.ts', '.tsx'):
+        return _strip_c_comments(content)
+    if ext == '.css':
+        return _strip_c_comments(content, line_comments=False)
+    if ext in ('.html', '.htm'):
+        return re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL)
+    return content
+
+def is_generated(path: str, content: str) -> bool:
+    """Heuristically detect minified, bundled or generated files."""
+    if GENERATED_NAMES.search(path.lower()):
+        return True
+    head = content[:1000].lower()
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return True
+    lines = content.count('\n') + 1
+    return len(content) > 5000 and len(content) / lines > 300
+
+def _python_outline(content: str) -> Optional[str]:
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return None
+    source_lines = content.splitlines()
+    out: List[str] = []
+
+    def visit(nodes, depth: int):
+        for node in nodes:
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and depth == 0:
+                out.extend(source_lines[node.lineno - 1:node.end_lineno])
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+                header_end = node.body[0].lineno - 1 if node.body else node.lineno
+                header = source_lines[start - 1:max(header_end, node.lineno)]
+                while len(header) > 1 and (not header[-1].strip() or header[-1].strip().startswith('#')):
+                    header.pop()
+                out.extend(header)
+                indent = ' ' * (node.col_offset + 4)
+                docstring = ast.get_docstring(node)
+                if docstring:
+                    out.append(f'{indent}"""{docstring.splitlines()[0]}"""')
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, depth + 1)
+                out.append(f'{indent}...')
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and depth == 0:
+                if node.end_lineno - node.lineno < 3:
+                    out.extend(source_lines[node.lineno - 1:node.end_lineno])
+                else:
+                    out.append(source_lines[node.lineno - 1] + ' ...')
+
+    visit(tree.body, 0)
+    return '\n'.join(out) + '\n'
+
+def _js_outline(content: str) -> str:
+    out = []
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('import ') or (JS_DECLARATION.match(line)
+                                               and stripped.split('(')[0].strip() not in JS_KEYWORDS):
+            out.append(line.rstrip().rstrip('{').rstrip() + (' { ... }' if line.rstrip().endswith('{') else ''))
+    return '\n'.join(out) + '\n'
+
+def outline(path: str, content: str) -> Optional[str]:
+    """Return a signatures-only view of a Python or JS file, or None."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.py':
+        return _python_outline(content)
+    if ext in OUTLINE_EXTENSIONS:
+        return _js_outline(content)
+    return None
+
+def preflight(files: Dict[str, str], fixed_text: str = '', output_tokens: int = 4000,
+              budget: int = None, compact: bool = True) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Any]]:
+    """Count prompt tokens and compact the files until they fit the budget.
+
+    fixed_text is everything sent besides the files (system prompt, instruction
+    and prompt template). Compaction is applied in increasing order of loss,
+    largest files first, until the prompt fits: whitespace normalisation,
+    dropping generated/minified files, comment stripping and finally outlines
+    of the largest Python/JS files. Every file changed is reported with its
+    mode and must not be written back from the model's output.
+
+    Returns (files to send, compacted files -> compaction mode, report).
+    Raises PromptBudgetError if the prompt still does not fit.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    fixed_tokens = estimate_tokens(fixed_text) + output_tokens
+    original = {path: estimate_tokens(content) for path, content in files.items()}
+    current = dict(files)
+    tokens = dict(original)
+    modes: Dict[str, str] = {}
+    dropped: List[str] = []
+
+    def total() -> int:
+        return fixed_tokens + sum(tokens.values())
+
+    def replace(path: str, content: str, mode: str):
+        current[path] = content
+        tokens[path] = estimate_tokens(content)
+        modes[path] = mode
+
+    if compact and total() > budget:
+        # Not lossless (blank lines in string literals, Markdown hard breaks), so
+        # recorded like the other modes: the model must not write these files back
+        for path in sorted(files, key=lambda p: original[p], reverse=True):
+            stripped = strip_whitespace(files[path])
+            if stripped != files[path]:
+                replace(path, stripped, 'whitespace')
+            if total() <= budget:
+                break
+
+    if compact and total() > budget:
+        for path in list(current):
+            if is_generated(path, files[path]):
+                del current[path]
+                del tokens[path]
+                dropped.append(path)
+
+    largest_first = sorted(current, key=lambda p: tokens[p], reverse=True)
+    if compact and total() > budget:
+        for path in largest_first:
+            stripped = strip_whitespace(strip_comments(path, current[path]))
+            if len(stripped) < len(current[path]):
+                replace(path, stripped, 'no-comments')
+            if total() <= budget:
+                break
+
+    if compact and total() > budget:
+        for path in largest_first:
+            if tokens[path] < OUTLINE_MIN_TOKENS:
+                continue
+            view = outline(path, files[path])
+            if view is not None:
+                replace(path, view, 'outline')
+            if total() <= budget:
+                break
+
+    report = {
+        "budget": budget,
+        "original_tokens": fixed_tokens + sum(original.values()),
+        "final_tokens": total(),
+        "output_tokens": output_tokens,
+        "within_budget": total() <= budget,
+        "compacted": bool(modes or dropped) or total() < fixed_tokens + sum(original.values()),
+        "files": [
+            {
+                "path": path,
+                "original_tokens": original[path],
+                "tokens": tokens.get(path, 0),
+                "action": "dropped" if path in dropped else modes.get(path, "kept"),
+            }
+            for path in files
+        ],
+    }
+    if not report["within_budget"]:
+        raise PromptBudgetError(
+            f"Prompt needs ~{report['final_tokens']:,} tokens after compaction, "
+            f"over the budget of {budget:,}. Remove some files from the context.",
+            report
+        )
+    return current, modes, report
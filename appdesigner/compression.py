@@ -0,0 +1,115 @@
+import gzip
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from httpcache import ENCODING_SUFFIXES, normalize_etag
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+GZIP_SUFFIX, BROTLI_SUFFIX = ENCODING_SUFFIXES
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Codings of an Accept-Encoding header and their q-values (1 when not given, 0 for malformed ones)."""
+    codings = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+def choose_encoding(header: str) -> Optional[str]:
+    """The encoding to compress with: the accepted one with the highest q, brotli on ties. None for q=0 or none."""
+    codings = parse_accept_encoding(header)
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(codings.get(encoding, codings.get("*", 0.0)), -rank, encoding)
+                  for rank, encoding in enumerate(available)]
+    q, _, encoding = max(candidates)
+    return encoding if q > 0 else None
+
+class CompressionMiddleware:
+    """Compress responses with brotli (when installed and accepted) or gzip.
+
+    Only complete bodies of compressible types above minimum_size are
+    compressed; event streams, ranged and already encoded responses pass
+    through untouched. The ETag of a compressed representation gets an
+    encoding suffix so it stays a valid strong validator.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Validators we handed out for compressed bodies name the same resource,
+        # so the app (including StaticFiles) sees them without the suffix
+        scope["headers"] = [
+            (name, b", ".join(normalize_etag(t).encode('latin-1') for t in value.decode('latin-1').split(","))
+             if name == b"if-none-match" else value)
+            for name, value in scope["headers"]
+        ]
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message = {}
+        chunks = []
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if ("content-encoding" in headers or "content-range" in headers
+                        or content_type.startswith("text/event-stream")
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # Held back until we know the body size
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            if len(body) >= self.minimum_size:
+                if encoding == "br":
+                    body = brotli.compress(body, quality=self.brotli_quality)
+                    suffix = BROTLI_SUFFIX
+                else:
+                    body = gzip.compress(body, compresslevel=self.gzip_level)
+                    suffix = GZIP_SUFFIX
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = etag[:-1] + suffix + '"'
+                headers.add_vary_header("Accept-Encoding")
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
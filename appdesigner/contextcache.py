@@ -0,0 +1,153 @@
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from treewalk import walk_tree, read_files_parallel
+from filemanager import read_file_safely, is_text_file, estimate_tokens
+
+class ContextResolver:
+    """Resolve saved contexts into flattened file lists and cache the result.
+
+    A cached resolution records the mtime of every directory it walked and the
+    (mtime, size) of every file it returned. It is reused until one of those
+    changes, so a repeat lookup costs a handful of stat calls instead of a
+    recursive scan plus a read of every file.
+    """
+
+    def __init__(self, managed_dir: Path):
+        self.managed_dir = Path(managed_dir)
+        self._resolved: Dict[str, Tuple[Tuple[str, ...], Dict[str, Any], Dict[str, Tuple[int, int]]]] = {}
+        self._tokens: Dict[str, Tuple[int, int, int]] = {}  # path -> (mtime_ns, size, tokens)
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the flattened files of a context with size and token totals."""
+        items = tuple(item['path'] if isinstance(item, dict) else item
+                      for item in context.get('items', []))
+        with self._lock:
+            cached = self._resolved.get(name)
+        if cached and cached[0] == items and self._is_fresh(cached[2]):
+            return cached[1]
+
+        resolved, signature = self._resolve_items(name, items)
+        with self._lock:
+            self._resolved[name] = (items, resolved, signature)
+        return resolved
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop cached resolutions touching path, or everything if path is None."""
+        with self._lock:
+            if path is None:
+                self._resolved.clear()
+                self._tokens.clear()
+                return
+            path = path.strip('/')
+            self._tokens.pop(path, None)
+            for name, (items, _, _) in list(self._resolved.items()):
+                if any(path == item or path.startswith(item.rstrip('/') + '/') or item.startswith(path + '/')
+                       for item in items):
+                    del self._resolved[name]
+
+    def retain(self, names) -> None:
+        """Forget resolutions for contexts that no longer exist."""
+        with self._lock:
+            for name in list(self._resolved):
+                if name not in names:
+                    del self._resolved[name]
+
+    def _is_fresh(self, signature: Dict[str, Tuple[int, int]]) -> bool:
+        for path, (mtime_ns, size) in signature.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if st.st_mtime_ns != mtime_ns or (size >= 0 and st.st_size != size):
+                return False
+        return True
+
+    def _resolve_items(self, name: str, items: Tuple[str, ...]) -> Tuple[Dict[str, Any], Dict[str, Tuple[int, int]]]:
+        signature: Dict[str, Tuple[int, int]] = {}
+        files: Dict[str, os.stat_result] = {}
+        resolved_items: List[Dict[str, str]] = []
+
+        for item in items:
+            item_path = self.managed_dir / item
+            try:
+                st = item_path.stat()
+            except OSError:
+                resolved_items.append({"path": item, "type": "missing"})
+                # Watch the parent so the item is picked up once it appears
+                parent = str(item_path.parent)
+                if os.path.isdir(parent):
+                    signature[parent] = (os.stat(parent).st_mtime_ns, -1)
+                continue
+
+            if item_path.is_dir():
+                resolved_items.append({"path": item, "type": "directory"})
+                visited_dirs: List[str] = []
+                for rel_path, entry in walk_tree(self.managed_dir, item, include_hidden=False,
+                                                 visited_dirs=visited_dirs):
+                    if rel_path not in files and is_text_file(entry.path):
+                        files[rel_path] = entry.stat()
+                for dir_path in visited_dirs:
+                    try:
+                        signature[dir_path] = (os.stat(dir_path).st_mtime_ns, -1)
+                    except OSError:
+                        pass
+            else:
+                resolved_items.append({"path": item, "type": "file"})
+                files.setdefault(item.strip('/'), st)
+
+        tokens = self.count_tokens(files)
+        file_list = []
+        for rel_path, st in files.items():
+            signature[str(self.managed_dir / rel_path)] = (st.st_mtime_ns, st.st_size)
+            file_list.append({"path": rel_path, "size": st.st_size, "tokens": tokens[rel_path]})
+        file_list.sort(key=lambda f: f["path"])
+
+        return {
+            "name": name,
+            "items": resolved_items,
+            "files": file_list,
+            "file_count": len(file_list),
+            "total_size": sum(f["size"] for f in file_list),
+            "total_tokens": sum(f["tokens"] for f in file_list),
+        }, signature
+
+    def count_tokens(self, files: Dict[str, os.stat_result]) -> Dict[str, int]:
+        """Token counts per file, reading only files changed since last count."""
+        tokens = {}
+        to_read = {}
+        with self._lock:
+            for rel_path, st in files.items():
+                cached = self._tokens.get(rel_path)
+                if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    tokens[rel_path] = cached[2]
+                else:
+                    to_read[rel_path] = str(self.managed_dir / rel_path)
+
+        contents = read_files_parallel(to_read, lambda path: read_file_safely(path)[1])
+        with self._lock:
+            for rel_path, (success, content) in contents.items():
+                count = estimate_tokens(content) if success else 0
+                st = files[rel_path]
+                self._tokens[rel_path] = (st.st_mtime_ns, st.st_size, count)
+                tokens[rel_path] = count
+        return tokens
+
+# One resolver per managed directory, shared by every router in the process
+_resolvers: Dict[str, ContextResolver] = {}
+_resolvers_lock = threading.Lock()
+
+def get_context_resolver(managed_dir: Path) -> ContextResolver:
+    """Get the shared ContextResolver for a managed directory."""
+    key = str(Path(managed_dir).resolve())
+    with _resolvers_lock:
+        if key not in _resolvers:
+            _resolvers[key] = ContextResolver(Path(managed_dir))
+        return _resolvers[key]
+
+def release_context_resolver(managed_dir: Path):
+    """Forget the resolver of a managed directory, freeing its caches."""
+    with _resolvers_lock:
+        _resolvers.pop(str(Path(managed_dir).resolve()), None)
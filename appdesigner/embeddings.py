@@ -0,0 +1,503 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from treewalk import walk_tree
+from filemanager import read_file_safely, get_cache_dir, TEXT_EXTENSIONS
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it there is no embedding index
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single designer process, nothing to lock against
+    fcntl = None
+
+INDEX_VERSION = 1
+# A sentence-transformers model name (e.g. all-MiniLM-L6-v2) to embed with on the CPU;
+# empty, or the package not installed, uses the hashing vectorizer
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', '')
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '384'))  # Hashing vectorizer dimensions
+CHUNK_LINES = 40
+CHUNK_STRIDE = 30  # Consecutive chunks share CHUNK_LINES - CHUNK_STRIDE lines
+MAX_FILE_BYTES = 1024 * 1024  # Larger files are generated or minified, not worth indexing
+EMBED_BATCH = 256
+IVF_MIN_CHUNKS = 4096  # Below this, queries scan every vector
+IVF_NPROBE = int(os.getenv('EMBEDDING_NPROBE', '8'))  # Clusters searched per query
+KMEANS_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+# Minimum seconds between two stat walks of the managed directory
+REFRESH_INTERVAL = float(os.getenv('EMBEDDING_REFRESH_INTERVAL', '2.0'))
+
+WORD_RE = re.compile(r'[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+')
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+STOP_WORDS = frozenset(
+    "a an and are as at be by do does for from how in is it of on or that the this to what where which "
+    "who why with file files code handle handles handled self def return import none true false var let const".split()
+)
+PREFIX_LENGTH = 4  # Words also count by their prefix, so "auth" finds "authenticate"
+
+class EmbeddingsUnavailable(Exception):
+    """Raised when the embedding index is used without numpy installed."""
+    pass
+
+def chunk_text(content: str) -> List[Tuple[int, int, str]]:
+    """(first line, last line, text) windows of a file, 1-based and inclusive."""
+    lines = content.splitlines()
+    chunks = []
+    for start in range(0, max(len(lines), 1), CHUNK_STRIDE):
+        window = lines[start:start + CHUNK_LINES]
+        text = "\n".join(window)
+        if text.strip():
+            chunks.append((start + 1, start + len(window), text))
+        if start + CHUNK_LINES >= len(lines):
+            break
+    return chunks
+
+def text_features(text: str) -> Counter:
+    """Identifier words (camelCase and snake_case split), whole identifiers and word prefixes."""
+    features = Counter()
+    for identifier in IDENTIFIER_RE.findall(text):
+        words = [word.lower() for word in WORD_RE.findall(identifier)]
+        if len(words) > 1:
+            features[identifier.lower()] += 1
+        for word in words:
+            if len(word) < 2 or word in STOP_WORDS:
+                continue
+            features[word] += 1
+            if len(word) >= PREFIX_LENGTH:
+                features[word[:PREFIX_LENGTH] + '*'] += 1
+    return features
+
+class HashingEmbedder:
+    """Bag of identifier words hashed into a fixed number of signed buckets.
+
+    Needs no model and no vocabulary, so any file can be embedded alone and
+    the vector of an unchanged chunk never goes stale.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in text_features(text).items():
+                bucket = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dim] += sign * (1.0 + math.log(count))
+        return normalize(vectors)
+
+class ModelEmbedder:
+    """A sentence-transformers model run on the CPU."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = self.model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
+        return normalize(vectors.astype(np.float32))
+
+def normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """The configured embedder, loaded once per process."""
+    global _embedder
+    if np is None:
+        raise EmbeddingsUnavailable("The embedding index needs numpy (pip install numpy)")
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_MODEL:
+                try:
+                    _embedder = ModelEmbedder(EMBEDDING_MODEL)
+                except ImportError:
+                    print(f"sentence-transformers is not installed, not loading {EMBEDDING_MODEL}; "
+                          f"using the hashing vectorizer")
+            if _embedder is None:
+                _embedder = HashingEmbedder()
+        return _embedder
+
+def kmeans(vectors: "np.ndarray", clusters: int, iterations: int = KMEANS_ITERATIONS) -> "np.ndarray":
+    """Spherical k-means centroids (unit length, compared by dot product)."""
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]  # Reseed empty clusters
+        centroids = normalize(sums)
+    return centroids
+
+class EmbeddingIndex:
+    """Persistent vector index over chunks of the files of a managed directory.
+
+    Files are re-chunked only when their content hash changes, and only
+    chunks whose text is new are embedded: the vectors of the others are
+    reused. Vectors are stored as float16 rows of a memmap that only grows
+    (rows of removed chunks are reclaimed by compaction), so 100k chunks of
+    384 dimensions take 75MB, paged in by the OS. Above IVF_MIN_CHUNKS the
+    rows are partitioned by k-means into an inverted file and a query only
+    scores the rows of the IVF_NPROBE clusters closest to it.
+
+    Several designer processes (--production) share the index files: only
+    the holder of the lock file writes, after reloading what another
+    process saved since its last look. Searches read the state last loaded,
+    which stays consistent because compaction replaces the vectors file
+    rather than rewriting it.
+    """
+
+    def __init__(self, managed_dir: Path, index_dir: Optional[Path] = None):
+        self.managed_dir = Path(managed_dir)
+        self.embedder = get_embedder()
+        self.index_dir = index_dir or get_cache_dir(self.managed_dir) / "embeddings"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_file = self.index_dir / "vectors.f16"
+        self.meta_file = self.index_dir / "meta.json"
+        self.centroids_file = self.index_dir / "centroids.npy"
+        self.lock_file = self.index_dir / "write.lock"
+        self._meta_signature: Optional[Tuple[int, int, int]] = None  # meta.json as last loaded or saved
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.rows = 0  # Rows of the memmap in use, live or not
+        self.trained_at = 0  # Live chunks when the centroids were trained
+        self.centroids: Optional["np.ndarray"] = None
+        self._vectors: Optional["np.ndarray"] = None
+        self._row_chunks: Dict[int, Tuple[str, int, int]] = {}  # row -> (path, start, end)
+        self._lists: List["np.ndarray"] = []
+        self._live: Optional["np.ndarray"] = None
+        self._last_refresh = 0.0
+        self._built = False  # Whether this process refreshed the index at least once
+        self._refresh_lock = threading.Lock()  # Held for a whole refresh
+        self._lock = threading.Lock()  # Held while the searched state changes
+        self._load()
+
+    def _load(self):
+        self.files, self.rows, self.trained_at, self.centroids = {}, 0, 0, None
+        self._meta_signature = self._current_meta_signature()
+        try:
+            with open(self.meta_file, 'r') as f:
+                data = json.load(f)
+            if (data.get("version") == INDEX_VERSION and data.get("model") == self.embedder.name
+                    and self.vectors_file.is_file()):
+                self.files = data.get("files", {})
+                self.rows = data.get("rows", 0)
+                self.trained_at = data.get("trained_at", 0)
+                if self.trained_at:
+                    self.centroids = np.load(self.centroids_file)
+        except (OSError, ValueError):
+            self.files, self.rows, self.trained_at, self.centroids = {}, 0, 0, None
+        if not self.files:
+            self.rows = 0
+        self._vectors = None  # The file may have been replaced by another process's compaction
+        self._open_vectors(max(self.rows, 1024))
+        self._rebuild_lists()
+
+    def _current_meta_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.meta_file)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def _writer(self):
+        """Be the only process writing the index, starting from what was saved last."""
+        with open(self.lock_file, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._current_meta_signature() != self._meta_signature:
+                with self._lock:
+                    self._load()  # Another process saved since: append after its rows, not over them
+            yield  # Closing the file releases the lock
+
+    def _open_vectors(self, capacity: int):
+        """Map the vectors file, growing it to capacity rows if it is smaller."""
+        row_bytes = self.embedder.dim * 2
+        if self._vectors is not None:
+            self._vectors.flush()  # Searches keep using the old mapping until the new one replaces it
+        with open(self.vectors_file, 'ab') as f:
+            if f.tell() < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+        capacity = os.path.getsize(self.vectors_file) // row_bytes
+        self._vectors = np.memmap(self.vectors_file, dtype=np.float16, mode='r+', shape=(capacity, self.embedder.dim))
+
+    def _save(self):
+        self._vectors.flush()
+        if self.centroids is not None:
+            np.save(self.centroids_file, self.centroids)
+        tmp_file = self.meta_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({"version": INDEX_VERSION, "model": self.embedder.name, "rows": self.rows,
+                       "trained_at": self.trained_at, "files": self.files}, f)
+        os.replace(tmp_file, self.meta_file)
+        self._meta_signature = self._current_meta_signature()
+
+    def _rebuild_lists(self):
+        """Row lookups and inverted lists from the chunks recorded per file."""
+        row_chunks = {}
+        lists: List[List[int]] = [[] for _ in range(len(self.centroids) if self.centroids is not None else 0)]
+        for path, info in self.files.items():
+            for start, end, row, _digest, cluster in info["chunks"]:
+                row_chunks[row] = (path, start, end)
+                if lists:
+                    lists[cluster].append(row)
+        self._row_chunks = row_chunks
+        self._lists = [np.array(rows, dtype=np.int64) for rows in lists]
+        self._live = np.array(sorted(row_chunks), dtype=np.int64)
+
+    def _append(self, vectors: "np.ndarray") -> List[int]:
+        if self.rows + len(vectors) > len(self._vectors):
+            self._open_vectors(max(2 * len(self._vectors), self.rows + len(vectors)))
+        rows = list(range(self.rows, self.rows + len(vectors)))
+        self._vectors[self.rows:self.rows + len(vectors)] = vectors
+        self.rows += len(vectors)
+        return rows
+
+    def _assign(self, rows: List[int]) -> List[int]:
+        """Nearest centroid of each row, or 0 while the index is not partitioned."""
+        if self.centroids is None or not rows:
+            return [0] * len(rows)
+        clusters = []
+        for i in range(0, len(rows), 8192):
+            batch = np.asarray(self._vectors[rows[i:i + 8192]], dtype=np.float32)
+            clusters.extend(np.argmax(batch @ self.centroids.T, axis=1).tolist())
+        return clusters
+
+    def _train(self):
+        """Partition the live rows into sqrt(n) clusters."""
+        live = np.array(sorted(self._row_chunks), dtype=np.int64)
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= KMEANS_SAMPLE else rng.choice(live, KMEANS_SAMPLE, replace=False)
+        sample_vectors = np.asarray(self._vectors[np.sort(sample)], dtype=np.float32)
+        self.centroids = kmeans(sample_vectors, min(1024, int(math.sqrt(len(live)))))
+        self.trained_at = len(live)
+        for info in self.files.values():
+            clusters = self._assign([chunk[2] for chunk in info["chunks"]])
+            info["chunks"] = [chunk[:4] + [cluster] for chunk, cluster in zip(info["chunks"], clusters)]
+
+    def _compact(self):
+        """Rewrite the vectors file with the live rows only."""
+        live = sorted(self._row_chunks)
+        remap = {row: new_row for new_row, row in enumerate(live)}
+        tmp_file = self.vectors_file.with_suffix('.tmp')
+        compacted = np.memmap(tmp_file, dtype=np.float16, mode='w+', shape=(max(len(live), 1024), self.embedder.dim))
+        for i in range(0, len(live), 8192):
+            compacted[i:i + 8192] = self._vectors[live[i:i + 8192]]
+        compacted.flush()
+        del compacted
+        self._vectors = None
+        os.replace(tmp_file, self.vectors_file)
+        for info in self.files.values():
+            for chunk in info["chunks"]:
+                chunk[2] = remap[chunk[2]]
+        self.rows = len(live)
+        self._open_vectors(self.rows)
+
+    def refresh(self, force: bool = False) -> int:
+        """Bring the index up to date. Returns the number of chunks embedded.
+
+        Files are walked and new chunks embedded while searches go on; they
+        only wait for the changed chunks to be swapped in.
+        """
+        with self._refresh_lock:
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return 0
+            with self._writer():
+                return self._refresh()
+
+    def _refresh(self) -> int:
+        # Chunks with text seen before keep their vector, wherever it was
+        known = {chunk[3]: (chunk[2], chunk[4]) for info in self.files.values() for chunk in info["chunks"]}
+        to_embed: Dict[str, str] = {}
+        embedded = 0
+
+        def embed_pending():
+            # Embedded a batch at a time, so a first build never holds every chunk's text
+            nonlocal embedded
+            digests = list(to_embed)
+            rows = self._append(self.embedder.embed([to_embed[digest] for digest in digests]))
+            for digest, row, cluster in zip(digests, rows, self._assign(rows)):
+                known[digest] = (row, cluster)
+            embedded += len(digests)
+            to_embed.clear()
+
+        seen = set()
+        touched = False
+        changed_files: Dict[str, Dict[str, Any]] = {}
+        for rel_path, entry in walk_tree(self.managed_dir):
+            if os.path.splitext(entry.name)[1].lower() not in TEXT_EXTENSIONS:
+                continue
+            st = entry.stat()
+            if st.st_size > MAX_FILE_BYTES:
+                continue
+            seen.add(rel_path)
+            info = self.files.get(rel_path)
+            if info and info["mtime_ns"] == st.st_mtime_ns and info["size"] == st.st_size:
+                continue
+            success, content = read_file_safely(entry.path)
+            if not success:
+                seen.discard(rel_path)
+                continue
+            digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            if info and info["hash"] == digest:
+                info["mtime_ns"], info["size"] = st.st_mtime_ns, st.st_size
+                touched = True
+                continue
+            chunks = []
+            for start, end, text in chunk_text(content):
+                text = f"{rel_path}\n{text}"  # The path says as much about a chunk as its words
+                chunk_digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+                chunks.append([start, end, chunk_digest])
+                if chunk_digest not in known:
+                    to_embed[chunk_digest] = text
+                    if len(to_embed) >= EMBED_BATCH:
+                        embed_pending()
+            changed_files[rel_path] = {"hash": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                                       "chunks": chunks}
+        if to_embed:
+            embed_pending()
+        removed = set(self.files) - seen
+        if not changed_files and not removed:
+            if touched:
+                with self._lock:
+                    self._save()
+            self._last_refresh = time.monotonic()
+            self._built = True
+            return 0
+
+        for rel_path, info in changed_files.items():
+            chunks = []
+            for start, end, digest in info["chunks"]:
+                row, cluster = known[digest]
+                chunks.append([start, end, row, digest, cluster])
+            info["chunks"] = chunks
+        with self._lock:
+            for rel_path in removed:
+                del self.files[rel_path]
+            self.files.update(changed_files)
+            self._rebuild_lists()
+            live = len(self._row_chunks)
+            if self.rows > 2 * live and self.rows > 1024:
+                self._compact()
+            if live >= IVF_MIN_CHUNKS and live >= 2 * self.trained_at:
+                self._train()  # The clusters no longer fit a corpus that doubled since
+            elif live < IVF_MIN_CHUNKS and self.centroids is not None:
+                self.centroids, self.trained_at = None, 0
+            self._rebuild_lists()
+            self._save()
+        self._last_refresh = time.monotonic()
+        self._built = True
+        return embedded
+
+    def invalidate(self):
+        """Force the next query to re-check the managed directory."""
+        self._last_refresh = 0.0
+
+    @property
+    def ready(self) -> bool:
+        """Whether there is an index to search: built by this process or saved by an earlier one."""
+        return self._built or bool(self.files)
+
+    def refresh_in_background(self):
+        """Start a refresh (the first build, at worst) unless it is recent or already running,
+        so a query never waits for a walk of the managed directory."""
+        if time.monotonic() - self._last_refresh >= REFRESH_INTERVAL and not self._refresh_lock.locked():
+            threading.Thread(target=self.refresh, daemon=True, name="embedding-refresh").start()
+
+    def search(self, query: str, limit: int = 10, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The chunks closest to a query, best first (one per row, so shared text is returned once).
+
+        Empty until the index is ready; see refresh_in_background.
+        """
+        self.refresh_in_background()
+        if not self.ready:
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        with self._lock:
+            if self._lists:
+                probes = np.argsort(-(self.centroids @ query_vector))[:IVF_NPROBE]
+                candidates = np.concatenate([self._lists[probe] for probe in probes])
+            else:
+                candidates = self._live
+            if path:
+                candidates = np.array([row for row in candidates.tolist() if self._row_chunks[row][0] == path],
+                                      dtype=np.int64)
+            if not len(candidates):
+                return []
+            candidates = np.unique(candidates)  # Sorted, for sequential reads of the memmap
+            scores = np.asarray(self._vectors[candidates], dtype=np.float32) @ query_vector
+            top = np.argsort(-scores)[:limit] if len(scores) <= limit else \
+                np.argpartition(-scores, limit)[:limit]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top.tolist():
+                if scores[i] <= 0:
+                    break
+                chunk_path, start, end = self._row_chunks[int(candidates[i])]
+                results.append({"path": chunk_path, "start_line": start, "end_line": end,
+                                "score": round(float(scores[i]), 4)})
+            return results
+
+    def related_files(self, query: str, limit: int = 5, exclude: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Files ranked by their best matching chunk."""
+        exclude = set(exclude or [])
+        files: Dict[str, float] = {}
+        for chunk in self.search(query, limit=max(50, limit * 10)):
+            if chunk["path"] not in exclude and chunk["path"] not in files:
+                files[chunk["path"]] = chunk["score"]
+        return [{"path": path, "score": score} for path, score in list(files.items())[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.embedder.name,
+            "dim": self.embedder.dim,
+            "files": len(self.files),
+            "chunks": len(self._row_chunks),
+            "rows": self.rows,
+            "clusters": len(self._lists),
+            "ready": self.ready,
+        }
+
+_indexes: Dict[str, EmbeddingIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_embedding_index(managed_dir: Path) -> EmbeddingIndex:
+    """Get the shared EmbeddingIndex for a managed directory (EmbeddingsUnavailable without numpy)."""
+    key = str(Path(managed_dir).resolve())
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = EmbeddingIndex(Path(managed_dir))
+        return _indexes[key]
+
+def invalidate_embedding_index(managed_dir: Path):
+    """Mark the index of a managed directory stale, if one was loaded."""
+    with _indexes_lock:
+        index = _indexes.get(str(Path(managed_dir).resolve()))
+    if index:
+        index.invalidate()
+
+def release_embedding_index(managed_dir: Path):
+    """Forget the index of a managed directory, freeing its memory."""
+    with _indexes_lock:
+        _indexes.pop(str(Path(managed_dir).resolve()), None)
@@ -1,8 +1,18 @@
 import os
+import re
 import json
+import hashlib
+import shutil
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, TextIO, Tuple
 from fastapi import HTTPException
+from treewalk import walk_tree, read_files_parallel
+from metrics import BYTES_WRITTEN, FILES_WRITTEN_TOTAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single designer process, nothing to lock against
+    fcntl = None
 
 class NoChangesFoundError(Exception):
     """Raised when no change instructions were found in the response."""
@@ -23,8 +33,13 @@ class FileManager:
         self.managed_dir = Path(directory)
         self.contexts_file = self.managed_dir / "contexts.json"  # Add this line
 
-    def get_managed_files(self, extensions=None) -> Dict[str, str]:
-        """Get all managed files with their contents."""
+    def get_managed_files(self, extensions=None, max_workers: int = None) -> Dict[str, str]:
+        """Get all managed files with their contents.
+
+        Ignored subtrees (.gitignore, .appdesignerignore and the built-in
+        defaults such as node_modules or .venv) are pruned during the walk and
+        the matching files are read in parallel.
+        """
         if not extensions:
             extensions = ['.py', '.js', '.html', '.css', '.json', '.txt', '.md']
             
@@ -32,16 +47,16 @@ class FileManager:
         if not self.managed_dir or not self.managed_dir.exists():
             return managed_files
 
-        for root, _, files in os.walk(self.managed_dir):
-            for file in files:
-                filepath = Path(root) / file
-                if filepath.suffix in extensions:
-                    try:
-                        relative_path = filepath.relative_to(self.managed_dir)
-                        managed_files[str(relative_path)] = self.read_file(str(filepath))
-                    except Exception as e:
-                        if self.verbose:
-                            print(f"Could not read file {filepath}: {e}")
+        paths = {
+            relative_path: entry.path
+            for relative_path, entry in walk_tree(self.managed_dir)
+            if os.path.splitext(entry.name)[1] in extensions
+        }
+        for relative_path, (success, content) in read_files_parallel(paths, self.read_file, max_workers).items():
+            if success:
+                managed_files[relative_path] = content
+            elif self.verbose:
+                print(f"Could not read file {paths[relative_path]}: {content}")
         return managed_files
 
     def get_relative_path(self, absolute_path: str) -> str:
@@ -54,11 +69,14 @@ class FileManager:
     def apply_file_changes(self, changes: Dict[str, str]) -> Dict[str, Dict[str, str]]:
         """Apply changes to files in managed directory."""
         results = {}
+        bytes_written = 0
         for filepath, content in changes.items():
             try:
                 full_path = self.managed_dir / filepath
                 full_path.parent.mkdir(parents=True, exist_ok=True)
                 full_path.write_text(content, encoding='utf-8')
+                bytes_written += len(content.encode('utf-8'))
+                FILES_WRITTEN_TOTAL.inc()
                 abs_path = str(full_path.absolute())
                 results[abs_path] = {
                     "status": "success",
@@ -70,6 +88,41 @@ class FileManager:
                     "status": f"error: {str(e)}",
                     "relative_path": self.get_relative_path(abs_path)
                 }
+        BYTES_WRITTEN.observe(bytes_written)
+        return results
+
+    def apply_change_set(self, changes: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+        """Apply several file changes as one unit.
+
+        Every new content is first written to a temporary file next to its
+        target; only when all of them are staged are they renamed into place.
+        If staging fails nothing in the managed directory is modified.
+        """
+        staged = []
+        bytes_written = 0
+        try:
+            for filepath, content in changes.items():
+                full_path = self.managed_dir / filepath
+                full_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = full_path.with_name(f".{full_path.name}.appdesigner-tmp")
+                tmp_path.write_text(content, encoding='utf-8')
+                bytes_written += len(content.encode('utf-8'))
+                staged.append((tmp_path, full_path))
+        except Exception as e:
+            for tmp_path, _ in staged:
+                tmp_path.unlink(missing_ok=True)
+            raise FileManagerError(f"Failed to stage changes for {filepath}: {str(e)}") from e
+
+        results = {}
+        for tmp_path, full_path in staged:
+            os.replace(tmp_path, full_path)
+            abs_path = str(full_path.absolute())
+            results[abs_path] = {
+                "status": "success",
+                "relative_path": self.get_relative_path(abs_path)
+            }
+        FILES_WRITTEN_TOTAL.inc(len(staged))
+        BYTES_WRITTEN.observe(bytes_written)
         return results
 
     def read_file(self, filename: str) -> str:
@@ -196,17 +249,98 @@ def read_file_safely(filepath: str) -> Tuple[bool, str]:
             return False, ''
     return False, ''
 
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.py', '.js', '.ts', '.html', '.css', '.json', '.xml',
+    '.yaml', '.yml', '.ini', '.conf', '.sh', '.bash', '.zsh', '.fish',
+    '.cpp', '.c', '.h', '.hpp', '.java', '.kt', '.rs', '.go', '.rb',
+    '.php', '.pl', '.pm', '.r', '.scala', '.sql', '.vue', '.jsx', '.tsx'
+}
+
 def is_text_file(filepath: str) -> bool:
     """Check if a file is likely to be text-based."""
-    text_extensions = {
-        '.txt', '.md', '.py', '.js', '.ts', '.html', '.css', '.json', '.xml',
-        '.yaml', '.yml', '.ini', '.conf', '.sh', '.bash', '.zsh', '.fish',
-        '.cpp', '.c', '.h', '.hpp', '.java', '.kt', '.rs', '.go', '.rb',
-        '.php', '.pl', '.pm', '.r', '.scala', '.sql', '.vue', '.jsx', '.tsx'
-    }
-    
-    if Path(filepath).suffix.lower() in text_extensions:
+    if Path(filepath).suffix.lower() in TEXT_EXTENSIONS:
         return True
     
     is_text, _ = read_file_safely(filepath)
     return is_text
+
+def estimate_tokens(text: str) -> int:
+    """Estimate token count using GPT tokenization rules."""
+    # Simple estimation: split on whitespace and punctuation
+    tokens = re.findall(r'\w+|[^\w\s]', text)
+    # Add 20% overhead for special tokens and subword tokenization
+    return int(len(tokens) * 1.2)
+
+def content_hash(content: str) -> str:
+    """Version hash of a text file's content, used for optimistic concurrency on saves."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def apply_text_edits(content: str, edits: List[Tuple[int, int, str]]) -> str:
+    """Apply (start, end, text) range replacements, offsets in characters of content.
+
+    Ranges must be in bounds and must not overlap. Edits at the same range
+    (e.g. several inserts at one offset) are applied in the order given.
+    """
+    ordered = sorted(edits, key=lambda edit: (edit[0], edit[1]))  # Stable: ties keep their order
+    previous_end = 0
+    for start, end, _ in ordered:
+        if not 0 <= start <= end <= len(content):
+            raise ValueError(f"Edit range {start}-{end} is outside the content (length {len(content)})")
+        if start < previous_end:
+            raise ValueError(f"Edit range {start}-{end} overlaps a previous edit")
+        previous_end = end
+    pieces = []
+    position = 0
+    for start, end, text in ordered:
+        pieces.append(content[position:start])
+        pieces.append(text)
+        position = end
+    pieces.append(content[position:])
+    return ''.join(pieces)
+
+def write_text_atomic(path: Path, content: str):
+    """Write content through a temporary file renamed over path, keeping its permissions."""
+    tmp_path = path.with_name(f".{path.name}.appdesigner-tmp")
+    try:
+        tmp_path.write_text(content, encoding='utf-8')
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def lock_file(path: Path, blocking: bool = True) -> Optional[TextIO]:
+    """Open path and take an exclusive flock on it, which every designer worker
+    process (and every thread, each opening the file itself) contends for.
+    Close the returned file to release the lock.
+
+    Returns None if blocking is False and the lock is held elsewhere. Without
+    fcntl the file is returned unlocked. The directory must exist.
+    """
+    f = open(path, 'a')
+    if fcntl:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        except BaseException:
+            f.close()
+            raise
+    return f
+
+# Per-project derived data (indexes, caches) lives outside the managed directory
+CACHE_DIR_NAME = ".appdesigner_cache"
+
+def project_id(managed_dir: Path) -> str:
+    """Stable identifier of a managed directory: its name and a hash of its path."""
+    managed_dir = Path(managed_dir).resolve()
+    digest = hashlib.sha1(str(managed_dir).encode('utf-8')).hexdigest()[:12]
+    return f"{managed_dir.name}-{digest}"
+
+def get_cache_dir(managed_dir: Path) -> Path:
+    """Get (and create) the cache directory for a managed directory."""
+    cache_dir = Path.home() / CACHE_DIR_NAME / project_id(managed_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
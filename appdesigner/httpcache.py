@@ -0,0 +1,79 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+from fastapi import Request, Response
+from treewalk import GITIGNORE_FILE, CUSTOM_IGNORE_FILE
+
+# Browsers may cache but must revalidate with If-None-Match every time
+CACHE_CONTROL = "no-cache"
+# Appended to the ETag of a compressed representation (see compression.py)
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+def stat_etag(st: os.stat_result) -> str:
+    """Strong ETag from a stat signature: changes whenever the file is rewritten."""
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+def ignore_files_signature(base_dir: Path, rel_dir: str = '') -> str:
+    """Stat signature of the ignore files from base_dir down to rel_dir, which decide what is listed."""
+    lines = []
+    ignore_dirs = [base_dir]
+    for part in Path(rel_dir).parts if rel_dir else []:
+        ignore_dirs.append(ignore_dirs[-1] / part)
+    for directory in ignore_dirs:
+        for name in (GITIGNORE_FILE, CUSTOM_IGNORE_FILE):
+            try:
+                st = os.stat(directory / name)
+                lines.append(f"{directory}/{name}:{st.st_mtime_ns}:{st.st_size}\n")
+            except OSError:
+                pass
+    return "".join(lines)
+
+def listing_etag(base_dir: Path, rel_dir: str = '') -> str:
+    """ETag of one directory level as served by /api/files.
+
+    Covers the stat signature of every entry (so edits change the token
+    counts' tag too) and of the ignore files from base_dir down to rel_dir,
+    which decide what is listed. Costs one stat per entry, no reads.
+    """
+    digest = hashlib.sha1()
+    target_dir = base_dir / rel_dir if rel_dir else base_dir
+    digest.update(ignore_files_signature(base_dir, rel_dir).encode())
+    entries = []
+    with os.scandir(target_dir) as it:
+        for entry in it:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append(f"{entry.name}:{entry.is_dir()}:{st.st_mtime_ns}:{st.st_size}")
+    for line in sorted(entries):
+        digest.update(line.encode('utf-8', 'surrogateescape') + b"\n")
+    return f'"{digest.hexdigest()[:32]}"'
+
+def normalize_etag(tag: str) -> str:
+    """Strip the weak marker and any encoding suffix, leaving the tag of the identity representation."""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names this ETag (weak comparison, as RFC 9110 requires for it)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(normalize_etag(tag) == etag for tag in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def set_cache_headers(response: Response, etag: Optional[str]):
+    if etag:
+        response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
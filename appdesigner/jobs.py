@@ -0,0 +1,371 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from filemanager import get_cache_dir
+
+JOBS_DB_NAME = "jobs.db"
+# A running job whose worker has not sent a heartbeat for this long is requeued
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '30'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+HEARTBEAT_INTERVAL = 5.0
+POLL_INTERVAL = 0.5
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+# Event kind a handler records (progress(message, WRITE_CHECKPOINT)) before its
+# first non-idempotent step: an interrupted job past it fails instead of rerunning
+WRITE_CHECKPOINT = "writing"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    payload_hash TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events(job_id, id);
+"""
+JOB_COLUMNS = ("id", "kind", "payload", "idempotency_key", "status", "attempts", "cancel_requested", "worker",
+               "heartbeat_at", "created_at", "started_at", "finished_at", "result", "error")
+
+class JobCancelled(Exception):
+    """Raised inside a running job when its cancellation was requested."""
+    pass
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused with a different payload."""
+    pass
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def worker_alive(worker: Optional[str]) -> bool:
+    """Whether the process that claimed a job still runs. Unknown for other hosts, assumed alive."""
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobQueue:
+    """Persistent queue of background jobs, shared by every designer process.
+
+    Jobs are claimed atomically (BEGIN IMMEDIATE), so several designer
+    workers can each run a worker thread on the same database. Only one job
+    of a queue runs at a time, across all of them: jobs change the files of
+    one managed directory, and two running together would both start from
+    the original files and the last to write would win.
+    Running jobs send heartbeats; a job whose process died (a --reload
+    restart, a crash) is put back in the queue when the next process starts,
+    or once its lease expires, up to JOB_MAX_ATTEMPTS times, unless it had
+    reached its WRITE_CHECKPOINT. Cancellation is cooperative: handlers call
+    the progress callback, which raises JobCancelled once a cancel was requested.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.handlers: Dict[str, Callable[[Dict[str, Any], Callable[[str], None]], Dict[str, Any]]] = {}
+        self.worker = worker_id()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any], Callable[[str], None]], Dict[str, Any]]):
+        """Set the function running jobs of a kind: handler(payload, progress) -> result."""
+        self.handlers[kind] = handler
+
+    # Submitting and inspecting
+
+    def submit(self, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job. With an idempotency key already used, return that job instead ("created" is False)."""
+        encoded = json.dumps(payload, sort_keys=True)
+        payload_hash = hashlib.sha256(f"{kind}\n{encoded}".encode('utf-8')).hexdigest()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = None
+                if idempotency_key:
+                    existing = self._conn.execute("SELECT id, payload_hash FROM jobs WHERE idempotency_key = ?",
+                                                  (idempotency_key,)).fetchone()
+                if existing is None:
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, kind, payload, payload_hash, idempotency_key, status, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                        (job_id, kind, encoded, payload_hash, idempotency_key, time.time())
+                    )
+                    self._add_event(job_id, "queued", "Queued")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if existing is not None:
+            if existing[1] != payload_hash:
+                raise IdempotencyConflict(f"Idempotency key {idempotency_key} was used for a different job")
+            return {**self.get(existing[0]), "created": False}
+        self._wakeup.set()
+        return {**self.get(job_id), "created": True}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        where, params = ("WHERE status = ?", [status]) if status else ("", [])
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [self._job_dict(row) for row in rows]
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, timestamp, kind, message FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after)
+            ).fetchall()
+        return [dict(zip(("id", "timestamp", "kind", "message"), row)) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job right away, or ask a running one to stop at its next progress step."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                                   "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+                self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                                   (job_id,))
+                self._add_event(job_id, "cancel", "Cancellation requested")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    @staticmethod
+    def _job_dict(row) -> Dict[str, Any]:
+        job = dict(zip(JOB_COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _add_event(self, job_id: str, kind: str, message: str):
+        # Called with the lock held, inside a transaction or not
+        self._conn.execute("INSERT INTO job_events (job_id, timestamp, kind, message) VALUES (?, ?, ?, ?)",
+                           (job_id, time.time(), kind, message))
+
+    # Running
+
+    def start(self):
+        """Recover jobs left running by dead processes and start the worker threads (once)."""
+        if self._threads:
+            return
+        self.recover()
+        thread = threading.Thread(target=self._work, name="job-worker", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def recover(self) -> int:
+        """Requeue running jobs whose process is gone or whose lease expired. Returns how many.
+
+        A job that reached its write checkpoint may have changed files already;
+        running it again would apply the change twice, so it fails instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT id, worker, heartbeat_at, attempts FROM jobs "
+                                          "WHERE status = 'running'").fetchall()
+                recovered = 0
+                for job_id, worker, heartbeat_at, attempts in rows:
+                    if worker_alive(worker) and (heartbeat_at or 0) > now - JOB_LEASE_SECONDS:
+                        continue
+                    checkpoint = self._conn.execute("SELECT 1 FROM job_events WHERE job_id = ? AND kind = ? LIMIT 1",
+                                                    (job_id, WRITE_CHECKPOINT)).fetchone()
+                    if checkpoint:
+                        error = "Interrupted while writing files, not rerun: check the files it changed"
+                        self._conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? "
+                                           "WHERE id = ?", (now, error, job_id))
+                        self._add_event(job_id, "failed", error)
+                    elif attempts >= JOB_MAX_ATTEMPTS:
+                        self._conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? "
+                                           "WHERE id = ?", (now, f"Interrupted {attempts} times", job_id))
+                        self._add_event(job_id, "failed", f"Interrupted {attempts} times, giving up")
+                    else:
+                        self._conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?",
+                                           (job_id,))
+                        self._add_event(job_id, "requeued", f"Worker {worker} went away, requeued")
+                    recovered += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if recovered:
+            self._wakeup.set()
+        return recovered
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job of a kind this process can run, unless a job is running."""
+        if not self.handlers:
+            return None
+        kinds = list(self.handlers)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({', '.join('?' * len(kinds))}) "
+                    "AND NOT EXISTS (SELECT 1 FROM jobs WHERE status = 'running') "
+                    "ORDER BY created_at LIMIT 1", kinds
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, heartbeat_at = ?, started_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?", (self.worker, now, now, row[0])
+                    )
+                    self._add_event(row[0], "started", f"Started by {self.worker}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def run(self, job: Dict[str, Any]):
+        """Run a claimed job to completion and record its outcome."""
+        job_id = job["id"]
+
+        def progress(message: str, kind: Optional[str] = None):
+            with self._lock:
+                self._add_event(job_id, kind or "progress", message)
+                cancelled = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?",
+                                               (job_id,)).fetchone()
+            if cancelled and cancelled[0]:
+                raise JobCancelled(f"Job {job_id} was cancelled")
+
+        try:
+            progress("Running")
+            result = self.handlers[job["kind"]](job["payload"], progress)
+            self._finish(job_id, "succeeded", result=result)
+        except JobCancelled:
+            self._finish(job_id, "cancelled")
+        except Exception as e:
+            self._finish(job_id, "failed", error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (status, time.time(), json.dumps(result) if result is not None else None, error,
+                     job_id, self.worker)
+                ).rowcount
+                if updated:  # Otherwise the job was requeued meanwhile and belongs to another run
+                    self._add_event(job_id, status, error or status.capitalize())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run(job)
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                with self._lock:
+                    self._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker = ?",
+                                       (time.time(), self.worker))
+                self.recover()
+            except sqlite3.Error:
+                pass
+
+    def active(self) -> bool:
+        """Whether any job is queued or running."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone() is not None
+
+_queues: Dict[str, JobQueue] = {}
+_queues_lock = threading.Lock()
+
+def get_job_queue(managed_dir: Path) -> JobQueue:
+    """The job queue of a managed directory, in its cache directory so it survives restarts."""
+    key = str(Path(managed_dir).resolve())
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = JobQueue(get_cache_dir(managed_dir) / JOBS_DB_NAME)
+        return _queues[key]
+
+def release_job_queue(managed_dir: Path) -> bool:
+    """Stop and forget the queue of a managed directory, unless it has work left. Returns whether it did."""
+    key = str(Path(managed_dir).resolve())
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            return True
+        if queue.active():
+            return False
+        queue.stop()
+        del _queues[key]
+        return True
+
+def stop_job_queues():
+    with _queues_lock:
+        for queue in _queues.values():
+            queue.stop()
@@ -0,0 +1,171 @@
+import base64
+import bisect
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from filemanager import TEXT_EXTENSIONS
+from treewalk import matcher_for_directory
+from httpcache import ignore_files_signature
+from contextcache import get_context_resolver
+
+LISTING_PAGE_SIZE = 200
+LISTING_MAX_PAGE = 1000
+SORT_ORDERS = ("name", "size", "modified")  # Name ascending, size and modification time descending
+SNIFF_BYTES = 8192  # Files with an unknown extension are text if this much has no NUL byte
+DIRECTORY, FILE = 0, 1  # Rank: directories are listed first in every order
+
+class ListingError(Exception):
+    """Raised for a cursor that does not belong to the listing it is used with."""
+    pass
+
+def sniff_text(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return b'\0' not in f.read(SNIFF_BYTES)
+    except OSError:
+        return False
+
+def encode_cursor(sort: str, key: Tuple) -> str:
+    """Opaque cursor: the sort order and the sort key of the last entry returned."""
+    return base64.urlsafe_b64encode(json.dumps([sort, *key], ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ListingError("Invalid cursor")
+    if not isinstance(decoded, list) or not decoded or decoded[0] != sort:
+        raise ListingError(f"Cursor does not belong to the {sort} order")
+    return tuple(decoded[1:])
+
+class DirectoryListings:
+    """Paginated listings of single directory levels of a managed directory.
+
+    The names of a directory's visible entries (ignore rules applied, text
+    files only) are cached and revalidated with a stat of the directory and
+    of the ignore files, so paging through 20k entries does not rescan it.
+    Only the entries of the requested page are stat'ed, and their token
+    counts come from the context resolver's cache. Pages are cut by keyset
+    cursors (the sort key of the last entry), which stay valid when entries
+    are added or removed between requests.
+    """
+
+    def __init__(self, managed_dir: Path):
+        self.managed_dir = Path(managed_dir)
+        self._entries: Dict[str, Tuple[str, List[Tuple[int, str]]]] = {}  # rel_dir -> (signature, entries)
+        self._lock = threading.Lock()
+
+    def _signature(self, rel_dir: str) -> str:
+        target_dir = self.managed_dir / rel_dir if rel_dir else self.managed_dir
+        return f"{os.stat(target_dir).st_mtime_ns}\n{ignore_files_signature(self.managed_dir, rel_dir)}"
+
+    def entries(self, rel_dir: str = '') -> Tuple[str, List[Tuple[int, str]]]:
+        """(signature, sorted (rank, name) pairs) of the visible entries of a directory."""
+        signature = self._signature(rel_dir)
+        with self._lock:
+            cached = self._entries.get(rel_dir)
+        if cached and cached[0] == signature:
+            return cached
+        target_dir = self.managed_dir / rel_dir if rel_dir else self.managed_dir
+        matcher = matcher_for_directory(self.managed_dir, rel_dir)
+        entries = []
+        with os.scandir(target_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if matcher.is_ignored(rel_path, is_dir):
+                    continue
+                if is_dir:
+                    entries.append((DIRECTORY, entry.name))
+                elif entry.is_file() and (Path(entry.name).suffix.lower() in TEXT_EXTENSIONS or sniff_text(entry.path)):
+                    entries.append((FILE, entry.name))
+        entries.sort()
+        with self._lock:
+            self._entries[rel_dir] = (signature, entries)
+        return signature, entries
+
+    def page(self, rel_dir: str = '', limit: int = LISTING_PAGE_SIZE, cursor: Optional[str] = None,
+             query: Optional[str] = None, sort: str = "name") -> Dict[str, Any]:
+        """One page of a directory, filtered by a case-insensitive name substring.
+
+        Returns entries shaped like the full listing's (without token counts,
+        see add_tokens), the cursor of the next page, the number of matching
+        entries, and an ETag covering the page.
+        """
+        if sort not in SORT_ORDERS:
+            raise ListingError(f"Unknown sort order: {sort}")
+        limit = max(1, min(limit, LISTING_MAX_PAGE))
+        signature, entries = self.entries(rel_dir)
+        if query:
+            needle = query.lower()
+            entries = [entry for entry in entries if needle in entry[1].lower()]
+
+        target_dir = self.managed_dir / rel_dir if rel_dir else self.managed_dir
+        if sort == "name":
+            keys = [(rank, name) for rank, name in entries]
+        else:
+            # Ordering by size or age needs every entry's stat; by name only the page's
+            keys = []
+            for rank, name in entries:
+                try:
+                    st = os.stat(target_dir / name)
+                except OSError:
+                    continue
+                value = (st.st_size if rank == FILE else 0) if sort == "size" else st.st_mtime_ns
+                keys.append((rank, -value, name))
+            keys.sort()
+
+        start = bisect.bisect_right(keys, decode_cursor(cursor, sort)) if cursor else 0
+        page_keys = keys[start:start + limit]
+        results = []
+        digest = hashlib.sha1(f"{signature}\n{query}\n{sort}\n{cursor}\n{limit}\n".encode('utf-8', 'surrogateescape'))
+        for key in page_keys:
+            rank, name = key[0], key[-1]
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if rank == DIRECTORY:
+                results.append({"path": rel_path, "name": name, "type": "directory"})
+                continue
+            try:
+                st = os.stat(target_dir / name)
+            except OSError:
+                continue  # Removed since the directory was listed
+            digest.update(f"{name}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}\n".encode('utf-8', 'surrogateescape'))
+            results.append({"path": rel_path, "name": name, "type": "file", "size": st.st_size, "_stat": st})
+        more = start + limit < len(keys)
+        return {
+            "entries": results,
+            "next_cursor": encode_cursor(sort, page_keys[-1]) if more and page_keys else None,
+            "total": len(keys),
+            "etag": f'"p{digest.hexdigest()[:31]}"',
+        }
+
+    def add_tokens(self, page: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in the token counts of a page's files (reading only files not counted before)."""
+        files = {entry["path"]: entry.pop("_stat") for entry in page["entries"] if entry["type"] == "file"}
+        tokens = get_context_resolver(self.managed_dir).count_tokens(files)
+        for entry in page["entries"]:
+            if entry["type"] == "file":
+                entry["tokens"] = tokens[entry["path"]]
+        return page
+
+_listings: Dict[str, DirectoryListings] = {}
+_listings_lock = threading.Lock()
+
+def get_directory_listings(managed_dir: Path) -> DirectoryListings:
+    key = str(Path(managed_dir).resolve())
+    with _listings_lock:
+        if key not in _listings:
+            _listings[key] = DirectoryListings(Path(managed_dir))
+        return _listings[key]
+
+def release_directory_listings(managed_dir: Path):
+    with _listings_lock:
+        _listings.pop(str(Path(managed_dir).resolve()), None)
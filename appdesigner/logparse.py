@@ -0,0 +1,258 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from logstore import LogStore, get_log_store, STREAMS
+
+LOG_INDEX_NAME = "index.db"
+# Lines parsed per transaction while catching up with the log stores
+INDEX_BATCH_LINES = 5000
+
+# uvicorn: 'INFO:     127.0.0.1:50000 - "GET /api/items?x=1 HTTP/1.1" 200 OK'
+ACCESS_RE = re.compile(r'^(?P<level>[A-Z]+):\s+\S+ - "(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+" (?P<status>\d{3})')
+# 'ERROR:    msg' (uvicorn), 'ERROR:root:msg' (logging.basicConfig), '... - ERROR - msg' and similar
+LEVEL_RE = re.compile(r'^(?:\S+ ){0,3}?\W?(?P<level>DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b')
+TRACEBACK_START = "Traceback (most recent call last):"
+# Lines between chained tracebacks, which stay in the same record
+TRACEBACK_CHAIN = ("During handling of the above exception", "The above exception was the direct cause")
+LEVELS = {"WARN": "WARNING", "FATAL": "CRITICAL"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stream TEXT NOT NULL,
+    seq_start INTEGER NOT NULL,
+    seq_end INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,
+    level TEXT,
+    method TEXT,
+    path TEXT,
+    status INTEGER,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_level ON records(level, id);
+CREATE INDEX IF NOT EXISTS records_status ON records(status, id);
+CREATE INDEX IF NOT EXISTS records_path ON records(path, id);
+CREATE INDEX IF NOT EXISTS records_kind ON records(kind, id);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records(timestamp);
+CREATE INDEX IF NOT EXISTS records_stream_seq ON records(stream, seq_end);
+CREATE TABLE IF NOT EXISTS cursors (
+    stream TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+
+def parse_line(line: str) -> Dict[str, Any]:
+    """Structured fields of a single log line: kind (access or log), level, method, path, status."""
+    match = ACCESS_RE.match(line)
+    if match:
+        return {
+            "kind": "access",
+            "level": LEVELS.get(match["level"], match["level"]),
+            "method": match["method"],
+            "path": match["path"].split("?", 1)[0],
+            "status": int(match["status"]),
+        }
+    match = LEVEL_RE.match(line)
+    level = LEVELS.get(match["level"], match["level"]) if match else None
+    return {"kind": "log", "level": level, "method": None, "path": None, "status": None}
+
+def parse_lines(lines: List[Dict], stream: str, final: bool = False) -> Tuple[List[Dict], int]:
+    """Group log store lines into records, a traceback and its chained parts being one record.
+
+    Returns the records and the sequence number of the last line consumed. A
+    traceback still being written at the end of lines is left for the next
+    call unless final is set.
+    """
+    records = []
+    consumed = lines[0]["seq"] - 1 if lines else -1
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line["line"].startswith(TRACEBACK_START):
+            end = i + 1
+            complete = False
+            while True:
+                # Frames and source lines are indented
+                while end < len(lines) and (not lines[end]["line"].strip() or lines[end]["line"][0].isspace()):
+                    end += 1
+                if end == len(lines):
+                    break
+                end += 1  # The unindented "SomeError: message" line closes this part
+                follow = end
+                while follow < len(lines) and not lines[follow]["line"].strip():
+                    follow += 1
+                if follow < len(lines) and lines[follow]["line"].startswith(TRACEBACK_CHAIN):
+                    # A chained traceback follows: skip to its first line and keep going
+                    end = follow + 1
+                    while end < len(lines) and not lines[end]["line"].startswith(TRACEBACK_START):
+                        end += 1
+                    if end == len(lines):
+                        break
+                    end += 1
+                    continue
+                # Only something else following proves no chained traceback is still to come
+                complete = follow < len(lines)
+                break
+            if not complete and not final:
+                break
+            block = lines[i:end]
+            while len(block) > 1 and not block[-1]["line"].strip():
+                block.pop()
+            records.append({
+                "stream": stream,
+                "seq_start": block[0]["seq"],
+                "seq_end": block[-1]["seq"],
+                "timestamp": line["timestamp"],
+                "kind": "traceback",
+                "level": "ERROR",
+                "method": None,
+                "path": None,
+                "status": None,
+                "message": "\n".join(l["line"] for l in block),
+            })
+            consumed = lines[end - 1]["seq"]
+            i = end
+            continue
+        if line["line"].strip():
+            records.append({
+                "stream": stream,
+                "seq_start": line["seq"],
+                "seq_end": line["seq"],
+                "timestamp": line["timestamp"],
+                "message": line["line"],
+                **parse_line(line["line"]),
+            })
+        consumed = line["seq"]
+        i += 1
+    return records, consumed
+
+class LogIndex:
+    """SQLite index of parsed managed app log records.
+
+    Catches up with the log stores on demand: each stream has a cursor (the
+    last line indexed), so every line is parsed once however often the logs
+    are searched. Several designer workers can share the database; the
+    cursor is read and advanced inside the same write transaction.
+    """
+
+    def __init__(self, db_path: Path, stores: Dict[str, LogStore]):
+        self.db_path = db_path
+        self.stores = stores
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def update(self):
+        """Index the lines written since the last update, and drop records whose lines were rotated away."""
+        with self._lock:
+            cursors = dict(self._conn.execute("SELECT stream, seq FROM cursors").fetchall())
+        for stream, store in self.stores.items():
+            # Searches usually find nothing new: skip the write transaction then
+            if store.last_seq() == cursors.get(stream, -1):
+                continue
+            while self._index_batch(stream, store) >= INDEX_BATCH_LINES:
+                pass
+
+    def _index_batch(self, stream: str, store: LogStore) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT seq FROM cursors WHERE stream = ?", (stream,)).fetchone()
+                cursor = row[0] if row else -1
+                last_seq = store.last_seq()
+                if last_seq < cursor:  # The log directory was cleared, start over
+                    self._conn.execute("DELETE FROM records WHERE stream = ?", (stream,))
+                    cursor = -1
+                lines = store.after(cursor, INDEX_BATCH_LINES)
+                final = len(lines) < INDEX_BATCH_LINES and self._is_idle(lines)
+                records, consumed = parse_lines(lines, stream, final)
+                if len(lines) == INDEX_BATCH_LINES and consumed == cursor:
+                    # One traceback longer than a batch: index what we have rather than stall
+                    records, consumed = parse_lines(lines, stream, final=True)
+                self._conn.executemany(
+                    "INSERT INTO records (stream, seq_start, seq_end, timestamp, kind, level, method, path, status, message) "
+                    "VALUES (:stream, :seq_start, :seq_end, :timestamp, :kind, :level, :method, :path, :status, :message)",
+                    records
+                )
+                self._conn.execute("INSERT OR REPLACE INTO cursors (stream, seq) VALUES (?, ?)",
+                                   (stream, max(consumed, cursor)))
+                segments = store.segments()
+                if segments:
+                    # Lines before the first one still on disk were removed by retention
+                    self._conn.execute("DELETE FROM records WHERE stream = ? AND seq_end < ?", (stream, segments[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(lines)
+
+    @staticmethod
+    def _is_idle(lines: List[Dict]) -> bool:
+        """Whether a trailing traceback can be closed: nothing was written for a while after it."""
+        return not lines or time.time() - lines[-1]["timestamp"] > 2.0
+
+    def search(self, level: Optional[str] = None, status: Optional[int] = None, status_min: Optional[int] = None,
+               path: Optional[str] = None, kind: Optional[str] = None, stream: Optional[str] = None,
+               query: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+               before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        """Records matching every given filter, newest first.
+
+        Pages with a keyset: pass the returned next_before as before to get
+        the following page. path matches as a prefix, query as a substring.
+        """
+        self.update()
+        conditions, params = [], []
+        for column, value in (("level", level and level.upper()), ("status", status), ("kind", kind),
+                              ("stream", stream)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        for condition, value in (("status >= ?", status_min), ("path >= ?", path), ("timestamp >= ?", since),
+                                 ("timestamp < ?", until), ("id < ?", before)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if path is not None:
+            # Prefix match as a range, so the path index is used
+            conditions.append("path < ?")
+            params.append(path + "\uffff")
+        if query:
+            conditions.append("instr(message, ?) > 0")
+            params.append(query)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ("id", "stream", "seq_start", "seq_end", "timestamp", "kind", "level", "method", "path", "status",
+                   "message")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM records {where} ORDER BY id DESC LIMIT ?", params + [limit + 1]
+            ).fetchall()
+        records = [dict(zip(columns, row)) for row in rows[:limit]]
+        return {
+            "records": records,
+            "next_before": records[-1]["id"] if len(rows) > limit else None,
+        }
+
+_indexes: Dict[str, LogIndex] = {}
+_index_lock = threading.Lock()
+
+def get_log_index(logs_dir: Optional[Path] = None) -> Optional[LogIndex]:
+    """The index of the managed app logs, next to the log segments in logs_dir or APP_LOGS_DIR."""
+    logs_dir = logs_dir or os.getenv('APP_LOGS_DIR')
+    if not logs_dir:
+        return None
+    with _index_lock:
+        if str(logs_dir) not in _indexes:
+            Path(logs_dir).mkdir(parents=True, exist_ok=True)
+            _indexes[str(logs_dir)] = LogIndex(Path(logs_dir) / LOG_INDEX_NAME,
+                                               {stream: get_log_store(stream, Path(logs_dir)) for stream in STREAMS})
+        return _indexes[str(logs_dir)]
+
+def release_log_index(logs_dir: Path):
+    with _index_lock:
+        _indexes.pop(str(logs_dir), None)
@@ -0,0 +1,274 @@
+import bisect
+import hashlib
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Segments rotate at this size; retention applies per stream, to whole segments
+LOG_SEGMENT_BYTES = int(os.getenv('LOG_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+LOG_RETENTION_BYTES = int(os.getenv('LOG_RETENTION_BYTES', str(64 * 1024 * 1024)))
+LOG_RETENTION_HOURS = float(os.getenv('LOG_RETENTION_HOURS', '168'))
+# Lines the logs view shows
+LOG_TAIL_LINES = int(os.getenv('LOG_TAIL_LINES', '1000'))
+
+# Subdirectory of the project logs directory holding the managed app's streams
+MANAGED_APP_LOG_DIR = "managed-app"
+STREAMS = ("stdout", "stderr")
+
+# Index record per line: byte offset and length in the segment, timestamp
+INDEX_RECORD = struct.Struct("<QId")
+
+def project_logs_dir(managed_dir: Path) -> Path:
+    """Persistent log directory of a managed app, kept across designer runs.
+
+    Same per-project directory as filemanager.get_cache_dir (this module is
+    also imported by the CLI, which cannot import the designer's modules).
+    """
+    managed_dir = Path(managed_dir).resolve()
+    digest = hashlib.sha1(str(managed_dir).encode('utf-8')).hexdigest()[:12]
+    return Path.home() / ".appdesigner_cache" / f"{managed_dir.name}-{digest}" / "logs"
+
+class LogStore:
+    """Size-rotated log segments of one output stream, with a line index.
+
+    Each segment is a pair of files named after the sequence number of its
+    first line: <stream>-<seq>.log holds the raw lines and <stream>-<seq>.idx
+    one fixed-size (offset, length, timestamp) record per line. Line n is
+    found with one seek into the index, so tail, since and after queries cost
+    O(log lines + result) instead of reading the log. One process writes
+    (the supervisor), any number of processes read: readers only trust index
+    records, which are written after the line they point to.
+    """
+
+    def __init__(self, directory: Path, stream: str, segment_bytes: int = LOG_SEGMENT_BYTES,
+                 retention_bytes: int = LOG_RETENTION_BYTES, retention_hours: float = LOG_RETENTION_HOURS):
+        self.directory = Path(directory)
+        self.stream = stream
+        self.segment_bytes = segment_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_hours * 3600
+        self._lock = threading.Lock()
+        self._log_file = None
+        self._index_file = None
+        self._segment_size = 0
+        self._next_seq = 0
+        self._last_ts = 0.0
+
+    # Writing
+
+    def open(self) -> "LogStore":
+        """Open the newest segment for appending, dropping a partially written last line."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            segments = self.segments()
+            if not segments:
+                self._open_segment(0)
+                return self
+            first_seq = segments[-1]
+            log_path, index_path = self._paths(first_seq)
+            count = index_path.stat().st_size // INDEX_RECORD.size if index_path.exists() else 0
+            size = 0
+            if count:
+                offset, length, self._last_ts = self._read_records(index_path, count - 1, 1)[0]
+                size = offset + length
+            # Anything past the last indexed line was cut short by a crash
+            with open(index_path, 'ab') as f:
+                f.truncate(count * INDEX_RECORD.size)
+            with open(log_path, 'ab') as f:
+                f.truncate(size)
+            self._log_file = open(log_path, 'ab')
+            self._index_file = open(index_path, 'ab')
+            self._segment_size = size
+            self._next_seq = first_seq + count
+            self._apply_retention()
+        return self
+
+    def append(self, line: str, timestamp: Optional[float] = None):
+        """Append one line (without its newline)."""
+        data = line.encode('utf-8', 'replace') + b"\n"
+        # Timestamps never go backwards, so the index stays sorted for since()
+        timestamp = max(timestamp or time.time(), self._last_ts)
+        with self._lock:
+            if self._log_file is None:
+                raise ValueError(f"Log store {self.stream} is not open")
+            if self._segment_size and self._segment_size + len(data) > self.segment_bytes:
+                self._rotate()
+            self._log_file.write(data)
+            self._log_file.flush()
+            self._index_file.write(INDEX_RECORD.pack(self._segment_size, len(data) - 1, timestamp))
+            self._index_file.flush()
+            self._segment_size += len(data)
+            self._next_seq += 1
+            self._last_ts = timestamp
+
+    def close(self):
+        with self._lock:
+            for f in (self._log_file, self._index_file):
+                if f:
+                    f.close()
+            self._log_file = self._index_file = None
+
+    def _open_segment(self, first_seq: int):
+        log_path, index_path = self._paths(first_seq)
+        self._log_file = open(log_path, 'ab')
+        self._index_file = open(index_path, 'ab')
+        self._segment_size = 0
+        self._next_seq = first_seq
+
+    def _rotate(self):
+        self._log_file.close()
+        self._index_file.close()
+        self._open_segment(self._next_seq)
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Delete the oldest closed segments beyond the size budget or older than the age limit."""
+        segments = self.segments()[:-1]  # Never the one being written
+        sizes = {seq: self._paths(seq)[0].stat().st_size for seq in segments}
+        total = sum(sizes.values()) + self._segment_size
+        cutoff = time.time() - self.retention_seconds
+        for seq in segments:
+            log_path, index_path = self._paths(seq)
+            if total <= self.retention_bytes and log_path.stat().st_mtime >= cutoff:
+                break
+            total -= sizes[seq]
+            index_path.unlink(missing_ok=True)
+            log_path.unlink(missing_ok=True)
+
+    # Reading
+
+    def segments(self) -> List[int]:
+        """First sequence numbers of the segments on disk, oldest first."""
+        prefix = f"{self.stream}-"
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[len(prefix):-4]) for name in names
+                      if name.startswith(prefix) and name.endswith(".idx") and name[len(prefix):-4].isdigit())
+
+    def tail(self, lines: int) -> List[Dict]:
+        """The last lines, oldest first."""
+        result = []
+        for first_seq in reversed(self.segments()):
+            if len(result) >= lines:
+                break
+            count = self._segment_count(first_seq)
+            take = min(count, lines - len(result))
+            result = self._read_lines(first_seq, count - take, take) + result
+        return result
+
+    def after(self, seq: int, limit: int = 1000) -> List[Dict]:
+        """Lines with a sequence number above seq, for incremental polling."""
+        segments = self.segments()
+        position = max(bisect.bisect_right(segments, seq + 1) - 1, 0)
+        result = []
+        for first_seq in segments[position:]:
+            start = max(seq + 1 - first_seq, 0)
+            result += self._read_lines(first_seq, start, limit - len(result))
+            if len(result) >= limit:
+                break
+        return result
+
+    def since(self, timestamp: float, limit: int = 1000) -> List[Dict]:
+        """Lines logged at or after timestamp, oldest first."""
+        segments = self.segments()
+        # The first segment that may hold the timestamp: the last one starting before it
+        position = 0
+        for i, first_seq in enumerate(segments):
+            first = self._read_records(self._paths(first_seq)[1], 0, 1)
+            if first and first[0][2] < timestamp:
+                position = i
+        result = []
+        for first_seq in segments[position:]:
+            start = self._bisect_timestamp(first_seq, timestamp)
+            result += self._read_lines(first_seq, start, limit - len(result))
+            if len(result) >= limit:
+                break
+        return result
+
+    def last_seq(self) -> int:
+        """Sequence number of the newest line, -1 when empty."""
+        segments = self.segments()
+        return segments[-1] + self._segment_count(segments[-1]) - 1 if segments else -1
+
+    def _paths(self, first_seq: int) -> Tuple[Path, Path]:
+        base = self.directory / f"{self.stream}-{first_seq:012d}"
+        return base.with_suffix(".log"), base.with_suffix(".idx")
+
+    def _segment_count(self, first_seq: int) -> int:
+        try:
+            return self._paths(first_seq)[1].stat().st_size // INDEX_RECORD.size
+        except FileNotFoundError:  # Removed by retention meanwhile
+            return 0
+
+    @staticmethod
+    def _read_records(index_path: Path, start: int, count: int) -> List[Tuple[int, int, float]]:
+        try:
+            with open(index_path, 'rb') as f:
+                f.seek(start * INDEX_RECORD.size)
+                data = f.read(count * INDEX_RECORD.size)
+        except FileNotFoundError:
+            return []
+        usable = len(data) - len(data) % INDEX_RECORD.size
+        return list(INDEX_RECORD.iter_unpack(data[:usable]))
+
+    def _bisect_timestamp(self, first_seq: int, timestamp: float) -> int:
+        index_path = self._paths(first_seq)[1]
+        low, high = 0, self._segment_count(first_seq)
+        while low < high:
+            middle = (low + high) // 2
+            record = self._read_records(index_path, middle, 1)
+            if record and record[0][2] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _read_lines(self, first_seq: int, start: int, count: int) -> List[Dict]:
+        if count <= 0:
+            return []
+        log_path, index_path = self._paths(first_seq)
+        records = self._read_records(index_path, start, count)
+        if not records:
+            return []
+        # The lines are contiguous: one read covers them all
+        begin = records[0][0]
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(begin)
+                data = f.read(records[-1][0] + records[-1][1] - begin)
+        except FileNotFoundError:
+            return []
+        return [{
+            "seq": first_seq + start + i,
+            "timestamp": ts,
+            "line": data[offset - begin:offset - begin + length].decode('utf-8', 'replace')
+        } for i, (offset, length, ts) in enumerate(records)]
+
+_stores: Dict[Tuple[str, str], LogStore] = {}
+_stores_lock = threading.Lock()
+
+def get_log_store(stream: str, logs_dir: Optional[Path] = None) -> Optional[LogStore]:
+    """Read side of a managed app stream, in logs_dir or the APP_LOGS_DIR the CLI passes to the designer."""
+    logs_dir = logs_dir or os.getenv('APP_LOGS_DIR')
+    if not logs_dir or stream not in STREAMS:
+        return None
+    key = (str(logs_dir), stream)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = LogStore(Path(logs_dir), stream)
+        return _stores[key]
+
+def release_log_stores(logs_dir: Path):
+    with _stores_lock:
+        for stream in STREAMS:
+            _stores.pop((str(logs_dir), stream), None)
+
+def tail_text(stream: str, lines: int = LOG_TAIL_LINES, logs_dir: Optional[Path] = None) -> str:
+    """The last lines of a managed app stream as one string, empty without a log store."""
+    store = get_log_store(stream, logs_dir)
+    return "\n".join(record["line"] for record in store.tail(lines)) if store else ""
@@ -1,20 +1,53 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from api.agent import router as agent_router
 from api.logs import router as logs_router
 from api.filemanager import router as filemanager_router
+from api.symbols import router as symbols_router
+from api.related import router as related_router
+from api.processes import router as processes_router
+from api.telemetry import router as telemetry_router
+from api.usage import router as usage_router
+from api.staging import router as staging_router
+from api.jobs import router as jobs_router, resume_jobs
+from api.projects import router as projects_router, use_project
+from jobs import stop_job_queues
+from telemetry import get_sampler
+from staging import stop_local_previews
+import metrics
+from compression import CompressionMiddleware
 from pathlib import Path
 
 app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 # Set up static and template directories
 BASE_DIR = Path(__file__).resolve().parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
+@app.on_event("startup")
+async def start_telemetry():
+    # Start sampling the managed app right away so the series covers the whole session
+    get_sampler()
+
+@app.on_event("startup")
+async def start_jobs():
+    # Resume the jobs a previous designer process left queued or running
+    resume_jobs()
+
+@app.on_event("shutdown")
+async def stop_previews():
+    # Preview apps run in their own session, they would outlive the designer
+    stop_local_previews()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    stop_job_queues()
+
 @app.get("/")
 async def project_explorer(request: Request):
     return templates.TemplateResponse(
@@ -30,6 +63,11 @@ async def read_preview():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Pipeline timings and counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/favicon.ico")
 async def favicon():
     return Response(content="")
@@ -38,3 +76,16 @@ async def favicon():
 app.include_router(agent_router, prefix="/api")
 app.include_router(logs_router, prefix="/api")
 app.include_router(filemanager_router, prefix="/api")
+app.include_router(symbols_router, prefix="/api")
+app.include_router(related_router, prefix="/api")
+app.include_router(processes_router, prefix="/api")
+app.include_router(telemetry_router, prefix="/api")
+app.include_router(usage_router, prefix="/api")
+app.include_router(staging_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(projects_router, prefix="/api")
+
+# The same API per project: /api/projects/{project_id}/files, .../process-user-instructions, ...
+for project_router in (agent_router, logs_router, filemanager_router, symbols_router, related_router,
+                       processes_router, telemetry_router, usage_router, staging_router, jobs_router):
+    app.include_router(project_router, prefix="/api/projects/{project_id}", dependencies=[Depends(use_project)])
@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from filemanager import FileManager, CACHE_DIR_NAME, project_id
+from contextcache import release_context_resolver
+from symbols import release_symbol_index
+from embeddings import release_embedding_index
+from logstore import project_logs_dir, release_log_stores, MANAGED_APP_LOG_DIR
+from logparse import release_log_index
+from jobs import release_job_queue
+from listing import release_directory_listings
+
+PROJECTS_FILE_NAME = "projects.json"
+# Loaded projects unused for this long are unloaded, and at most this many stay loaded
+PROJECT_IDLE_SECONDS = float(os.getenv('PROJECT_IDLE_SECONDS', '600'))
+PROJECTS_MAX_LOADED = int(os.getenv('PROJECTS_MAX_LOADED', '8'))
+# Extra managed directories to serve, separated by os.pathsep (the CLI's --project)
+PROJECT_DIRS = os.getenv('PROJECT_DIRS', '')
+
+class Project:
+    """A managed directory served by the designer, with its own file manager,
+    agent, indexes and caches, created on first use."""
+
+    def __init__(self, managed_dir: Path):
+        self.managed_dir = Path(managed_dir).resolve()
+        self.id = project_id(self.managed_dir)
+        self.last_used = 0.0
+        self._file_manager: Optional[FileManager] = None
+        self._agent = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._file_manager is not None or self._agent is not None
+
+    @property
+    def file_manager(self) -> FileManager:
+        with self._lock:
+            if self._file_manager is None:
+                self._file_manager = FileManager()
+                self._file_manager.set_managed_directory(self.managed_dir)
+            return self._file_manager
+
+    @property
+    def agent(self):
+        from api.agent import Agent  # Deferred: the agent module reads the current project
+        with self._lock:
+            if self._agent is None:
+                self._agent = Agent(self.managed_dir, self.id)
+            return self._agent
+
+    @property
+    def app_logs_dir(self) -> Path:
+        return project_logs_dir(self.managed_dir) / MANAGED_APP_LOG_DIR
+
+    def unload(self):
+        """Drop everything held in memory for the project; it is rebuilt on next use."""
+        with self._lock:
+            self._file_manager = None
+            self._agent = None
+        release_context_resolver(self.managed_dir)
+        release_symbol_index(self.managed_dir)
+        release_embedding_index(self.managed_dir)
+        release_log_stores(self.app_logs_dir)
+        release_log_index(self.app_logs_dir)
+        release_job_queue(self.managed_dir)
+        release_directory_listings(self.managed_dir)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.managed_dir.name,
+            "path": str(self.managed_dir),
+            "loaded": self.loaded,
+            "last_used": self.last_used or None,
+        }
+
+class ProjectRegistry:
+    """The managed directories one designer serves, routed by project id.
+
+    Registered directories persist in the cache directory. Projects load
+    lazily when first used and are unloaded when idle for
+    PROJECT_IDLE_SECONDS, or least recently used first once more than
+    PROJECTS_MAX_LOADED are loaded, which bounds memory however many
+    projects are registered.
+    """
+
+    def __init__(self, path: Path, default_dir: Optional[Path] = None, extra_dirs: Optional[List[Path]] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._projects: Dict[str, Project] = {}
+        self._registered: List[str] = []  # Directories to persist
+        try:
+            with open(self.path) as f:
+                self._registered = json.load(f)
+        except (OSError, ValueError):
+            pass
+        for directory in [default_dir, *(extra_dirs or []), *self._registered]:
+            if directory and Path(directory).is_dir():
+                project = Project(Path(directory))
+                self._projects.setdefault(project.id, project)
+        self.default_id = project_id(Path(default_dir).resolve()) if default_dir else None
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._registered, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def register(self, directory: Path) -> Project:
+        directory = Path(directory).resolve()
+        if not directory.is_dir():
+            raise ValueError(f"Not a directory: {directory}")
+        with self._lock:
+            project = self._projects.setdefault(project_id(directory), Project(directory))
+            if str(directory) not in self._registered:
+                self._registered.append(str(directory))
+                self._save()
+            return project
+
+    def unregister(self, project_id: str):
+        with self._lock:
+            project = self._projects.pop(project_id)
+            if str(project.managed_dir) in self._registered:
+                self._registered.remove(str(project.managed_dir))
+                self._save()
+        project.unload()
+
+    def get(self, project_id: str) -> Project:
+        """A project by id, marked as used. Raises KeyError for unknown ids."""
+        with self._lock:
+            project = self._projects[project_id]
+            project.last_used = time.time()
+        self.evict()
+        return project
+
+    def list(self) -> List[Project]:
+        with self._lock:
+            return sorted(self._projects.values(), key=lambda project: project.managed_dir.name)
+
+    def evict(self):
+        """Unload idle projects, and the least recently used beyond PROJECTS_MAX_LOADED."""
+        now = time.time()
+        with self._lock:
+            loaded = sorted((p for p in self._projects.values() if p.loaded), key=lambda p: p.last_used)
+            idle = [p for p in loaded if now - p.last_used > PROJECT_IDLE_SECONDS]
+            remaining = [p for p in loaded if p not in idle]
+            idle += remaining[:max(0, len(remaining) - PROJECTS_MAX_LOADED)]
+        for project in idle:
+            project.unload()
+
+_current: ContextVar[Optional[Project]] = ContextVar("current_project", default=None)
+
+def activate(project: Optional[Project]):
+    """Make project the one the running request or job works on.
+
+    The default project (MANAGED_APP_DIR) is the one the plain /api routes
+    serve, so it activates as None and shares their state.
+    """
+    _current.set(None if project is None or project.id == get_project_registry().default_id else project)
+
+def current_project() -> Optional[Project]:
+    """The project of the running /api/projects/{id}/... request or job, None for the plain /api routes."""
+    return _current.get()
+
+def get_managed_dir() -> Optional[Path]:
+    """The managed directory to work on: the current project's, else MANAGED_APP_DIR."""
+    project = current_project()
+    if project is not None:
+        return project.managed_dir
+    managed_dir = os.getenv('MANAGED_APP_DIR')
+    return Path(managed_dir) if managed_dir else None
+
+def get_app_logs_dir() -> Optional[Path]:
+    """Where the current project's managed app logs are, APP_LOGS_DIR for the plain /api routes."""
+    project = current_project()
+    if project is not None:
+        return project.app_logs_dir
+    logs_dir = os.getenv('APP_LOGS_DIR')
+    return Path(logs_dir) if logs_dir else None
+
+_registry: Optional[ProjectRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_project_registry() -> ProjectRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            managed_dir = os.getenv('MANAGED_APP_DIR')
+            _registry = ProjectRegistry(
+                Path.home() / CACHE_DIR_NAME / PROJECTS_FILE_NAME,
+                Path(managed_dir) if managed_dir else None,
+                [Path(d) for d in PROJECT_DIRS.split(os.pathsep) if d]
+            )
+        return _registry
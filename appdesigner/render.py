@@ -0,0 +1,164 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+RENDER_CACHE_SIZE = 256
+CODE_CSS_CLASS = "codehilite"  # Same markup as the codehilite extension, styled by the existing CSS
+# ```lang or ~~~lang fences, closed by the same fence on its own line
+FENCE_RE = re.compile(
+    r'^(?P<fence>`{3,}|~{3,})[ ]*\{?\.?(?P<lang>[\w#+.-]*)[^\n]*\n(?P<code>.*?)(?<=\n)(?P=fence)[ ]*$',
+    re.MULTILINE | re.DOTALL
+)
+FENCE_LINE_RE = re.compile(r'^[ ]{0,3}(`{3,}|~{3,})')
+LIST_ITEM_RE = re.compile(r'^(?:[*+-]|\d+[.)])(?:[ \t]|$)')
+# Reference-style link definitions apply to the whole document, which blocks rendered alone cannot see
+REFERENCE_RE = re.compile(r'^[ ]{0,3}\[[^\]]+\]:', re.MULTILINE)
+# Raw HTML blocks (and comments) may hold blank lines, so blocks cut inside one would render apart
+HTML_BLOCK_RE = re.compile(r'^[ ]{0,3}<(?:!--|/?[A-Za-z])')
+RAW_ESCAPES = str.maketrans({'\n': '\\n', '\r': '\\r'})
+
+def escape_raw(text: str) -> str:
+    """Escape line breaks so the raw response travels as one line, in a single pass."""
+    return text.translate(RAW_ESCAPES)
+
+@lru_cache(maxsize=64)
+def get_lexer(lang: str):
+    """Pygments lexer for a fence language, created once; plain text when unknown or not given."""
+    from pygments.lexers import get_lexer_by_name, TextLexer
+    from pygments.util import ClassNotFound
+    if lang:
+        try:
+            return get_lexer_by_name(lang)
+        except ClassNotFound:
+            pass
+    return TextLexer()
+
+class _Highlighter:
+    """Markdown extension highlighting fenced code with cached lexers.
+
+    Replaces fenced_code + codehilite, which look a lexer up (and guess
+    one for unlabeled blocks) for every block of every render.
+    """
+
+    def __init__(self):
+        from markdown.extensions import Extension
+        from markdown.preprocessors import Preprocessor
+        from pygments.formatters import HtmlFormatter
+        formatter = HtmlFormatter(cssclass=CODE_CSS_CLASS, wrapcode=True)
+
+        class FencePreprocessor(Preprocessor):
+            def run(self, lines: List[str]) -> List[str]:
+                from pygments import highlight
+
+                def replace(match) -> str:
+                    html = highlight(match.group('code'), get_lexer(match.group('lang').lower()), formatter)
+                    return f"\n\n{self.md.htmlStash.store(html)}\n\n"
+
+                return FENCE_RE.sub(replace, "\n".join(lines)).split("\n")
+
+        class HighlightExtension(Extension):
+            def extendMarkdown(self, md):
+                md.preprocessors.register(FencePreprocessor(md), 'cached_fenced_code', 25)
+
+        self.extension = HighlightExtension()
+
+_local = threading.local()
+
+def _get_markdown():
+    """This thread's Markdown instance: building one (and its extensions) costs more than a short render."""
+    md = getattr(_local, 'md', None)
+    if md is None:
+        from markdown import Markdown
+        md = _local.md = Markdown(extensions=['tables', _Highlighter().extension])
+    return md
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def render_markdown(text: str) -> str:
+    """Markdown to HTML with highlighted code blocks, memoized by content hash."""
+    key = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    md = _get_markdown()
+    html = md.reset().convert(text)
+    with _cache_lock:
+        _cache[key] = html
+        while len(_cache) > RENDER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return html
+
+class IncrementalRenderer:
+    """Render a streamed markdown response as it arrives.
+
+    feed() takes chunks; every time a block boundary that cannot change
+    the rendering of what precedes it is reached (a blank line followed by
+    an unindented line that is not a list item, outside code fences), the
+    text before it is rendered and kept. From the first raw HTML line on,
+    which may open a block spanning blank lines, nothing more is cut.
+    finish() then only renders the rest. html() shows the response so far,
+    for previews.
+    """
+
+    def __init__(self):
+        self._rendered: List[str] = []
+        self._text: List[str] = []  # Everything fed, to fall back to a full render
+        self._pending = ""
+        self._scanned = 0  # Offset in _pending of the first line not scanned yet
+        self._fence: Optional[str] = None
+        self._blank = False  # Whether the last scanned line was blank
+        self._html = False  # Whether a raw HTML line was seen
+        self._failed = False
+
+    def feed(self, chunk: str):
+        self._text.append(chunk)
+        self._pending += chunk
+        if self._failed:
+            return
+        try:
+            self._render_complete_blocks()
+        except Exception:  # Never break the stream over a preview; finish() renders everything
+            self._failed = True
+
+    def _render_complete_blocks(self):
+        cut = 0
+        pos = self._scanned
+        while True:
+            end = self._pending.find("\n", pos)
+            if end < 0:
+                break
+            line = self._pending[pos:end]
+            fence = FENCE_LINE_RE.match(line)
+            if self._fence:
+                if fence and fence.group(1).startswith(self._fence):
+                    self._fence = None
+                self._blank = False
+            else:
+                if HTML_BLOCK_RE.match(line):
+                    self._html = True
+                if (self._blank and not self._html and line.strip() and not line[0].isspace()
+                        and not LIST_ITEM_RE.match(line)):
+                    cut = pos
+                if fence:
+                    self._fence = fence.group(1)
+                self._blank = not line.strip()
+            pos = end + 1
+        self._scanned = pos
+        if cut:
+            self._rendered.append(render_markdown(self._pending[:cut]))
+            self._pending = self._pending[cut:]
+            self._scanned -= cut
+
+    def html(self) -> str:
+        return "\n".join(self._rendered + ([render_markdown(self._pending)] if self._pending.strip() else []))
+
+    def finish(self) -> str:
+        text = "".join(self._text)
+        if self._failed or REFERENCE_RE.search(text):
+            return render_markdown(text)
+        return self.html()
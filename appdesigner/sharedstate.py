@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+SHARED_STATE_FILE = "shared_state.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS list_items (
+    name TEXT NOT NULL,
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS list_items_name ON list_items(name, seq);
+"""
+
+class SharedStore:
+    """SQLite-backed state shared by all designer worker processes.
+
+    Lives in LOGS_DIR, which the CLI creates per run, so it starts empty
+    like the in-memory state it replaces. Without LOGS_DIR (running main.py
+    directly) it falls back to an in-memory database for this process only.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path) if db_path else ":memory:",
+                                     check_same_thread=False, timeout=10, isolation_level=None)
+        if db_path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def list(self, name: str) -> "SharedList":
+        return SharedList(self, name)
+
+    def execute(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def transaction(self, statements: List[tuple]) -> List[List[tuple]]:
+        """Run (sql, params) statements atomically across processes, returning each result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                results = [self._conn.execute(sql, tuple(params)).fetchall() for sql, params in statements]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return results
+
+class SharedList:
+    """An append-only list of strings that any worker can read and drain."""
+
+    def __init__(self, store: SharedStore, name: str):
+        self.store = store
+        self.name = name
+
+    def set(self, values: Iterable[str]):
+        """Replace the contents."""
+        self.store.transaction(
+            [("DELETE FROM list_items WHERE name = ?", (self.name,))] +
+            [("INSERT INTO list_items (name, value) VALUES (?, ?)", (self.name, v)) for v in values]
+        )
+
+    def append(self, value: str):
+        self.store.execute("INSERT INTO list_items (name, value) VALUES (?, ?)", (self.name, value))
+
+    def extend(self, values: Iterable[str]):
+        self.store.transaction([("INSERT INTO list_items (name, value) VALUES (?, ?)", (self.name, v))
+                                for v in values])
+
+    def get(self) -> List[str]:
+        rows = self.store.execute("SELECT value FROM list_items WHERE name = ? ORDER BY seq", (self.name,))
+        return [row[0] for row in rows]
+
+    def drain(self) -> List[str]:
+        """Return the contents and clear them in one step, so no worker sees them twice."""
+        # Polled every second and nearly always empty: skip the write lock then
+        if not self.store.execute("SELECT 1 FROM list_items WHERE name = ? LIMIT 1", (self.name,)):
+            return []
+        rows, _ = self.store.transaction([
+            ("SELECT value FROM list_items WHERE name = ? ORDER BY seq", (self.name,)),
+            ("DELETE FROM list_items WHERE name = ?", (self.name,)),
+        ])
+        return [row[0] for row in rows]
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+def get_shared_store() -> SharedStore:
+    """Get the store for this run, shared through LOGS_DIR."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            logs_dir = os.getenv('LOGS_DIR')
+            _store = SharedStore(Path(logs_dir) / SHARED_STATE_FILE if logs_dir else None)
+        return _store
@@ -0,0 +1,356 @@
+import errno
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from filemanager import (FileManager, FileManagerError, get_cache_dir, content_hash, read_file_safely,
+                         write_text_atomic, lock_file)
+from supervisor import SupervisedProcess
+
+STAGING_DIR_NAME = "staging"
+MANIFEST_NAME = "manifest.json"
+PREVIEW_STDOUT_NAME = "preview.out.log"
+PREVIEW_STDERR_NAME = "preview.err.log"
+PROMOTE_LOCK_NAME = "promote.lock"
+# Dependency trees the preview can share with the live app as they are
+SHARED_DIRS = {"node_modules", ".venv", "venv"}
+# Never needed by the preview
+SKIPPED_DIRS = {".git", "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox"}
+# Files that only change by being replaced, which is safe to hardlink. Anything
+# else (databases, JSON data, logs) may be written in place by the preview app
+# and would then change the live file too, so it is copied unless reflinks work.
+LINKABLE_EXTENSIONS = {
+    ".py", ".js", ".mjs", ".ts", ".jsx", ".tsx", ".vue", ".css", ".scss", ".html", ".htm", ".md", ".txt",
+    ".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2", ".ttf", ".map",
+    ".toml", ".cfg", ".ini", ".yaml", ".yml", ".lock",
+}
+FICLONE = 0x40049409  # ioctl: share the data blocks of another file, copy-on-write
+
+class StagingError(Exception):
+    """Raised when a staging workspace cannot be created, started or promoted."""
+    pass
+
+class StagingConflict(StagingError):
+    """Raised when a staged file changed in the live directory since it was staged."""
+    pass
+
+class StagingPathError(StagingError):
+    """Raised when a staged file's path is not inside the managed directory."""
+    pass
+
+def reflink(src: str, dst: str):
+    """Clone src to dst sharing its blocks (btrfs, xfs, ...). Raises OSError where unsupported."""
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+class ShadowCopier:
+    """Materialize a directory tree cheaply: reflinks, else hardlinks for files only
+    ever replaced, else copies. Remembers what the filesystem supports."""
+
+    def __init__(self):
+        self.use_reflink = sys.platform.startswith('linux')
+        self.use_hardlink = True
+        self.counts = {"reflinked": 0, "linked": 0, "copied": 0, "shared": 0}
+
+    def copy_tree(self, src: Path, dst: Path):
+        dst.mkdir(parents=True, exist_ok=True)
+        with os.scandir(src) as it:
+            entries = list(it)
+        for entry in entries:
+            target = dst / entry.name
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir():
+                if entry.name in SKIPPED_DIRS:
+                    continue
+                if entry.name in SHARED_DIRS:
+                    os.symlink(entry.path, target, target_is_directory=True)
+                    self.counts["shared"] += 1
+                else:
+                    self.copy_tree(Path(entry.path), target)
+            elif entry.is_file():
+                self.copy_file(entry.path, str(target))
+
+    def copy_file(self, src: str, dst: str):
+        if self.use_reflink:
+            try:
+                reflink(src, dst)
+                self.counts["reflinked"] += 1
+                return
+            except OSError:
+                self.use_reflink = False
+        if self.use_hardlink and Path(src).suffix.lower() in LINKABLE_EXTENSIONS:
+            try:
+                os.link(src, dst)
+                self.counts["linked"] += 1
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                self.use_hardlink = False
+        shutil.copy2(src, dst)
+        self.counts["copied"] += 1
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class StagingWorkspace:
+    """A proposed change-set applied to a shadow copy of the managed directory.
+
+    The workspace directory holds the shadow tree (app/), a manifest and the
+    preview app's logs. State lives in the manifest rather than in memory, so
+    every designer worker sees the same workspaces.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.id = root.name
+        self.app_dir = root / "app"
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / MANIFEST_NAME
+
+    def load(self) -> Dict[str, Any]:
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def save(self, manifest: Dict[str, Any]):
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def stage(self, changes: Dict[str, str]):
+        """Write changes into the shadow tree, by replacement so no hardlinked live file is touched.
+
+        Raises StagingPathError, before writing anything, if a path leaves the tree.
+        """
+        manifest = self.load()
+        managed_dir = Path(manifest["managed_dir"])
+        app_dir = self.app_dir.resolve()
+        for filename in changes:
+            try:
+                (app_dir / filename).resolve().relative_to(app_dir)
+            except ValueError:
+                raise StagingPathError(f"Path outside the managed directory: {filename}")
+        for filename, content in changes.items():
+            target = self.app_dir / filename
+            target.parent.mkdir(parents=True, exist_ok=True)
+            write_text_atomic(target, content)
+            if filename not in manifest["base_hashes"]:
+                # The live version the change was made against, to detect conflicting edits on promote
+                live = managed_dir / filename
+                success, live_content = read_file_safely(str(live)) if live.is_file() else (False, '')
+                manifest["base_hashes"][filename] = content_hash(live_content) if success else None
+        manifest["files"] = sorted(set(manifest["files"]) | set(changes))
+        self.save(manifest)
+
+    def staged_changes(self) -> Dict[str, str]:
+        return {filename: (self.app_dir / filename).read_text(encoding='utf-8') for filename in self.load()["files"]}
+
+    def _running(self, manifest: Dict[str, Any]) -> bool:
+        process = _started_here.get(self.id)
+        if process is not None:
+            return process.poll() is None  # Also reaps it, a zombie would look alive
+        return pid_alive(manifest.get("pid"))
+
+    def start_preview(self, port: Optional[int] = None) -> Dict[str, Any]:
+        """Run a second managed app instance against the shadow tree on a spare port."""
+        manifest = self.load()
+        if self._running(manifest):
+            return self.status()
+        port = port or free_port()
+        preview = SupervisedProcess(
+            f"staging-{self.id}",
+            ["uvicorn", "main:app", "--reload", "--port", str(port)],
+            cwd=self.app_dir,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+            stdout_path=self.root / PREVIEW_STDOUT_NAME,
+            stderr_path=self.root / PREVIEW_STDERR_NAME
+        )
+        try:
+            process = preview.spawn()
+        except OSError as e:
+            raise StagingError(f"Failed to start preview app: {e}") from e
+        _started_here[self.id] = process
+        manifest.update(pid=process.pid, port=port, started_at=time.time())
+        self.save(manifest)
+        return self.status()
+
+    def stop_preview(self, timeout: float = 5.0):
+        manifest = self.load()
+        pid = manifest.get("pid")
+        if self._running(manifest):
+            try:
+                os.killpg(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            process = _started_here.pop(self.id, None)
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if process is not None and process.poll() is not None:
+                    break
+                if process is None and not pid_alive(pid):
+                    break
+                time.sleep(0.05)
+            else:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                if process is not None:
+                    process.wait()
+        _started_here.pop(self.id, None)
+        manifest.update(pid=None, port=None)
+        self.save(manifest)
+
+    def status(self) -> Dict[str, Any]:
+        manifest = self.load()
+        running = self._running(manifest)
+        return {
+            "id": self.id,
+            "created_at": manifest["created_at"],
+            "instruction": manifest.get("instruction"),
+            "files": manifest["files"],
+            "copy": manifest["copy"],
+            "running": running,
+            "port": manifest.get("port") if running else None,
+            "url": f"http://127.0.0.1:{manifest['port']}/" if running else None,
+        }
+
+    def conflicts(self) -> List[str]:
+        """Staged files whose live version changed since they were staged."""
+        manifest = self.load()
+        managed_dir = Path(manifest["managed_dir"])
+        conflicting = []
+        for filename, base_hash in manifest["base_hashes"].items():
+            live = managed_dir / filename
+            success, content = read_file_safely(str(live)) if live.is_file() else (False, '')
+            if (content_hash(content) if success else None) != base_hash:
+                conflicting.append(filename)
+        return conflicting
+
+    def remove(self):
+        self.stop_preview()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+# Preview processes spawned by this worker, stopped when it shuts down
+_started_here: Dict[str, Any] = {}
+
+class StagingManager:
+    """Create, list, promote and discard staging workspaces of a managed directory."""
+
+    def __init__(self, managed_dir: Path):
+        self.managed_dir = Path(managed_dir)
+        self.root = get_cache_dir(self.managed_dir) / STAGING_DIR_NAME
+        self._lock = threading.Lock()
+
+    def create(self, changes: Dict[str, str], instruction: Optional[str] = None) -> StagingWorkspace:
+        """Shadow-copy the managed directory and stage changes in it."""
+        workspace = StagingWorkspace(self.root / uuid.uuid4().hex[:12])
+        copier = ShadowCopier()
+        started = time.perf_counter()
+        try:
+            copier.copy_tree(self.managed_dir, workspace.app_dir)
+        except OSError as e:
+            shutil.rmtree(workspace.root, ignore_errors=True)
+            raise StagingError(f"Failed to create the shadow copy: {e}") from e
+        workspace.save({
+            "managed_dir": str(self.managed_dir),
+            "created_at": time.time(),
+            "instruction": instruction,
+            "files": [],
+            "base_hashes": {},
+            "copy": {**copier.counts, "seconds": round(time.perf_counter() - started, 3)},
+            "pid": None,
+            "port": None,
+        })
+        try:
+            workspace.stage(changes)
+        except StagingError:
+            workspace.remove()
+            raise
+        return workspace
+
+    def get(self, workspace_id: str) -> StagingWorkspace:
+        workspace = StagingWorkspace(self.root / workspace_id)
+        if not workspace_id.isalnum() or not workspace.manifest_path.is_file():
+            raise KeyError(workspace_id)
+        return workspace
+
+    def list(self) -> List[StagingWorkspace]:
+        if not self.root.is_dir():
+            return []
+        return [StagingWorkspace(path) for path in sorted(self.root.iterdir()) if (path / MANIFEST_NAME).is_file()]
+
+    def promote(self, workspace_id: str, force: bool = False) -> Dict[str, Dict[str, str]]:
+        """Apply the staged change-set to the live directory as one unit, then drop the workspace.
+
+        Holds an flock in the workspace for the whole promote, so of several
+        workers promoting it one applies it and the others get KeyError.
+        """
+        workspace = self.get(workspace_id)
+        try:
+            promote_lock = lock_file(workspace.root / PROMOTE_LOCK_NAME)
+        except FileNotFoundError:  # Removed meanwhile
+            raise KeyError(workspace_id)
+        with self._lock, promote_lock:
+            workspace = self.get(workspace_id)  # Promoted by another worker while waiting
+            conflicting = workspace.conflicts()
+            if conflicting and not force:
+                raise StagingConflict(f"Changed in the live directory since staging: {', '.join(conflicting)}")
+            file_manager = FileManager()
+            file_manager.set_managed_directory(self.managed_dir)
+            try:
+                results = file_manager.apply_change_set(workspace.staged_changes())
+            except FileManagerError as e:
+                raise StagingError(str(e)) from e
+            workspace.remove()
+            return results
+
+def stop_local_previews():
+    """Stop the preview apps this worker started (on shutdown, they run in their own session)."""
+    for process in list(_started_here.values()):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    _started_here.clear()
+
+_managers: Dict[str, StagingManager] = {}
+_managers_lock = threading.Lock()
+
+def get_staging_manager(managed_dir: Path) -> StagingManager:
+    key = str(Path(managed_dir).resolve())
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = StagingManager(Path(managed_dir))
+        return _managers[key]
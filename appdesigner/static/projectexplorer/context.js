@@ -314,25 +314,26 @@ async function updateContextView(name) {
     emptyState.style.display = itemCount === 0 ? 'block' : 'none';
     
     if (itemCount > 0) {
-        // First identify all directories in the context using stored type info
-        const contextDirs = Array.from(context.items)
-            .filter(item => {
-                const storedType = context.itemTypes?.get(item);
-                return storedType === 'directory' || 
-                       item.endsWith('/') || 
-                       document.querySelector(`.file-tree-item[data-path="${item}"]`)?.classList.contains('directory');
-            });
-        
-        // Scan all directories first
-        const dirContentsMap = new Map();
-        for (const dir of contextDirs) {
-            const contents = await scanDirectoryContents(dir);
-            dirContentsMap.set(dir, contents);
+        // Resolve the whole context in one request instead of scanning each directory
+        let resolved = { items: [], files: [] };
+        try {
+            const response = await fetch(`/api/contexts/${encodeURIComponent(name)}/resolved`);
+            if (response.ok) {
+                resolved = await response.json();
+            }
+        } catch (error) {
+            console.error('Error resolving context:', error);
+        }
+        const resolvedTypes = new Map(resolved.items.map(item => [item.path, item.type]));
+        const resolvedFiles = new Map(resolved.files.map(file => [file.path, file]));
+        if (resolved.total_tokens !== undefined) {
+            countElement.textContent += ` · ${formatTokens(resolved.total_tokens)}`;
         }
         
         // Process each item
         for (const item of context.items) {
-            const isDirectory = contextDirs.includes(item);
+            const storedType = resolvedTypes.get(item) || context.itemTypes?.get(item);
+            const isDirectory = storedType === 'directory' || item.endsWith('/');
             
             const itemElement = document.createElement('div');
             itemElement.className = 'context-item';
@@ -351,18 +352,11 @@ async function updateContextView(name) {
             const itemInfo = document.createElement('div');
             itemInfo.className = 'item-info';
             
-            // Fetch file info if not a directory
-            if (!isDirectory) {
-                try {
-                    const response = await fetch(`/api/file?path=${encodeURIComponent(item)}`);
-                    const fileInfo = await response.json();
-                    if (fileInfo && fileInfo.tokens !== undefined) {
-                        itemInfo.textContent = formatTokens(fileInfo.tokens);
-                        itemContent.appendChild(itemInfo);
-                    }
-                } catch (error) {
-                    console.error('Error fetching file info:', error);
-                }
+            // Show token info if not a directory
+            const fileInfo = !isDirectory && resolvedFiles.get(item);
+            if (fileInfo && fileInfo.tokens !== undefined) {
+                itemInfo.textContent = formatTokens(fileInfo.tokens);
+                itemContent.appendChild(itemInfo);
             }
             
             const removeButton = document.createElement('button');
@@ -375,8 +369,9 @@ async function updateContextView(name) {
             itemContent.appendChild(itemPath);
             
             // If it's a directory, add its contents as a sublist
-            if (isDirectory && dirContentsMap.has(item)) {
-                const contents = dirContentsMap.get(item);
+            if (isDirectory) {
+                const prefix = item.replace(/\/$/, '') + '/';
+                const contents = resolved.files.filter(file => file.path.startsWith(prefix));
                 if (contents.length > 0) {
                     const subList = document.createElement('div');
                     subList.className = 'context-sublist';
@@ -387,14 +382,14 @@ async function updateContextView(name) {
                         
                         const subIcon = document.createElement('span');
                         subIcon.className = 'item-icon';
-                        subIcon.innerHTML = subItem.type === 'directory' ? '📁' : '📄'; // Fix encoding
+                        subIcon.innerHTML = '📄';
                         
                         const subPath = document.createElement('span');
                         subPath.className = 'item-path';
                         subPath.textContent = subItem.path;
                         
                         // Add token info for files instead of size
-                        if (subItem.type === 'file' && subItem.tokens !== undefined) {
+                        if (subItem.tokens !== undefined) {
                             const subInfo = document.createElement('span');
                             subInfo.className = 'item-info';
                             subInfo.textContent = formatTokens(subItem.tokens);
@@ -549,18 +544,6 @@ function renameContextFolder(oldName, newName) {
     return true;
 }
 
-// Add new helper function to scan directory contents
-async function scanDirectoryContents(path) {
-    try {
-        const response = await fetch(`/api/files?path=${encodeURIComponent(path)}`);
-        if (!response.ok) throw new Error('Failed to scan directory');
-        const files = await response.json();
-        return files;
-    } catch (error) {
-        return [];
-    }
-}
-
 function formatFileSize(bytes) {
     if (bytes === undefined || bytes === null) return '';
     const size = Number(bytes);  // Convert to number
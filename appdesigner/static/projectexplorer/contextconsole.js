@@ -89,30 +89,17 @@ Context Information:
                     consoleElement.printMessage('Type ".help" to see available commands', 'message-system');
             }
         } else {
-            // Get all files including those in folders
+            // Get all files including those in folders, already expanded by the server
             let allFiles = new Set();
             
-            // Process each item in the context
-            for (const item of currentContext.items) {
-                if (currentContext.itemTypes?.get(item) === 'directory') {
-                    // If it's a directory, fetch its contents
-                    try {
-                        const response = await fetch(`/api/files?path=${encodeURIComponent(item)}`);
-                        if (response.ok) {
-                            const files = await response.json();
-                            files.forEach(file => {
-                                if (file.type === 'file') {
-                                    allFiles.add(file.path);
-                                }
-                            });
-                        }
-                    } catch (error) {
-                        console.error('Error fetching directory contents:', error);
-                    }
-                } else {
-                    // If it's a file, add it directly
-                    allFiles.add(item);
+            try {
+                const response = await fetch(`/api/contexts/${encodeURIComponent(window.currentContext)}/resolved`);
+                if (response.ok) {
+                    const resolved = await response.json();
+                    resolved.files.forEach(file => allFiles.add(file.path));
                 }
+            } catch (error) {
+                console.error('Error resolving context files:', error);
             }
 
             const files = Array.from(allFiles);
@@ -123,27 +110,79 @@ Context Information:
                 consoleElement.printMessage(`  - ${file}`, 'file-item');
             });
 
-            // Handle API request
+            // Queue the instruction as a background job, so it survives a closed tab or a designer restart
             try {
-                const response = await fetch('/api/process-user-instructions', {
+                const counter = Date.now();
+                const response = await fetch('/api/jobs', {
                     method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
+                    headers: { 'Content-Type': 'application/json', 'Idempotency-Key': `console-${counter}` },
                     body: JSON.stringify({ 
                         instruction: cmd,
-                        counter: Date.now(),
-                        files: files
+                        counter: counter,
+                        files: files,
+                        context: window.currentContext
                     })
                 });
-                
-                const result = await response.json();
-                if (result.error) {
-                    consoleElement.printMessage(`Error: ${result.error}`, 'message-error');
-                } else {
-                    consoleElement.printSystemMessage(result.response);
+                if (!response.ok) {
+                    const error = await response.json();
+                    throw new Error(error.detail || response.statusText);
                 }
+                const job = await response.json();
+                consoleElement.printMessage(`Queued job ${job.id}`, 'message-system');
+                followJob(consoleElement, job.id);
             } catch (error) {
                 consoleElement.printMessage(`Failed to process instruction: ${error}`, 'message-error');
             }
         }
     }
-}
\ No newline at end of file
+}
+
+// Print a job's progress as it runs, then its result
+function followJob(consoleElement, jobId) {
+    const source = new EventSource(`/api/jobs/${jobId}/stream`);
+    source.addEventListener('progress', event => {
+        consoleElement.printMessage(`  ${JSON.parse(event.data).message}`, 'message-system');
+    });
+    source.addEventListener('writing', event => {
+        consoleElement.printMessage(`  ${JSON.parse(event.data).message}`, 'message-system');
+    });
+    source.addEventListener('requeued', event => {
+        consoleElement.printMessage(`  ${JSON.parse(event.data).message}`, 'message-system');
+    });
+    source.addEventListener('done', event => {
+        source.close();
+        const job = JSON.parse(event.data);
+        if (job.status === 'succeeded') {
+            printResult(consoleElement, job.result);
+        } else if (job.status === 'cancelled') {
+            consoleElement.printMessage(`Job ${jobId} cancelled`, 'message-system');
+        } else {
+            consoleElement.printMessage(`Failed to process instruction: ${job.error}`, 'message-error');
+        }
+    });
+    // EventSource reconnects on its own (resuming with Last-Event-ID) after network errors
+}
+
+function printResult(consoleElement, result) {
+    if (result.preflight && result.preflight.compacted) {
+        const report = result.preflight;
+        consoleElement.printMessage(
+            `Prompt compacted: ${report.original_tokens.toLocaleString()} → ` +
+            `${report.final_tokens.toLocaleString()} tokens (budget ${report.budget.toLocaleString()})`,
+            'message-system'
+        );
+        report.files
+            .filter(file => file.action !== 'kept')
+            .forEach(file => {
+                consoleElement.printMessage(
+                    `  - ${file.path}: ${file.action} (${file.original_tokens} → ${file.tokens} tokens)`,
+                    'file-item'
+                );
+            });
+    }
+    if (result.error) {
+        consoleElement.printMessage(`Error: ${result.error}`, 'message-error');
+    } else {
+        consoleElement.printSystemMessage(result.response);
+    }
+}
@@ -90,6 +90,69 @@ function showToast(message, type = 'success') {
     }, 3000);
 }
 
+// Offsets sent to the server count characters (code points), not UTF-16 units
+function codePointLength(text) {
+    let length = 0;
+    for (const _ of text) length++;
+    return length;
+}
+
+// Single range replacement turning oldText into newText: common prefix and suffix are left out
+function diffEdit(oldText, newText) {
+    if (oldText === newText) return null;
+    let prefix = 0;
+    const maxPrefix = Math.min(oldText.length, newText.length);
+    while (prefix < maxPrefix && oldText.charCodeAt(prefix) === newText.charCodeAt(prefix)) prefix++;
+    let suffix = 0;
+    const maxSuffix = maxPrefix - prefix;
+    while (suffix < maxSuffix &&
+           oldText.charCodeAt(oldText.length - 1 - suffix) === newText.charCodeAt(newText.length - 1 - suffix)) suffix++;
+    // Never split a surrogate pair
+    if (prefix > 0 && /[\uD800-\uDBFF]/.test(oldText[prefix - 1])) prefix--;
+    if (suffix > 0 && /[\uDC00-\uDFFF]/.test(oldText[oldText.length - suffix])) suffix--;
+
+    const start = codePointLength(oldText.slice(0, prefix));
+    return {
+        start,
+        end: start + codePointLength(oldText.slice(prefix, oldText.length - suffix)),
+        text: newText.slice(prefix, newText.length - suffix)
+    };
+}
+
+async function saveFile(path, content) {
+    const url = `/api/file?path=${encodeURIComponent(path)}`;
+    let response;
+    if (window.savedContentHash && window.savedContent !== undefined) {
+        // Only send the changed range, against the version we loaded
+        const edit = diffEdit(window.savedContent, content);
+        response = await fetch(url, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                base_hash: window.savedContentHash,
+                edits: edit ? [edit] : []
+            })
+        });
+        if (response.status === 409) {
+            throw new Error('File was changed by someone else since it was opened, reopen it to edit');
+        }
+    } else {
+        response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ content })
+        });
+    }
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Failed to save file');
+    }
+    const result = await response.json();
+    window.savedContent = content;
+    window.savedContentHash = result.hash;
+    return result;
+}
+
 export function initializeEditorButtons() {
     const editButton = document.getElementById('edit-button');
     const saveButton = document.getElementById('save-button');
@@ -140,22 +203,7 @@ export function initializeEditorButtons() {
             saveButton.className = 'save-button saving';
             saveButton.disabled = true;
             
-            const response = await fetch(`/api/file?path=${encodeURIComponent(currentFile)}`, {
-                method: 'POST',
-                headers: { 
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    content: window.editor.getValue()
-                })
-            });
-
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Failed to save file');
-            }
-
-            const result = await response.json();
+            const result = await saveFile(currentFile, window.editor.getValue());
             window.hasUnsavedChanges = false;
             window.isEditMode = false;
 
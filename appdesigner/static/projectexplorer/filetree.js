@@ -59,88 +59,142 @@ function createBreadcrumbItem(label, path, isClickable) {
 
 function navigateToDirectory(path) {
     currentPath = path;
+    const filterInput = document.getElementById('file-filter');
+    if (filterInput) filterInput.value = '';
     updateBreadcrumbs(path);
     loadFileTree();
 }
 
-// Remove setupFileTreeDragAndDrop function entirely
+// The tree is virtualized: directories are fetched a page at a time and
+// only the rows in (or near) the viewport exist in the DOM, so a directory
+// with tens of thousands of entries scrolls like one with ten.
+const ROW_HEIGHT = 26;        // px, must match .file-tree-item height in projectexplorer.css
+const PAGE_SIZE = 200;        // Entries per /api/files request
+const OVERSCAN = 10;          // Rows rendered above and below the viewport
+const FILTER_DELAY = 200;     // ms of typing pause before the filter is applied
+
+let listing = null;           // {path, query, entries, nextCursor, total, loading}
+let listingGeneration = 0;    // Discards pages of listings that were replaced meanwhile
+let renderedRange = null;
+let filterTimer = null;
+
+function rowCount() {
+    return (listing.path ? 1 : 0) + listing.total;
+}
+
+function createRow(index) {
+    const item = document.createElement('div');
+    item.style.top = `${index * ROW_HEIGHT}px`;
+    const icon = document.createElement('span');
+    icon.className = 'icon';
+    const name = document.createElement('span');
+    name.className = 'name';
+
+    const entryIndex = listing.path ? index - 1 : index;
+    if (entryIndex < 0) {
+        item.className = 'file-tree-item back';
+        item.title = 'Double click to go back';
+        icon.innerHTML = '⬅';
+        name.textContent = '..';
+    } else if (entryIndex >= listing.entries.length) {
+        item.className = 'file-tree-item placeholder';  // Page not loaded yet
+    } else {
+        const file = listing.entries[entryIndex];
+        item.className = `file-tree-item ${file.type} draggable`;
+        if (file.path === selectedFile) item.classList.add('selected');
+        item.draggable = true;
+        item.dataset.path = file.path;
+        item.dataset.type = file.type;
+        icon.innerHTML = file.type === 'directory' ? '📁' : '📄';
+        name.textContent = file.name;
+    }
+    item.appendChild(icon);
+    item.appendChild(name);
+    return item;
+}
+
+function renderVisibleRows(force = false) {
+    const treeElement = document.getElementById('file-tree');
+    const spacer = treeElement?.querySelector('.file-tree-spacer');
+    if (!listing || !spacer) return;
+
+    const total = rowCount();
+    const first = Math.max(0, Math.floor(treeElement.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(total, Math.ceil((treeElement.scrollTop + treeElement.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    if (!force && renderedRange && renderedRange[0] === first && renderedRange[1] === last) return;
+    renderedRange = [first, last];
+
+    spacer.style.height = `${total * ROW_HEIGHT}px`;
+    const rows = document.createDocumentFragment();
+    for (let index = first; index < last; index++) {
+        rows.appendChild(createRow(index));
+    }
+    spacer.replaceChildren(rows);
+
+    // Fetch the next page before the viewport reaches the unloaded rows
+    const loadedRows = (listing.path ? 1 : 0) + listing.entries.length;
+    if (listing.nextCursor && last + OVERSCAN >= loadedRows) {
+        loadNextPage().catch(error => console.error('Failed to load file tree page:', error));
+    }
+}
+
+async function loadNextPage() {
+    if (!listing || listing.loading || (listing.entries.length && !listing.nextCursor)) return;
+    const generation = listingGeneration;
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (listing.path) params.set('path', listing.path);
+    if (listing.query) params.set('q', listing.query);
+    if (listing.nextCursor) params.set('cursor', listing.nextCursor);
+
+    listing.loading = true;
+    try {
+        const response = await fetch(`/api/files?${params}`);
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || `HTTP ${response.status}`);
+        }
+        const page = await response.json();
+        if (generation !== listingGeneration) return;
+        listing.entries.push(...page.entries);
+        listing.nextCursor = page.next_cursor;
+        listing.total = page.next_cursor ? page.total : listing.entries.length;
+    } finally {
+        if (generation === listingGeneration) listing.loading = false;
+    }
+    renderVisibleRows(true);
+}
 
 async function loadFileTree() {
     const treeElement = document.getElementById('file-tree');
     if (!treeElement) return;  // Add null check
     treeElement.innerHTML = '<div class="loading">Loading...</div>';
-    
+
+    const filterInput = document.getElementById('file-filter');
+    listingGeneration++;
+    listing = {
+        path: currentPath,
+        query: filterInput ? filterInput.value.trim() : '',
+        entries: [],
+        nextCursor: null,
+        total: 0,
+        loading: false
+    };
+    renderedRange = null;
+
     try {
         // Add loading state class
         treeElement.classList.add('loading');
-        
-        // Add path parameter to API call
-        const response = await fetch(`/api/files${currentPath ? `?path=${encodeURIComponent(currentPath)}` : ''}`);
-        const allFiles = await response.json();
-        treeElement.innerHTML = ''; // Clear existing content
-
-        // Add back button if we're in a subdirectory
-        if (currentPath) {
-            const backItem = document.createElement('div');
-            backItem.className = 'file-tree-item back';
-            backItem.title = 'Double click to go back';  // Add tooltip
-            
-            const icon = document.createElement('span');
-            icon.className = 'icon';
-            icon.innerHTML = '⬅';
-            
-            const name = document.createElement('span');
-            name.className = 'name';
-            name.textContent = '..';
-            
-            backItem.appendChild(icon);
-            backItem.appendChild(name);
-            treeElement.appendChild(backItem);
-        }
-        
-        // Update filtering logic to show direct children only
-        const files = currentPath ? allFiles : allFiles.filter(file => !file.path.includes('/'));
-
-        // Sort files by type (directories first) and name
-        files.sort((a, b) => {
-            if (a.type === b.type) {
-                return a.name.localeCompare(b.name);  // Compare by name instead of path
-            }
-            return a.type === 'directory' ? -1 : 1;
-        });
-
-        // Create file tree items
-        files.forEach(file => {
-            const item = document.createElement('div');
-            item.className = `file-tree-item ${file.type}`;
-            // Make both files and directories draggable
-            item.classList.add('draggable');
-            item.draggable = true;
-            item.dataset.path = file.path;
-            item.dataset.type = file.type;  // Add type to dataset
-            
-            const icon = document.createElement('span');
-            icon.className = 'icon';
-            icon.innerHTML = file.type === 'directory' ? '📁' : '📄';
-            
-            const name = document.createElement('span');
-            name.className = 'name';
-            name.textContent = file.name;  // Use file.name instead of file.path
-            
-            item.appendChild(icon);
-            item.appendChild(name);
-            treeElement.appendChild(item);
-        });
-
-        // Add drag event listeners
-        treeElement.addEventListener('dragstart', handleDragStart);
-        treeElement.addEventListener('dragend', handleDragEnd);
+        await loadNextPage();
 
+        const spacer = document.createElement('div');
+        spacer.className = 'file-tree-spacer';
+        treeElement.replaceChildren(spacer);
+        treeElement.scrollTop = 0;
+        renderVisibleRows(true);
     } catch (error) {
         console.error('Failed to load file tree:', error);
-        const errorMessage = error.response?.data?.detail || error.message;
         treeElement.innerHTML = 
-            `<div class="error-message">Error loading file tree: ${errorMessage}</div>`;
+            `<div class="error-message">Error loading file tree: ${error.message}</div>`;
     } finally {
         // Remove loading state
         treeElement.classList.remove('loading');
@@ -188,7 +242,21 @@ function clearFileSelection() {
 }
 
 function initializeFileTree() {
-    document.getElementById('file-tree').addEventListener('click', async (e) => {
+    const treeElement = document.getElementById('file-tree');
+    treeElement.addEventListener('scroll', () => requestAnimationFrame(() => renderVisibleRows()));
+    window.addEventListener('resize', () => renderVisibleRows());
+    treeElement.addEventListener('dragstart', handleDragStart);
+    treeElement.addEventListener('dragend', handleDragEnd);
+
+    const filterInput = document.getElementById('file-filter');
+    if (filterInput) {
+        filterInput.addEventListener('input', () => {
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(loadFileTree, FILTER_DELAY);
+        });
+    }
+
+    treeElement.addEventListener('click', async (e) => {
         const fileItem = e.target.closest('.file-tree-item');
         if (!fileItem) return;
 
@@ -206,7 +274,7 @@ function initializeFileTree() {
 
         selectedFile = fileItem.dataset.path;
 
-        // Update selection UI
+        // Update selection UI (rows rendered later check selectedFile)
         document.querySelectorAll('.file-tree-item').forEach(item => {
             item.classList.remove('selected');
         });
@@ -231,6 +299,9 @@ function initializeFileTree() {
             const data = await response.json();
             
             if (data.content !== undefined) {
+                // Base version for incremental saves (see editor.js)
+                window.savedContent = data.content;
+                window.savedContentHash = data.hash;
                 const contentElement = document.getElementById('file-content');
                 contentElement.innerHTML = ''; // Clear previous content
                 const language = getLanguageFromPath(filename);
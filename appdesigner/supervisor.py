@@ -0,0 +1,229 @@
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+STATUS_FILE_NAME = "supervisor.json"
+
+def pump_lines(pipe, store):
+    """Copy a child's output pipe into a log store until every writer has closed it."""
+    with pipe:
+        for line in iter(pipe.readline, b''):
+            store.append(line.rstrip(b"\r\n").decode('utf-8', 'replace'))
+
+class SupervisedProcess:
+    """A child process definition plus its runtime state."""
+
+    def __init__(self, name: str, args: List[str], cwd: Path, env: Optional[Dict[str, str]] = None,
+                 stdout_path: Optional[Path] = None, stderr_path: Optional[Path] = None,
+                 stdout_store=None, stderr_store=None, critical: bool = False):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        # Log stores (logstore.LogStore) take precedence over the paths: output is piped
+        # through the supervisor, which appends it line by line
+        self.stdout_store = stdout_store
+        self.stderr_store = stderr_store
+        # The supervisor shuts everything down if a critical child crash-loops
+        self.critical = critical
+
+        self.process: Optional[subprocess.Popen] = None
+        self.state = "stopped"
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+        self.last_exit_code: Optional[int] = None
+        self.last_exit_at: Optional[float] = None
+        self.recent_exits: List[float] = []
+
+    def spawn(self) -> subprocess.Popen:
+        """Start the process in its own session so the whole group can be signalled."""
+        stdout = subprocess.PIPE if self.stdout_store else open(self.stdout_path, 'w') if self.stdout_path else None
+        stderr = subprocess.PIPE if self.stderr_store else open(self.stderr_path, 'w') if self.stderr_path else None
+        try:
+            self.process = subprocess.Popen(
+                self.args,
+                cwd=self.cwd,
+                env=self.env,
+                stdout=stdout,
+                stderr=stderr,
+                start_new_session=True
+            )
+        finally:
+            # The child has its own copies of the descriptors
+            for f in (stdout, stderr):
+                if f not in (None, subprocess.PIPE):
+                    f.close()
+        for pipe, store in ((self.process.stdout, self.stdout_store), (self.process.stderr, self.stderr_store)):
+            if store:
+                threading.Thread(target=pump_lines, args=(pipe, store), name=f"{self.name}-output",
+                                 daemon=True).start()
+        self.started_at = time.time()
+        self.state = "running"
+        return self.process
+
+    def signal(self, signum: int):
+        """Send a signal to the child's process group."""
+        if self.process and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "pid": self.process.pid if self.process and self.state == "running" else None,
+            "state": self.state,
+            "restarts": self.restarts,
+            "started_at": self.started_at,
+            "last_exit_code": self.last_exit_code,
+            "last_exit_at": self.last_exit_at,
+        }
+
+class Supervisor:
+    """Event-driven supervisor for the designer and managed app processes.
+
+    Each child has a monitor thread blocked in wait(), so exits are noticed
+    immediately instead of on the next poll. Crashed children are restarted
+    with exponential backoff, and too many exits in a short window mark the
+    child as crash-looping. State is written to a JSON status file that the
+    designer app serves to the UI.
+    """
+
+    def __init__(self, status_file: Optional[Path] = None, log: Callable[[str], None] = print,
+                 backoff_initial: float = 0.5, backoff_max: float = 30.0, stable_after: float = 10.0,
+                 crash_loop_restarts: int = 5, crash_loop_window: float = 60.0,
+                 stop_timeout: float = 5.0):
+        self.children: List[SupervisedProcess] = []
+        self.status_file = status_file
+        self.log = log
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.crash_loop_restarts = crash_loop_restarts
+        self.crash_loop_window = crash_loop_window
+        self.stop_timeout = stop_timeout
+
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        self._status_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.exit_code = 0
+
+    def add(self, child: SupervisedProcess) -> SupervisedProcess:
+        self.children.append(child)
+        return child
+
+    def start(self):
+        for child in self.children:
+            thread = threading.Thread(target=self._monitor, args=(child,), name=f"supervise-{child.name}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def wait(self) -> int:
+        """Block until the supervisor is stopped. Returns the exit code."""
+        self._stopped.wait()
+        return self.exit_code
+
+    def _monitor(self, child: SupervisedProcess):
+        backoff = self.backoff_initial
+        while not self._stopping.is_set():
+            try:
+                process = child.spawn()
+            except OSError as e:
+                self.log(f"[red]Failed to start {child.name}: {e}[/red]")
+                child.state = "failed"
+                self._write_status()
+                if child.critical:
+                    self._shutdown_from_monitor(1)
+                return
+            self.log(f"[bold blue]Started {child.name} (pid {process.pid})[/bold blue]")
+            self._write_status()
+            if self._stopping.is_set():
+                # stop() ran while we were spawning and did not see this process
+                child.signal(signal.SIGTERM)
+
+            exit_code = process.wait()  # Wakes up as soon as the child exits
+            now = time.time()
+            uptime = now - child.started_at
+            child.last_exit_code = exit_code
+            child.last_exit_at = now
+            if self._stopping.is_set():
+                child.state = "stopped"
+                self._write_status()
+                return
+
+            self.log(f"[bold red]{child.name} exited with code {exit_code} after {uptime:.1f}s[/bold red]")
+            if uptime >= self.stable_after:
+                backoff = self.backoff_initial
+            child.recent_exits = [t for t in child.recent_exits if now - t < self.crash_loop_window] + [now]
+
+            delay = backoff
+            backoff = min(backoff * 2, self.backoff_max)
+            if len(child.recent_exits) >= self.crash_loop_restarts:
+                child.state = "crash-loop"
+                self.log(f"[bold red]{child.name} is crash-looping "
+                         f"({len(child.recent_exits)} exits in {self.crash_loop_window:.0f}s)[/bold red]")
+                if child.critical:
+                    self._write_status()
+                    self._shutdown_from_monitor(1)
+                    return
+                delay = self.backoff_max
+                child.recent_exits = []
+            else:
+                child.state = "backoff"
+            self._write_status()
+
+            if self._stopping.wait(delay):
+                child.state = "stopped"
+                self._write_status()
+                return
+            child.restarts += 1
+
+    def _shutdown_from_monitor(self, exit_code: int):
+        threading.Thread(target=self.stop, args=(exit_code,), daemon=True).start()
+
+    def stop(self, exit_code: int = 0):
+        """Stop all children: SIGTERM first, SIGKILL whatever is left after stop_timeout."""
+        if self._stopping.is_set():
+            return
+        self.exit_code = exit_code
+        self._stopping.set()
+        for child in self.children:
+            child.signal(signal.SIGTERM)
+
+        deadline = time.monotonic() + self.stop_timeout
+        for child in self.children:
+            if not child.process:
+                continue
+            try:
+                child.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self.log(f"[red]{child.name} did not stop in {self.stop_timeout:.0f}s, killing it[/red]")
+                child.signal(signal.SIGKILL)
+                child.process.wait()
+            child.state = "stopped"
+        self._write_status()
+        self._stopped.set()
+
+    def status(self) -> Dict:
+        return {
+            "updated_at": time.time(),
+            "children": {child.name: child.status() for child in self.children},
+        }
+
+    def _write_status(self):
+        if not self.status_file:
+            return
+        with self._status_lock:
+            tmp_file = self.status_file.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(self.status(), f, indent=2)
+            os.replace(tmp_file, self.status_file)
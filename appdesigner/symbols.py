@@ -0,0 +1,346 @@
+import ast
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from treewalk import walk_tree
+from filemanager import read_file_safely, get_cache_dir
+
+INDEX_VERSION = 1
+INDEXED_EXTENSIONS = {'.py', '.js', '.mjs', '.jsx', '.ts', '.tsx', '.css', '.html', '.htm'}
+# Minimum seconds between two stat walks of the managed directory
+REFRESH_INTERVAL = float(os.getenv('SYMBOL_REFRESH_INTERVAL', '2.0'))
+
+ROUTE_METHODS = {'get', 'post', 'put', 'patch', 'delete', 'head', 'options', 'websocket', 'route', 'api_route'}
+
+JS_DECLARATIONS = [
+    (re.compile(r'^\s*(?:export\s+)?(?:default\s+)?class\s+([A-Za-z_$][\w$]*)'), 'class'),
+    (re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)'), 'function'),
+    (re.compile(r'^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?'
+                r'(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)'), 'function'),
+    (re.compile(r'^\s*(?:window\.)?([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>)'), 'function'),
+    (re.compile(r'^\s*(?:static\s+)?(?:async\s+)?(?:get\s+|set\s+)?([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*\{'), 'method'),
+]
+JS_NOT_METHODS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with'}
+HTML_ID = re.compile(r'<([a-zA-Z][\w-]*)[^>]*?\sid=["\']([^"\']+)["\']')
+HTML_SCRIPT = re.compile(r'<script[^>]*?\ssrc=["\']([^"\']+)["\']')
+
+def _symbol(name: str, kind: str, line: int, end_line: int, qualname: str = None, **extra) -> Dict[str, Any]:
+    symbol = {"name": name, "qualname": qualname or name, "kind": kind, "line": line, "end_line": end_line}
+    symbol.update(extra)
+    return symbol
+
+def extract_python_symbols(content: str) -> List[Dict[str, Any]]:
+    """Classes, functions, methods and decorator-declared routes of a Python file."""
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return []
+    symbols = []
+
+    def visit(nodes, parents: List[str]):
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                qualname = '.'.join(parents + [node.name])
+                symbols.append(_symbol(node.name, 'class', node.lineno, node.end_lineno, qualname))
+                visit(node.body, parents + [node.name])
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = '.'.join(parents + [node.name])
+                start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+                kind = 'method' if parents else 'function'
+                symbols.append(_symbol(node.name, kind, start, node.end_lineno, qualname))
+                for decorator in node.decorator_list:
+                    route = _route_from_decorator(decorator)
+                    if route:
+                        method, path = route
+                        symbols.append(_symbol(path, 'route', start, node.end_lineno, qualname, method=method))
+
+    visit(tree.body, [])
+    return symbols
+
+def _route_from_decorator(decorator: ast.expr) -> Optional[Tuple[str, str]]:
+    """Recognise @app.get("/path") / @router.post("/path") style decorators."""
+    if not isinstance(decorator, ast.Call) or not isinstance(decorator.func, ast.Attribute):
+        return None
+    method = decorator.func.attr
+    if method not in ROUTE_METHODS or not decorator.args:
+        return None
+    path = decorator.args[0]
+    if not isinstance(path, ast.Constant) or not isinstance(path.value, str):
+        return None
+    return method.upper(), path.value
+
+def _brace_positions(content: str) -> List[Tuple[int, str]]:
+    """Line numbers of the braces outside strings and comments (JS/CSS tokenizer)."""
+    braces = []
+    i, n, line = 0, len(content), 1
+    quote = None
+    while i < n:
+        c = content[i]
+        if c == '\n':
+            line += 1
+        if quote:
+            if c == '\\':
+                if i + 1 < n and content[i + 1] == '\n':
+                    line += 1
+                i += 2
+                continue
+            if c == quote:
+                quote = None
+        elif c in '"\'`':
+            quote = c
+        elif content.startswith('/*', i):
+            end = content.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            line += content.count('\n', i, end)
+            i = end
+            continue
+        elif content.startswith('//', i):
+            end = content.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif c in '{}':
+            braces.append((line, c))
+        i += 1
+    return braces
+
+def _block_ends(braces: List[Tuple[int, str]]) -> Dict[int, int]:
+    """Map the line of each opening brace to the line of its closing brace."""
+    ends: Dict[int, int] = {}
+    stack: List[int] = []
+    for line, brace in braces:
+        if brace == '{':
+            stack.append(line)
+        elif stack:
+            start = stack.pop()
+            ends.setdefault(start, line)
+    return ends
+
+def _end_line(ends: Dict[int, int], start: int, max_line: int) -> int:
+    """End of the block opened on start (or the next line, for K&R-less styles)."""
+    for line in (start, start + 1):
+        if line in ends:
+            return ends[line]
+    return min(start, max_line)
+
+def extract_js_symbols(content: str) -> List[Dict[str, Any]]:
+    """Classes, functions and methods of a JS/TS file."""
+    ends = _block_ends(_brace_positions(content))
+    lines = content.splitlines()
+    symbols = []
+    classes: List[Tuple[str, int]] = []
+    for number, text in enumerate(lines, start=1):
+        while classes and classes[-1][1] < number:
+            classes.pop()
+        for pattern, kind in JS_DECLARATIONS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            name = match.group(1)
+            if kind == 'method' and (name in JS_NOT_METHODS or not classes):
+                continue
+            end = _end_line(ends, number, len(lines))
+            qualname = f"{classes[-1][0]}.{name}" if kind == 'method' else name
+            symbols.append(_symbol(name, kind, number, end, qualname))
+            if kind == 'class':
+                classes.append((name, end))
+            break
+    return symbols
+
+def extract_css_symbols(content: str) -> List[Dict[str, Any]]:
+    """Top-level selectors and at-rules of a stylesheet."""
+    symbols = []
+    depth = 0
+    start = 0
+    # Blank out comments but keep their newlines so line numbers stay right
+    content = re.sub(r'/\*.*?\*/', lambda m: re.sub(r'[^\n]', ' ', m.group()), content, flags=re.DOTALL)
+    ends = _block_ends(_brace_positions(content))
+    for match in re.finditer(r'[{}]', content):
+        if match.group() == '{':
+            if depth == 0:
+                selector = content[start:match.start()].strip()
+                line = content.count('\n', 0, match.start()) + 1
+                end = ends.get(line, line)
+                if selector.startswith('@'):
+                    symbols.append(_symbol(selector, 'at-rule', line, end))
+                elif selector:
+                    for name in selector.split(','):
+                        symbols.append(_symbol(name.strip(), 'selector', line, end))
+            depth += 1
+        else:
+            depth = max(0, depth - 1)
+            if depth == 0:
+                start = match.end()
+    return symbols
+
+def extract_html_symbols(content: str) -> List[Dict[str, Any]]:
+    """Elements with an id and referenced scripts of an HTML file or template."""
+    symbols = []
+    for match in HTML_ID.finditer(content):
+        line = content.count('\n', 0, match.start()) + 1
+        symbols.append(_symbol(f"#{match.group(2)}", 'element', line, line, tag=match.group(1)))
+    for match in HTML_SCRIPT.finditer(content):
+        line = content.count('\n', 0, match.start()) + 1
+        symbols.append(_symbol(match.group(1), 'script', line, line))
+    return symbols
+
+def extract_symbols(path: str, content: str) -> List[Dict[str, Any]]:
+    """Extract the symbols of a file based on its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.py':
+        return extract_python_symbols(content)
+    if ext in ('.js', '.mjs', '.jsx', '.ts', '.tsx'):
+        return extract_js_symbols(content)
+    if ext == '.css':
+        return extract_css_symbols(content)
+    if ext in ('.html', '.htm'):
+        return extract_html_symbols(content)
+    return []
+
+class SymbolIndex:
+    """Persistent symbol index of a managed directory.
+
+    Files are re-parsed only when their content hash changes; unchanged files
+    are recognised by (mtime, size) without being read. Lookups are prefix
+    searches over a sorted name list.
+    """
+
+    def __init__(self, managed_dir: Path, index_file: Optional[Path] = None):
+        self.managed_dir = Path(managed_dir)
+        self.index_file = index_file or get_cache_dir(self.managed_dir) / "symbols.json"
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._names: List[Tuple[str, str, int]] = []  # (lowercase name, path, symbol index)
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+        self._rebuild_names()
+
+    def _save(self):
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _rebuild_names(self):
+        names = []
+        for path, info in self.files.items():
+            for i, symbol in enumerate(info["symbols"]):
+                names.append((symbol["name"].lower(), path, i))
+                if symbol["qualname"] != symbol["name"]:
+                    names.append((symbol["qualname"].lower(), path, i))
+        names.sort()
+        self._names = names
+
+    def refresh(self, force: bool = False) -> int:
+        """Bring the index up to date. Returns the number of re-parsed files."""
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return 0
+            seen = set()
+            parsed = 0
+            changed = False
+            for rel_path, entry in walk_tree(self.managed_dir):
+                if os.path.splitext(entry.name)[1].lower() not in INDEXED_EXTENSIONS:
+                    continue
+                seen.add(rel_path)
+                st = entry.stat()
+                info = self.files.get(rel_path)
+                if info and info["mtime_ns"] == st.st_mtime_ns and info["size"] == st.st_size:
+                    continue
+                success, content = read_file_safely(entry.path)
+                if not success:
+                    continue
+                digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+                if info and info["hash"] == digest:
+                    symbols = info["symbols"]
+                else:
+                    symbols = extract_symbols(rel_path, content)
+                    parsed += 1
+                self.files[rel_path] = {
+                    "hash": digest,
+                    "mtime_ns": st.st_mtime_ns,
+                    "size": st.st_size,
+                    "symbols": symbols,
+                }
+                changed = True
+            for rel_path in set(self.files) - seen:
+                del self.files[rel_path]
+                changed = True
+            if changed:
+                self._rebuild_names()
+                self._save()
+            self._last_refresh = time.monotonic()
+            return parsed
+
+    def invalidate(self):
+        """Force the next lookup to re-check the managed directory."""
+        self._last_refresh = 0.0
+
+    def lookup(self, prefix: str = '', kind: Optional[str] = None, path: Optional[str] = None,
+               limit: int = 50) -> List[Dict[str, Any]]:
+        """Find symbols whose name (or qualified name) starts with prefix."""
+        self.refresh()
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        start = bisect.bisect_left(self._names, (prefix, '', -1))
+        for name, file_path, i in self._names[start:]:
+            if not name.startswith(prefix):
+                break
+            if (file_path, i) in seen or (path and file_path != path):
+                continue
+            symbol = self.files[file_path]["symbols"][i]
+            if kind and symbol["kind"] != kind:
+                continue
+            seen.add((file_path, i))
+            results.append({**symbol, "path": file_path})
+            if len(results) >= limit:
+                break
+        return results
+
+    def file_symbols(self, path: str) -> List[Dict[str, Any]]:
+        """All symbols of one file, in source order."""
+        self.refresh()
+        info = self.files.get(path)
+        return [{**symbol, "path": path} for symbol in info["symbols"]] if info else []
+
+    def get_source(self, path: str, qualname: str) -> Optional[Dict[str, Any]]:
+        """The source slice of a symbol, so callers can send it instead of the whole file."""
+        for symbol in self.file_symbols(path):
+            if symbol["qualname"] == qualname:
+                success, content = read_file_safely(str(self.managed_dir / path))
+                if not success:
+                    return None
+                lines = content.splitlines()
+                return {**symbol, "source": '\n'.join(lines[symbol["line"] - 1:symbol["end_line"]])}
+        return None
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_symbol_index(managed_dir: Path) -> SymbolIndex:
+    """Get the shared SymbolIndex for a managed directory."""
+    key = str(Path(managed_dir).resolve())
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = SymbolIndex(Path(managed_dir))
+        return _indexes[key]
+
+def release_symbol_index(managed_dir: Path):
+    """Forget the index of a managed directory, freeing its memory."""
+    with _indexes_lock:
+        _indexes.pop(str(Path(managed_dir).resolve()), None)
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from supervisor import STATUS_FILE_NAME
+from sharedstate import SharedStore, get_shared_store
+from filemanager import lock_file
+
+TELEMETRY_INTERVAL = float(os.getenv('TELEMETRY_INTERVAL', '1.0'))
+# One hour of samples at the default interval
+TELEMETRY_CAPACITY = int(os.getenv('TELEMETRY_CAPACITY', '3600'))
+PROBE_TIMEOUT = 5.0
+# Held by the one designer worker that samples, in LOGS_DIR
+TELEMETRY_LOCK_NAME = "telemetry.lock"
+
+TELEMETRY_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS telemetry_events (
+           seq INTEGER PRIMARY KEY AUTOINCREMENT,
+           kind TEXT NOT NULL,
+           timestamp REAL NOT NULL,
+           value TEXT NOT NULL
+       )""",
+    "CREATE INDEX IF NOT EXISTS telemetry_events_kind ON telemetry_events(kind, timestamp)",
+]
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def read_proc_stat(pid: int) -> Optional[Tuple[int, int, int]]:
+    """Return (ppid, cpu ticks, threads) from /proc/<pid>/stat."""
+    try:
+        with open(f"/proc/{pid}/stat", 'rb') as f:
+            data = f.read().decode('utf-8', 'replace')
+    except OSError:
+        return None
+    # The command name may contain spaces, fields start after its closing paren
+    fields = data[data.rindex(')') + 2:].split()
+    return int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[17])
+
+def read_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+def count_fds(pid: int) -> int:
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return 0
+
+def process_tree(root_pid: int) -> List[int]:
+    """The root pid and all of its descendants (uvicorn --reload forks a worker)."""
+    children: Dict[int, List[int]] = {}
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return [root_pid]
+    for pid in pids:
+        stat = read_proc_stat(pid)
+        if stat:
+            children.setdefault(stat[0], []).append(pid)
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+def managed_app_pid() -> Optional[int]:
+    """Pid of the managed app as reported by the supervisor."""
+    logs_dir = os.getenv('LOGS_DIR')
+    if not logs_dir:
+        return None
+    try:
+        with open(Path(logs_dir) / STATUS_FILE_NAME) as f:
+            status = json.load(f)
+        return status["children"]["managed-app"]["pid"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+class TelemetrySampler:
+    """Samples CPU, RSS, threads and open FDs of a process tree into the shared store.
+
+    Every designer worker runs a sampler, but only the one holding the leader
+    lock file samples; the others retry the lock each interval and take over
+    when the leader exits. Samples and markers live in the store (the last
+    capacity of each), so every worker serves the same series. Optionally
+    also probes a URL each interval and records its latency.
+    """
+
+    def __init__(self, pid_source: Callable[[], Optional[int]] = managed_app_pid,
+                 interval: float = TELEMETRY_INTERVAL, capacity: int = TELEMETRY_CAPACITY,
+                 probe_url: Optional[str] = None, store: Optional[SharedStore] = None,
+                 leader_lock: Optional[Path] = None):
+        self.pid_source = pid_source
+        self.interval = interval
+        self.capacity = capacity
+        self.probe_url = probe_url
+        self.store = store or SharedStore()
+        self.leader_lock = leader_lock  # None: no other worker, always sample
+        self._leader_file = None
+        self._cpu_ticks: Dict[int, int] = {}
+        self._last_time: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        for statement in TELEMETRY_SCHEMA:
+            self.store.execute(statement)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def leader(self) -> bool:
+        """Whether this worker samples, taking the leader lock if it is free."""
+        if self.leader_lock is None or self._leader_file is not None:
+            return True
+        self._leader_file = lock_file(self.leader_lock, blocking=False)  # Held until the process exits
+        return self._leader_file is not None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self.leader:
+                    self._append("sample", self.sample())
+            except Exception as e:
+                print(f"Telemetry sampling failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _append(self, kind: str, event: Dict[str, Any]):
+        """Store an event, dropping the oldest of its kind beyond capacity."""
+        self.store.transaction([
+            ("INSERT INTO telemetry_events (kind, timestamp, value) VALUES (?, ?, ?)",
+             (kind, event["timestamp"], json.dumps(event))),
+            ("""DELETE FROM telemetry_events WHERE kind = ? AND seq <= (
+                    SELECT seq FROM telemetry_events WHERE kind = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)""",
+             (kind, kind, self.capacity)),
+        ])
+
+    def _events(self, kind: str, since: Optional[float]) -> List[Dict[str, Any]]:
+        rows = self.store.execute(
+            "SELECT value FROM telemetry_events WHERE kind = ? AND timestamp > ? ORDER BY seq",
+            (kind, since if since is not None else -1.0))
+        return [json.loads(row[0]) for row in rows]
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one sample of the current process tree."""
+        now = time.monotonic()
+        sample: Dict[str, Any] = {"timestamp": time.time(), "running": False}
+        root_pid = self.pid_source()
+        if root_pid:
+            pids = process_tree(root_pid)
+            ticks: Dict[int, int] = {}
+            threads = 0
+            for pid in pids:
+                stat = read_proc_stat(pid)
+                if stat:
+                    ticks[pid] = stat[1]
+                    threads += stat[2]
+            if ticks:
+                cpu_percent = None
+                if self._last_time is not None:
+                    # Processes that are new since the last sample count from zero
+                    delta = sum(t - self._cpu_ticks.get(pid, 0) for pid, t in ticks.items())
+                    cpu_percent = round(100.0 * delta / CLOCK_TICKS / (now - self._last_time), 1)
+                sample.update({
+                    "running": True,
+                    "pid": root_pid,
+                    "processes": len(ticks),
+                    "cpu_percent": cpu_percent,
+                    "rss_bytes": sum(read_rss(pid) for pid in ticks),
+                    "threads": threads,
+                    "open_fds": sum(count_fds(pid) for pid in ticks),
+                })
+            self._cpu_ticks = ticks
+        else:
+            self._cpu_ticks = {}
+        self._last_time = now
+
+        if self.probe_url:
+            sample.update(self.probe())
+        return sample
+
+    def probe(self) -> Dict[str, Any]:
+        """Time one GET request to the probe URL."""
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(self.probe_url, timeout=PROBE_TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            return {"latency_ms": None, "status": None}
+        return {"latency_ms": round((time.perf_counter() - started) * 1000, 2), "status": status}
+
+    def mark(self, label: str):
+        """Record an event (e.g. an applied agent change) to line up with the samples."""
+        self._append("marker", {"timestamp": time.time(), "label": label})
+
+    def get_series(self, since: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "probe_url": self.probe_url,
+            "samples": self._events("sample", since),
+            "markers": self._events("marker", since),
+        }
+
+_sampler: Optional[TelemetrySampler] = None
+_sampler_lock = threading.Lock()
+
+def get_sampler() -> TelemetrySampler:
+    """Get this worker's sampler for the managed app, starting it on first use.
+
+    With LOGS_DIR, the workers of the run share one series through the shared store.
+    """
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            logs_dir = os.getenv('LOGS_DIR')
+            _sampler = TelemetrySampler(probe_url=os.getenv('MANAGED_APP_URL') or None,
+                                        store=get_shared_store(),
+                                        leader_lock=Path(logs_dir) / TELEMETRY_LOCK_NAME if logs_dir else None)
+            _sampler.start()
+        return _sampler
+
+def mark(label: str):
+    """Record an event on the shared sampler."""
+    get_sampler().mark(label)
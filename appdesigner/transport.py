@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# LLM_TRANSPORT selects how APIAgent talks to the model:
+#   anthropic (default)   the real Messages API
+#   record:/some/dir      the real API, saving every response to the directory
+#   replay:/some/dir      recorded responses only, no network or API key needed
+#   synthetic             canned edits of the first file in the prompt, for benchmarks
+LLM_TRANSPORT = os.getenv('LLM_TRANSPORT', 'anthropic')
+# Multiplier for the recorded latencies on replay, 0 replays instantly
+LLM_REPLAY_SPEED = float(os.getenv('LLM_REPLAY_SPEED', '1.0'))
+
+OnText = Callable[[str], None]
+# Comment appended by SyntheticTransport, valid in each file type
+EDIT_MARKERS = {".py": "# edited", ".html": "<!-- edited -->", ".css": "/* edited */", ".md": "edited", ".txt": "edited"}
+
+class TransportError(Exception):
+    """Raised when a transport cannot produce a response."""
+    pass
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Stable key of a request: everything that influences the response."""
+    payload = json.dumps(
+        {k: request.get(k) for k in ("model", "system", "prompt", "max_tokens")},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _empty_usage() -> Dict[str, int]:
+    return {"input_tokens": 0, "output_tokens": 0, "cache_creation_tokens": 0, "cache_read_tokens": 0}
+
+class Transport(ABC):
+    """Sends one request and streams the response text to on_text.
+
+    request has the keys model, system, prompt and max_tokens. Returns the
+    usage of the call (input, output and cache tokens).
+    """
+
+    @abstractmethod
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        pass
+
+class AnthropicTransport(Transport):
+    """The real Anthropic Messages API, streamed."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        from anthropic import Anthropic
+        api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("API key must be provided or set in ANTHROPIC_API_KEY environment variable")
+        self.client = Anthropic(api_key=api_key)
+
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        kwargs = {"system": request["system"]} if request.get("system") else {}
+        with self.client.messages.stream(
+            model=request["model"],
+            max_tokens=request["max_tokens"],
+            messages=[{"role": "user", "content": request["prompt"]}],
+            **kwargs
+        ) as stream:
+            for text in stream.text_stream:
+                on_text(text)
+            usage = stream.get_final_message().usage
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_creation_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+        }
+
+class RecordingTransport(Transport):
+    """Passes requests to another transport and saves each response with its chunk timings."""
+
+    def __init__(self, inner: Transport, directory: Path):
+        self.inner = inner
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        chunks: List[List[Any]] = []
+        started = time.perf_counter()
+
+        def record(text: str):
+            chunks.append([round(time.perf_counter() - started, 4), text])
+            on_text(text)
+
+        usage = self.inner.complete(request, record)
+        recording = {
+            "request": request,
+            "chunks": chunks,
+            "duration": round(time.perf_counter() - started, 4),
+            "usage": usage,
+        }
+        path = self.directory / f"{request_key(request)}.json"
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(recording, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return usage
+
+class ReplayTransport(Transport):
+    """Replays recorded responses, deterministically and with the recorded timings scaled by speed."""
+
+    def __init__(self, directory: Path, speed: float = LLM_REPLAY_SPEED):
+        self.directory = Path(directory)
+        self.speed = speed
+
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        key = request_key(request)
+        path = self.directory / f"{key}.json"
+        try:
+            with open(path, encoding='utf-8') as f:
+                recording = json.load(f)
+        except FileNotFoundError:
+            raise TransportError(f"No recorded response for request {key[:12]} in {self.directory}")
+        started = time.perf_counter()
+        for offset, text in recording["chunks"]:
+            delay = offset * self.speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            on_text(text)
+        delay = recording.get("duration", 0) * self.speed - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        return recording.get("usage") or _empty_usage()
+
+class SyntheticTransport(Transport):
+    """Offline stand-in for the model.
+
+    Answers change prompts with a small edit of the first file in the prompt
+    (and query prompts with a short markdown answer), streamed in chunks after
+    first_token_latency at tokens_per_second.
+    """
+
+    def __init__(self, first_token_latency: float = 0.0, tokens_per_second: float = 0.0, chunk_chars: int = 200):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_chars = chunk_chars
+
+    def respond(self, prompt: str) -> str:
+        if "<plan>" in prompt:
+            files = re.findall(r'<filename>(.*?)</filename>', prompt)
+            return "<plan>\n" + "".join(f"<file>{f}</file>\n" for f in files[:2]) + "</plan>"
+        files = re.findall(r'<inputfile>\n<filename>(.*?)</filename>\n(?:<compacted>.*?</compacted>\n)?'
+                           r'<content>\n(.*?)\n</content>\n</inputfile>', prompt, re.DOTALL)
+        if prompt.rstrip().endswith("without modifying them.") or not files:
+            return "The files look fine.\n\n```python\nprint('ok')\n```\n"
+        responsible = re.search(r'You are responsible only for: (.*)', prompt)
+        filename = responsible.group(1).strip() if responsible else files[0][0]
+        content = dict(files).get(filename, "")
+        ext = os.path.splitext(filename)[1].lower()
+        marker = EDIT_MARKERS.get(ext, "// edited")
+        return f"<outputfile>\n<filename>{filename}</filename>\n<content>\n{content}\n{marker}\n</content>\n</outputfile>"
+
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        text = self.respond(request["prompt"])
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for i in range(0, len(text), self.chunk_chars):
+            chunk = text[i:i + self.chunk_chars]
+            if self.tokens_per_second:
+                time.sleep(len(chunk) / 4 / self.tokens_per_second)
+            on_text(chunk)
+        usage = _empty_usage()
+        usage["input_tokens"] = (len(request.get("system") or "") + len(request["prompt"])) // 4
+        usage["output_tokens"] = len(text) // 4
+        return usage
+
+class TokenBucket:
+    """Thread-safe token bucket: rate units per second, bursts up to capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Block until amount is available and take it (at most capacity, so it always returns)."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def charge(self, amount: float):
+        """Take amount after the fact, going into debt if needed; later acquires wait it off."""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+class RateLimitedTransport(Transport):
+    """Another transport behind shared request and token rate limits.
+
+    Several agents can share the buckets so that together they stay under
+    the API limits. The input tokens of a request are estimated up front and
+    corrected with the actual usage once it completes.
+    """
+
+    def __init__(self, inner: Transport, requests: Optional[TokenBucket] = None,
+                 tokens: Optional[TokenBucket] = None):
+        self.inner = inner
+        self.requests = requests
+        self.tokens = tokens
+
+    def complete(self, request: Dict[str, Any], on_text: OnText) -> Dict[str, int]:
+        estimate = (len(request.get("system") or "") + len(request["prompt"])) // 4
+        if self.requests:
+            self.requests.acquire()
+        if self.tokens:
+            self.tokens.acquire(estimate)
+        usage = self.inner.complete(request, on_text)
+        if self.tokens:
+            self.tokens.charge(usage["input_tokens"] + usage["output_tokens"] - min(estimate, self.tokens.capacity))
+        return usage
+
+def transport_from_env(api_key: Optional[str] = None, spec: Optional[str] = None) -> Transport:
+    """Build the transport selected by LLM_TRANSPORT."""
+    spec = spec or LLM_TRANSPORT
+    kind, _, arg = spec.partition(':')
+    if kind == 'anthropic':
+        return AnthropicTransport(api_key)
+    if kind == 'record':
+        return RecordingTransport(AnthropicTransport(api_key), Path(arg or 'recordings'))
+    if kind == 'replay':
+        return ReplayTransport(Path(arg or 'recordings'))
+    if kind == 'synthetic':
+        return SyntheticTransport()
+    raise ValueError(f"Unknown LLM_TRANSPORT '{spec}'")
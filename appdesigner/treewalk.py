@@ -0,0 +1,225 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Patterns that are never worth walking into, even without a .gitignore
+DEFAULT_IGNORE_PATTERNS = [
+    '.git/',
+    'node_modules/',
+    '.venv/',
+    'venv/',
+    '__pycache__/',
+    '*.py[cod]',
+    '.mypy_cache/',
+    '.pytest_cache/',
+    '.ruff_cache/',
+    '.tox/',
+]
+
+GITIGNORE_FILE = '.gitignore'
+CUSTOM_IGNORE_FILE = '.appdesignerignore'
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression body."""
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                parts.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                parts.append('.*')
+                i += 2
+                continue
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+class IgnoreRule:
+    """A single compiled gitignore pattern."""
+
+    def __init__(self, pattern: str, base: str = ''):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # A slash anywhere but the end anchors the pattern to its .gitignore
+        self.anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        self.base = base
+        self.regex = re.compile(_translate_glob(pattern) + r'\Z')
+
+    def matches(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        if self.anchored:
+            return self.regex.match(rel_path) is not None
+        return self.regex.match(name) is not None
+
+def parse_ignore_lines(lines: Iterable[str], base: str = '') -> List[IgnoreRule]:
+    """Compile the non-empty, non-comment lines of an ignore file."""
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.strip() or line.startswith('#'):
+            continue
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+        rules.append(IgnoreRule(line, base))
+    return rules
+
+class IgnoreMatcher:
+    """Ordered set of ignore rules where the last matching rule wins."""
+
+    def __init__(self, rules: Optional[List[IgnoreRule]] = None):
+        self.rules = rules or []
+        self._has_negations = any(rule.negate for rule in self.rules)
+
+    @classmethod
+    def default(cls, extra_patterns: Optional[List[str]] = None) -> 'IgnoreMatcher':
+        """Build a matcher from the built-in defaults plus extra patterns."""
+        return cls(parse_ignore_lines(DEFAULT_IGNORE_PATTERNS + (extra_patterns or [])))
+
+    def extend(self, rules: List[IgnoreRule]) -> 'IgnoreMatcher':
+        """Return a new matcher with rules appended (e.g. a nested .gitignore)."""
+        if not rules:
+            return self
+        return IgnoreMatcher(self.rules + rules)
+
+    def with_ignore_files(self, directory: Path, rel_dir: str = '') -> 'IgnoreMatcher':
+        """Return a matcher extended with the ignore files found in directory."""
+        rules = []
+        for ignore_name in (GITIGNORE_FILE, CUSTOM_IGNORE_FILE):
+            ignore_path = directory / ignore_name
+            if ignore_path.is_file():
+                rules.extend(_load_ignore_file(ignore_path, rel_dir))
+        return self.extend(rules)
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check a path (relative to the walk root, '/' separated)."""
+        name = rel_path.rsplit('/', 1)[-1]
+        if not self._has_negations:
+            return any(rule.matches(rel_path, name, is_dir) for rule in self.rules)
+        ignored = False
+        for rule in self.rules:
+            if rule.matches(rel_path, name, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+def _load_ignore_file(path: Path, base: str) -> List[IgnoreRule]:
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return parse_ignore_lines(f, base)
+    except OSError:
+        return []
+
+def matcher_for_directory(base_dir: Path, subpath: str = '',
+                          matcher: Optional[IgnoreMatcher] = None) -> IgnoreMatcher:
+    """Build the matcher in effect for subpath, reading every ignore file on the way down."""
+    matcher = matcher or IgnoreMatcher.default()
+    matcher = matcher.with_ignore_files(base_dir)
+    rel_dir = ''
+    for part in Path(subpath).parts if subpath else []:
+        rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+        matcher = matcher.with_ignore_files(base_dir / rel_dir, rel_dir)
+    return matcher
+
+def walk_tree(base_dir: Path, subpath: str = '', matcher: Optional[IgnoreMatcher] = None,
+              use_ignore_files: bool = True, include_hidden: bool = True,
+              visited_dirs: Optional[List[str]] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+    """Yield (relative_path, entry) for every non-ignored file under base_dir/subpath.
+
+    Paths are relative to base_dir. Ignore rules are applied while walking, so
+    ignored directories are never entered. Nested .gitignore/.appdesignerignore
+    files apply to their subtree. If visited_dirs is given, the absolute path of
+    every scanned directory is appended to it.
+    """
+    base_dir = Path(base_dir)
+    subpath = subpath.strip('/')
+    matcher = matcher or IgnoreMatcher.default()
+    if use_ignore_files:
+        matcher = matcher_for_directory(base_dir, subpath, matcher)
+
+    start_dir = base_dir / subpath if subpath else base_dir
+    stack: List[Tuple[str, str, IgnoreMatcher]] = [(str(start_dir), subpath, matcher)]
+    while stack:
+        dir_path, rel_dir, dir_matcher = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        if visited_dirs is not None:
+            visited_dirs.append(dir_path)
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if not include_hidden and name.startswith('.'):
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if dir_matcher.is_ignored(rel_path, is_dir):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, rel_path))
+            elif entry.is_file():
+                yield rel_path, entry
+
+        for sub_path, sub_rel in reversed(subdirs):
+            sub_matcher = dir_matcher
+            if use_ignore_files:
+                sub_matcher = dir_matcher.with_ignore_files(Path(sub_path), sub_rel)
+            stack.append((sub_path, sub_rel, sub_matcher))
+
+def read_files_parallel(paths: Dict[str, str], reader: Callable[[str], str],
+                        max_workers: Optional[int] = None) -> Dict[str, Tuple[bool, str]]:
+    """Read many files through a thread pool.
+
+    paths maps a key (usually the relative path) to the absolute path. Returns
+    key -> (success, content or error message), preserving the input order.
+    """
+    def read_one(path: str) -> Tuple[bool, str]:
+        try:
+            return True, reader(path)
+        except Exception as e:
+            return False, str(e)
+
+    keys = list(paths.keys())
+    if len(keys) <= 1:
+        return {key: read_one(paths[key]) for key in keys}
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(read_one, (paths[key] for key in keys))
+        return dict(zip(keys, results))
@@ -0,0 +1,205 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from history import HISTORY_DIR_NAME
+
+USAGE_DB_NAME = "usage.db"
+
+# USD per million tokens: input, output, cache write, cache read
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20241022": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 1.00, 0.08),
+    "claude-3-opus-20240229": (15.00, 75.00, 18.75, 1.50),
+}
+GROUP_BY_COLUMNS = {
+    "context": "COALESCE(i.context, '')",
+    "day": "i.day",
+    "mode": "i.mode",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instructions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    day TEXT NOT NULL,
+    project TEXT,
+    context TEXT,
+    mode TEXT NOT NULL,
+    instruction TEXT NOT NULL,
+    model TEXT,
+    outcome TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_creation_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instructions_day ON instructions(day);
+CREATE INDEX IF NOT EXISTS instructions_context ON instructions(context);
+CREATE TABLE IF NOT EXISTS instruction_files (
+    instruction_id INTEGER NOT NULL REFERENCES instructions(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    input_tokens REAL NOT NULL,
+    output_tokens REAL NOT NULL,
+    changed INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instruction_files_path ON instruction_files(path);
+CREATE INDEX IF NOT EXISTS instruction_files_instruction ON instruction_files(instruction_id);
+"""
+# Ledgers written before instructions had a project column
+PROJECT_COLUMN = """
+ALTER TABLE instructions ADD COLUMN project TEXT;
+"""
+PROJECT_INDEX = """
+CREATE INDEX IF NOT EXISTS instructions_project ON instructions(project, timestamp);
+"""
+
+def request_cost(model: Optional[str], input_tokens: int, output_tokens: int,
+                 cache_creation_tokens: int = 0, cache_read_tokens: int = 0) -> float:
+    """Cost in USD of one request, 0 for models missing from MODEL_PRICES."""
+    prices = MODEL_PRICES.get(model or '')
+    if not prices:
+        return 0.0
+    tokens = (input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens)
+    return sum(count * price for count, price in zip(tokens, prices)) / 1_000_000
+
+def sum_usage(usages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up the usage records of the requests made for one instruction."""
+    total = {
+        "model": usages[0]["model"] if usages else None,
+        "requests": len(usages),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_tokens": 0,
+        "cache_read_tokens": 0,
+        "latency": 0.0,
+        "cost": 0.0,
+    }
+    for usage in usages:
+        for key in ("input_tokens", "output_tokens", "cache_creation_tokens", "cache_read_tokens", "latency"):
+            total[key] += usage.get(key) or 0
+        total["cost"] += request_cost(usage.get("model"), usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                                      usage.get("cache_creation_tokens", 0), usage.get("cache_read_tokens", 0))
+    return total
+
+class UsageLedger:
+    """SQLite ledger of token usage, latency and cost per instruction and file.
+
+    The billed input tokens of an instruction are attributed to the files in
+    its prompt in proportion to their estimated token counts, and output
+    tokens to the files it changed in proportion to their new sizes.
+    One ledger is shared by all projects; every instruction records the id
+    of its project and the queries take the project to report on.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(instructions)")}
+        if "project" not in columns:
+            self._conn.executescript(PROJECT_COLUMN)
+        self._conn.executescript(PROJECT_INDEX)
+
+    def record(self, instruction: str, mode: str, outcome: str, usages: List[Dict[str, Any]],
+               prompt_tokens: Optional[Dict[str, int]] = None, changed: Optional[Dict[str, int]] = None,
+               context: Optional[str] = None, project: Optional[str] = None) -> int:
+        """Store one instruction of a project (its id, see filemanager.project_id).
+
+        prompt_tokens maps each file sent to its estimated token count,
+        changed maps each written file to its new size in bytes.
+        """
+        total = sum_usage(usages)
+        prompt_tokens = prompt_tokens or {}
+        changed = changed or {}
+        now = time.time()
+        prompt_total = sum(prompt_tokens.values())
+        changed_total = sum(changed.values())
+
+        rows = []
+        for path in list(prompt_tokens) + [p for p in changed if p not in prompt_tokens]:
+            share_in = prompt_tokens.get(path, 0) / prompt_total if prompt_total else 0.0
+            share_out = changed.get(path, 0) / changed_total if changed_total else 0.0
+            input_tokens = total["input_tokens"] * share_in
+            output_tokens = total["output_tokens"] * share_out
+            cost = request_cost(total["model"], input_tokens, output_tokens)
+            rows.append((path, prompt_tokens.get(path, 0), input_tokens, output_tokens, int(path in changed), cost))
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO instructions (timestamp, day, project, context, mode, instruction, model, outcome, requests,
+                       input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens, latency, cost)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (now, datetime.fromtimestamp(now).date().isoformat(), project, context, mode, instruction, total["model"],
+                 outcome, total["requests"], total["input_tokens"], total["output_tokens"],
+                 total["cache_creation_tokens"], total["cache_read_tokens"], total["latency"], total["cost"])
+            )
+            instruction_id = cursor.lastrowid
+            self._conn.executemany(
+                """INSERT INTO instruction_files (instruction_id, path, prompt_tokens, input_tokens,
+                       output_tokens, changed, cost) VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(instruction_id,) + row for row in rows]
+            )
+        return instruction_id
+
+    def summary(self, project: Optional[str], group_by: str = "context", since: Optional[float] = None,
+                limit: int = 50) -> List[Dict[str, Any]]:
+        """Aggregate a project's usage by context, day, mode or file, most expensive first (days in order)."""
+        params: List[Any] = [project, since or 0]
+        if group_by == "file":
+            query = """SELECT f.path AS key, COUNT(*) AS instructions, SUM(f.changed) AS changes,
+                              SUM(f.prompt_tokens) AS prompt_tokens, SUM(f.input_tokens) AS input_tokens,
+                              SUM(f.output_tokens) AS output_tokens, SUM(f.cost) AS cost,
+                              AVG(i.latency) AS avg_latency
+                       FROM instruction_files f JOIN instructions i ON i.id = f.instruction_id
+                       WHERE i.project IS ? AND i.timestamp >= ? GROUP BY f.path ORDER BY cost DESC, prompt_tokens DESC LIMIT ?"""
+        elif group_by in GROUP_BY_COLUMNS:
+            order = "key" if group_by == "day" else "cost DESC"
+            query = f"""SELECT {GROUP_BY_COLUMNS[group_by]} AS key, COUNT(*) AS instructions,
+                               SUM(i.requests) AS requests, SUM(i.input_tokens) AS input_tokens,
+                               SUM(i.output_tokens) AS output_tokens,
+                               SUM(i.cache_creation_tokens) AS cache_creation_tokens,
+                               SUM(i.cache_read_tokens) AS cache_read_tokens, SUM(i.cost) AS cost,
+                               AVG(i.latency) AS avg_latency, MAX(i.latency) AS max_latency
+                        FROM instructions i WHERE i.project IS ? AND i.timestamp >= ?
+                        GROUP BY key ORDER BY {order} LIMIT ?"""
+        else:
+            raise ValueError(f"Cannot group usage by '{group_by}'")
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params)]
+
+    def recent(self, project: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
+        """A project's latest instructions with their per-file attribution."""
+        with self._lock:
+            instructions = [dict(row) for row in self._conn.execute(
+                "SELECT * FROM instructions WHERE project IS ? ORDER BY id DESC LIMIT ?", (project, limit))]
+            for instruction in instructions:
+                instruction["files"] = [dict(row) for row in self._conn.execute(
+                    """SELECT path, prompt_tokens, input_tokens, output_tokens, changed, cost
+                       FROM instruction_files WHERE instruction_id = ? ORDER BY input_tokens DESC""",
+                    (instruction["id"],))]
+        return instructions
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+def get_usage_ledger() -> UsageLedger:
+    """Get the shared ledger, stored next to the change history."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(Path.home() / HISTORY_DIR_NAME / USAGE_DB_NAME)
+        return _ledger
@@ -0,0 +1,281 @@
+import ast
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', '2'))
+# Send files that fail validation back to the model once before giving up
+VALIDATION_RETRY = os.getenv('VALIDATION_RETRY', 'true').lower() in ('true', '1', 'yes')
+VALIDATION_CACHE_SIZE = 1024
+
+# Elements whose end tag may be omitted (or that have none)
+HTML_OPTIONAL_END = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+    "p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot", "option", "optgroup", "colgroup",
+    "caption", "rt", "rp", "html", "head", "body",
+}
+BRACKETS = {")": "(", "]": "[", "}": "{"}
+# After these a "/" starts a regular expression literal rather than a division
+JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+# Checks done by the real parser: their failures are certain and block the write. The
+# HTML, CSS and JavaScript checks are heuristics, whose findings are only warnings.
+BLOCKING_CHECKS = {".py", ".json"}
+
+def check_python(content: str, filename: str) -> List[str]:
+    try:
+        ast.parse(content, filename=filename)
+    except SyntaxError as e:
+        return [f"line {e.lineno}: {e.msg}"]
+    except ValueError as e:  # Null bytes
+        return [str(e)]
+    return []
+
+def check_json(content: str, filename: str) -> List[str]:
+    try:
+        json.loads(content)
+    except ValueError as e:
+        return [str(e)]
+    return []
+
+class TagBalanceParser(HTMLParser):
+    """Report end tags without a start tag and elements left open."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.open_tags: List[Tuple[str, int]] = []
+        self.errors: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in HTML_OPTIONAL_END:
+            self.open_tags.append((tag, self.getpos()[0]))
+
+    def handle_endtag(self, tag):
+        if tag in HTML_OPTIONAL_END:
+            return
+        for i in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[i][0] == tag:
+                for unclosed, line in self.open_tags[i + 1:]:
+                    self.errors.append(f"line {line}: <{unclosed}> is not closed before </{tag}>")
+                del self.open_tags[i:]
+                return
+        self.errors.append(f"line {self.getpos()[0]}: </{tag}> has no matching start tag")
+
+def check_html(content: str, filename: str) -> List[str]:
+    parser = TagBalanceParser()
+    parser.feed(content)
+    parser.close()
+    return parser.errors + [f"line {line}: <{tag}> is never closed" for tag, line in parser.open_tags]
+
+def check_brackets(content: str, javascript: bool = False) -> List[str]:
+    """Check that brackets balance and strings and comments are terminated.
+
+    A scanner, not a parser: it skips string, template and comment bodies
+    (and, for JavaScript, regular expression literals) and tracks ( [ {.
+    """
+    stack: List[Tuple[str, int]] = []  # Open bracket and its line; "`" marks a template's ${
+    line = 1
+    previous = ""  # Last significant character, to tell a regex from a division
+    i, length = 0, len(content)
+    quotes = "'\"`" if javascript else "'\""
+
+    def skip_string(start: int, quote: str) -> int:
+        nonlocal line
+        j = start + 1
+        while j < length:
+            char = content[j]
+            if char == "\\":
+                j += 2
+                continue
+            if char == "\n":
+                if quote != "`":
+                    return -1
+                line += 1
+            if char == quote:
+                return j + 1
+            if quote == "`" and content.startswith("${", j):
+                return -(j + 2)  # Caller continues inside the template expression
+            j += 1
+        return -1
+
+    while i < length:
+        char = content[i]
+        if char == "\n":
+            line += 1
+        elif content.startswith("/*", i):
+            end = content.find("*/", i + 2)
+            if end < 0:
+                return [f"line {line}: unterminated comment"]
+            line += content.count("\n", i, end)
+            i = end + 2
+            continue
+        elif javascript and content.startswith("//", i):
+            end = content.find("\n", i)
+            i = length if end < 0 else end
+            continue
+        elif char in quotes or (char == "}" and stack and stack[-1][0] == "`"):
+            if char == "}":  # End of a template's ${...}: resume the template string
+                stack.pop()
+                char = "`"
+            start_line = line
+            end = skip_string(i, char)
+            if end == -1:
+                return [f"line {start_line}: unterminated string"]
+            if end < 0:
+                stack.append(("`", line))
+                i = -end
+                previous = "{"
+                continue
+            i = end
+            previous = "a"  # A string is an operand
+            continue
+        elif javascript and char == "/" and previous in JS_REGEX_PRECEDERS:
+            j, in_class = i + 1, False
+            while j < length and content[j] != "\n":
+                if content[j] == "\\":
+                    j += 1
+                elif content[j] == "[":
+                    in_class = True
+                elif content[j] == "]":
+                    in_class = False
+                elif content[j] == "/" and not in_class:
+                    break
+                j += 1
+            if j >= length or content[j] != "/":
+                return [f"line {line}: unterminated regular expression"]
+            i = j + 1
+            previous = "a"
+            continue
+        elif javascript and char in "+-" and content.startswith(char * 2, i):
+            i += 2  # a++ / 2 divides: ++ and -- end an operand
+            previous = "a"
+            continue
+        elif char in "([{":
+            stack.append((char, line))
+        elif char in BRACKETS:
+            if not stack or stack[-1][0] != BRACKETS[char]:
+                return [f"line {line}: unexpected '{char}'"]
+            stack.pop()
+        if not char.isspace():
+            # Identifiers and keywords end like operands, which is all the regex check needs
+            previous = "a" if (char.isalnum() or char in "_$)]") else char
+            if javascript and char.isalpha():
+                word_start = i
+                while i + 1 < length and (content[i + 1].isalnum() or content[i + 1] in "_$"):
+                    i += 1
+                # After these keywords a "/" starts a regex: return /x/, typeof /x/
+                if content[word_start:i + 1] in ("return", "typeof", "case", "in", "of", "yield", "void"):
+                    previous = ""
+        i += 1
+
+    if stack:
+        bracket, open_line = stack[-1]
+        what = "template expression" if bracket == "`" else f"'{bracket}'"
+        return [f"line {open_line}: {what} is never closed"]
+    return []
+
+def check_css(content: str, filename: str) -> List[str]:
+    return check_brackets(content)
+
+def check_javascript(content: str, filename: str) -> List[str]:
+    return check_brackets(content, javascript=True)
+
+CHECKERS = {
+    ".py": check_python,
+    ".json": check_json,
+    ".html": check_html,
+    ".htm": check_html,
+    ".css": check_css,
+    ".js": check_javascript,
+    ".mjs": check_javascript,
+}
+
+def check_file(filename: str, content: str) -> List[str]:
+    """Errors found in one file, empty when it is valid or has no checker."""
+    checker = CHECKERS.get(PurePosixPath(filename).suffix.lower())
+    if checker is None:
+        return []
+    try:
+        return checker(content, filename)
+    except Exception:  # A checker bug (or a file too deeply nested to check) must not block the write
+        return []
+
+class Validator:
+    """Check generated files before they are written.
+
+    Files are checked in a process pool (the checks are CPU bound and hold
+    the GIL), and results are cached by content hash, so a file the model
+    returns unchanged, or that a retry left untouched, is not checked again.
+    """
+
+    def __init__(self, max_workers: int = VALIDATION_WORKERS, cache_size: int = VALIDATION_CACHE_SIZE):
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def validate(self, changes: Dict[str, str]) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """Errors and warnings per file, only for the files that have some.
+
+        Errors come from the BLOCKING_CHECKS, warnings from the heuristic ones.
+        """
+        keys = {filename: self._cache_key(filename, content) for filename, content in changes.items()
+                if PurePosixPath(filename).suffix.lower() in CHECKERS}
+        results = {}
+        pending = []
+        with self._lock:
+            for filename, key in keys.items():
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[filename] = self._cache[key]
+                else:
+                    pending.append(filename)
+
+        if len(pending) == 1 or (pending and self.max_workers <= 1):
+            checked = [check_file(filename, changes[filename]) for filename in pending]
+        elif pending:
+            checked = list(self._get_pool().map(check_file, pending, [changes[f] for f in pending]))
+        else:
+            checked = []
+
+        with self._lock:
+            for filename, errors in zip(pending, checked):
+                results[filename] = errors
+                self._cache[keys[filename]] = errors
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        errors = {filename: found for filename, found in results.items()
+                  if found and PurePosixPath(filename).suffix.lower() in BLOCKING_CHECKS}
+        warnings = {filename: found for filename, found in results.items() if found and filename not in errors}
+        return errors, warnings
+
+    @staticmethod
+    def _cache_key(filename: str, content: str) -> str:
+        # The extension picks the checker, so it is part of the key
+        digest = hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+        return f"{PurePosixPath(filename).suffix.lower()}:{digest}"
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+def format_errors(errors: Dict[str, List[str]]) -> str:
+    return "\n".join(f"{filename}: {error}" for filename, file_errors in errors.items() for error in file_errors)
+
+_validator: Optional[Validator] = None
+_validator_lock = threading.Lock()
+
+def get_validator() -> Validator:
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            _validator = Validator()
+        return _validator
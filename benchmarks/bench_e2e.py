@@ -0,0 +1,221 @@
+"""
+Offline end-to-end benchmark of the designer API.
+
+Builds synthetic managed projects of several sizes and drives the real
+FastAPI app in-process (TestClient) with the LLM behind an offline
+transport, so no network or API key is needed:
+
+  * GET  /api/files
+  * GET  /api/file
+  * GET  /api/logs
+  * POST /api/process-user-instructions
+
+For every endpoint and project size it reports p50/p99 latency, throughput
+and the peak Python memory allocated (tracemalloc) while serving it.
+
+The LLM is the synthetic transport by default; pass --transport replay:DIR
+to replay responses recorded with LLM_TRANSPORT=record:DIR instead.
+Save a run with --json and pass it as --compare to a later run to flag
+regressions.
+
+Usage: python benchmarks/bench_e2e.py [--sizes 10,100,1000] [--iterations 50]
+                                      [--transport synthetic] [--latency 0]
+                                      [--json out.json] [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'appdesigner'
+sys.path.insert(0, str(APP_DIR))
+
+FILE_TEMPLATES = {
+    '.py': "def handler_{i}(request):\n    '''Handle request {i}.'''\n    return {{'status': 'ok', 'id': {i}}}\n\n" * 8,
+    '.js': "function render{i}(el) {{\n    el.textContent = 'item {i}';\n    return el;\n}}\n\n" * 8,
+    '.css': ".item-{i} {{\n    color: #333;\n    padding: {i}px;\n}}\n\n" * 8,
+    '.html': "<div class=\"item-{i}\">\n  <span>Item {i}</span>\n</div>\n" * 8,
+}
+LOG_LINE = 'INFO:     127.0.0.1:50000 - "GET /api/items HTTP/1.1" 200 OK'
+
+def build_project(root: Path, files: int) -> List[str]:
+    """Create a project with files spread over nested directories. Returns their paths."""
+    paths = []
+    extensions = list(FILE_TEMPLATES)
+    for i in range(files):
+        ext = extensions[i % len(extensions)]
+        rel = Path(f"pkg{i // 100:02d}") / f"mod{(i // 10) % 10}" / f"file{i:05d}{ext}"
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_text(FILE_TEMPLATES[ext].format(i=i), encoding='utf-8')
+        paths.append(rel.as_posix())
+    # Ignored content the walker must skip
+    (root / 'node_modules' / 'lib').mkdir(parents=True, exist_ok=True)
+    for i in range(files // 2):
+        (root / 'node_modules' / 'lib' / f"dep{i}.js").write_text("module.exports = {};\n")
+    return paths
+
+def write_app_logs(app_logs_dir: Path, stdout_lines: int, stderr_lines: int):
+    """Fill the managed app log stores the way the supervisor would."""
+    from logstore import LogStore
+    for stream, lines in (("stdout", stdout_lines), ("stderr", stderr_lines)):
+        store = LogStore(app_logs_dir, stream).open()
+        for _ in range(lines):
+            store.append(LOG_LINE)
+        store.close()
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def measure(call: Callable[[], None], iterations: int, memory_iterations: int) -> Dict[str, float]:
+    """Time iterations calls, then measure peak allocations over a few more."""
+    call()  # Warm up caches and lazy imports
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "throughput": iterations / elapsed,
+        "peak_kb": peak / 1024,
+    }
+
+def run(args) -> Dict[str, Dict[str, Dict[str, float]]]:
+    work_dir = Path(tempfile.mkdtemp(prefix="appdesigner_e2e_"))
+    logs_dir = work_dir / 'logs'
+    logs_dir.mkdir()
+    write_app_logs(work_dir / 'app_logs', args.log_lines, args.log_lines // 10)
+
+    # Everything the app reads from the environment must be set before importing it
+    os.environ['HOME'] = str(work_dir)  # Keeps the history and usage ledger out of the real home
+    os.environ['LOGS_DIR'] = str(logs_dir)
+    os.environ['APP_LOGS_DIR'] = str(work_dir / 'app_logs')
+    os.environ['LLM_TRANSPORT'] = args.transport
+    os.environ['MANAGED_APP_DIR'] = str(work_dir)
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'offline')
+
+    from fastapi.testclient import TestClient
+    import main
+    import api.agent
+    from transport import SyntheticTransport
+
+    # The per-instruction console output would dominate the timings
+    api.agent.console.quiet = True
+    agent = api.agent.get_agent()
+
+    if args.transport == 'synthetic':
+        agent.api_agent.transport = SyntheticTransport(first_token_latency=args.latency,
+                                                       tokens_per_second=args.tokens_per_second)
+    client = TestClient(main.app)
+    rng = random.Random(42)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    try:
+        for size in args.sizes:
+            project = work_dir / f"project_{size}"
+            paths = build_project(project, size)
+            os.environ['MANAGED_APP_DIR'] = str(project)
+            agent.set_managed_directory(project)
+            print(f"\nProject with {size} files")
+            print(f"{'endpoint':<34} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KB':>10}")
+
+            def check(response):
+                if response.status_code != 200:
+                    raise RuntimeError(f"{response.request.url}: {response.status_code} {response.text[:200]}")
+
+            counter = iter(range(1, 1_000_000))
+            scenarios = {
+                "GET /api/files": lambda: check(client.get('/api/files')),
+                "GET /api/file": lambda: check(client.get('/api/file', params={'path': rng.choice(paths)})),
+                "GET /api/logs": lambda: check(client.get('/api/logs')),
+                "POST /api/process-user-instructions": lambda: check(client.post(
+                    '/api/process-user-instructions',
+                    json={
+                        'instruction': 'Add a comment',
+                        'counter': next(counter),
+                        'files': rng.sample(paths, min(args.instruction_files, len(paths))),
+                        'fanout': False,
+                    }
+                )),
+            }
+            results[str(size)] = {}
+            for name, call in scenarios.items():
+                # Keep the app's debug prints out of the report
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    stats = measure(call, args.iterations, args.memory_iterations)
+                results[str(size)][name] = stats
+                print(f"{name:<34} {stats['p50_ms']:9.2f} {stats['p99_ms']:9.2f} "
+                      f"{stats['throughput']:9.1f} {stats['peak_kb']:10.0f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"\nProjects kept in {work_dir}")
+    return results
+
+def compare(results, baseline_path: Path, tolerance: float) -> int:
+    """Print p50 changes against a saved run. Returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%})")
+    for size, endpoints in results.items():
+        for name, stats in endpoints.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            change = stats['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            flag = "REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            print(f"{size:>6} {name:<34} {before['p50_ms']:9.2f} -> {stats['p50_ms']:9.2f} ms {change:+7.1%} {flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000',
+                        type=lambda s: [int(x) for x in s.split(',') if x])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--memory-iterations', type=int, default=5)
+    parser.add_argument('--transport', default='synthetic', help="synthetic or replay:DIR")
+    parser.add_argument('--latency', type=float, default=0.0, help="Synthetic time to first token (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="Synthetic output rate, 0 is instant")
+    parser.add_argument('--instruction-files', type=int, default=5)
+    parser.add_argument('--log-lines', type=int, default=10_000)
+    parser.add_argument('--json', type=Path, help="Write the results here")
+    parser.add_argument('--compare', type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p50 slowdown before flagging")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated projects")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
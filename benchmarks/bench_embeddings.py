@@ -0,0 +1,102 @@
+"""
+Benchmark the embedding index at scale.
+
+Builds a synthetic managed directory whose files split into --chunks chunks
+(one chunk per file, identifiers drawn from a few hundred topic vocabularies)
+and reports:
+
+  * the time of the initial build and of an incremental refresh after
+    --edit files changed
+  * the size of the vectors file and the peak RSS of the process
+  * the median query time with the inverted file and with a full scan,
+    and the recall of the inverted file against the full scan
+
+Usage: python benchmarks/bench_embeddings.py [--chunks 100000] [--queries 50] [--edit 100]
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'appdesigner'))
+
+import embeddings  # noqa: E402
+
+TOPICS = 300
+WORDS_PER_TOPIC = 12
+
+def build_tree(root: Path, chunks: int, vocabularies):
+    rng = random.Random(0)
+    for i in range(chunks):
+        topic = vocabularies[i % TOPICS]
+        lines = []
+        for j in range(12):
+            a, b, c = rng.sample(topic, 3)
+            lines.append(f"def {a}_{b}_{j}(request):\n    return {c}(request)  # {a} {c}")
+        directory = root / f"pkg{i // 1000:03d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"mod{i:06d}.py").write_text("\n".join(lines) + "\n")
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--edit', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabularies = [[f"t{topic}w{word}" for word in range(WORDS_PER_TOPIC)] for topic in range(TOPICS)]
+    root = Path(tempfile.mkdtemp(prefix="bench_embeddings_"))
+    try:
+        build_tree(root / 'app', args.chunks, vocabularies)
+        index = embeddings.EmbeddingIndex(root / 'app', index_dir=root / 'index')
+
+        start = time.perf_counter()
+        index.refresh(force=True)
+        print(f"Initial build: {time.perf_counter() - start:8.2f} s  {index.stats()}")
+        print(f"Vectors file:  {os.path.getsize(index.vectors_file) / 2**20:8.1f} MB, "
+              f"peak RSS {peak_rss_mb():.0f} MB")
+
+        for i in rng.sample(range(args.chunks), args.edit):
+            path = root / 'app' / f"pkg{i // 1000:03d}" / f"mod{i:06d}.py"
+            path.write_text(path.read_text() + f"# edited {i}\n")
+        start = time.perf_counter()
+        embedded = index.refresh(force=True)
+        print(f"Refresh after editing {args.edit} files: {time.perf_counter() - start:.2f} s, "
+              f"{embedded} chunks embedded")
+
+        queries = [" ".join(rng.sample(vocabularies[rng.randrange(TOPICS)], 3)) for _ in range(args.queries)]
+        index.search(queries[0])  # Page the vectors in
+
+        def timed_queries():
+            times, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                results.append({(r["path"], r["start_line"]) for r in index.search(query, limit=10)})
+                times.append(time.perf_counter() - start)
+            return statistics.median(times) * 1000, results
+
+        ivf_time, ivf_results = timed_queries()
+        lists = index._lists
+        index._lists = []  # Full scan
+        exact_time, exact_results = timed_queries()
+        index._lists = lists
+        recall = statistics.mean(len(a & b) / max(len(b), 1) for a, b in zip(ivf_results, exact_results))
+        print(f"Query, inverted file ({embeddings.IVF_NPROBE} of {len(lists)} clusters): {ivf_time:7.2f} ms")
+        print(f"Query, full scan:                        {exact_time:7.2f} ms")
+        print(f"Recall@10 of the inverted file: {recall:.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark the paginated directory listing against the full one.
+
+Builds a single directory with --files text files and times, each over
+--repeat runs:
+
+  * scan_directory (GET /api/files without limit), cold and warm
+  * the first page of DirectoryListings (GET /api/files?limit=200), cold and warm
+  * one filtered page (q=...) from the cached names
+
+Cold runs drop the listing and token caches first.
+
+Usage: python benchmarks/bench_listing.py [--files 20000] [--repeat 5] [--page 200]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'appdesigner'
+sys.path.insert(0, str(APP_DIR))
+os.chdir(APP_DIR)  # api modules load templates and settings relative to it
+
+import listing  # noqa: E402
+from contextcache import release_context_resolver  # noqa: E402
+from api.filemanager import scan_directory  # noqa: E402
+
+def timed(label: str, func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times) * 1000
+    print(f"{label:<40} {median:9.2f} ms")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--page', type=int, default=200)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_listing_"))
+    try:
+        big = root / 'big'
+        big.mkdir()
+        for i in range(args.files):
+            (big / f"module_{i:06d}.py").write_text(f"def handler_{i}(request):\n    return {i}\n")
+        print(f"Directory: {args.files:,} files")
+
+        def cold(func):
+            def run():
+                release_context_resolver(root)
+                listing.release_directory_listings(root)
+                func()
+            return run
+
+        def full():
+            scan_directory(root, 'big')
+
+        def first_page():
+            listings = listing.get_directory_listings(root)
+            listings.add_tokens(listings.page('big', args.page))
+
+        def filtered():
+            listings = listing.get_directory_listings(root)
+            listings.add_tokens(listings.page('big', args.page, query="_0123"))
+
+        timed("full listing (cold)", cold(full), args.repeat)
+        old = timed("full listing (warm)", full, args.repeat)
+        timed(f"first page of {args.page} (cold)", cold(first_page), args.repeat)
+        new = timed(f"first page of {args.page} (warm)", first_page, args.repeat)
+        timed("filtered page (warm)", filtered, args.repeat)
+        print(f"Warm first page vs full listing: {old / new:.0f}x faster")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
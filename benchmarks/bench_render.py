@@ -0,0 +1,86 @@
+"""
+Benchmark query response rendering against the old per-call markdown().
+
+Builds a long answer (sections with prose, lists, tables and code blocks in
+several languages) and times, each over --repeat runs:
+
+  * markdown(..., extensions=['fenced_code', 'tables', 'codehilite']) per call
+  * render_markdown, warm but not memoized
+  * render_markdown, memoized (the same answer rendered again)
+  * IncrementalRenderer.finish() after the answer was streamed in chunks
+
+Usage: python benchmarks/bench_render.py [--sections 30] [--repeat 5] [--chunk 40]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'appdesigner'))
+
+import render  # noqa: E402
+
+LANGUAGES = ["python", "javascript", "html", "css", "bash", "json", ""]
+
+def build_answer(sections: int) -> str:
+    parts = ["# Analysis\n\nWhat the code does, with **bold** text and `inline` code.\n"]
+    for i in range(sections):
+        lang = LANGUAGES[i % len(LANGUAGES)]
+        code = "\n".join(f"def handler_{i}_{j}(request):\n    return {{'status': 'ok', 'n': {j}}}  # comment"
+                         for j in range(6))
+        parts.append(
+            f"## Step {i}\n\nSome text explaining step {i}, with a [link](http://example.com/{i}).\n\n"
+            f"- first point\n- second point\n  continued\n\n1. one\n2. two\n\n"
+            f"```{lang}\n{code}\n```\n\n| name | value |\n|------|-------|\n| a | 1 |\n| b | 2 |\n"
+        )
+    return "\n".join(parts)
+
+def timed(label: str, func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times) * 1000
+    print(f"{label:<45} {median:9.2f} ms")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sections', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--chunk', type=int, default=40, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    from markdown import markdown
+    answer = build_answer(args.sections)
+    print(f"Answer: {len(answer):,} characters, {answer.count('```') // 2} code blocks")
+    # Warm both paths once so imports and lexer loading are not measured
+    markdown(answer, extensions=['fenced_code', 'tables', 'codehilite'])
+    render.render_markdown(answer)
+
+    def uncached():
+        render._cache.clear()
+        render.render_markdown(answer)
+
+    def streamed():
+        render._cache.clear()
+        renderer = render.IncrementalRenderer()
+        for i in range(0, len(answer), args.chunk):
+            renderer.feed(answer[i:i + args.chunk])
+        start = time.perf_counter()
+        renderer.finish()
+        return time.perf_counter() - start
+
+    old = timed("markdown() with codehilite", lambda: markdown(
+        answer, extensions=['fenced_code', 'tables', 'codehilite']), args.repeat)
+    timed("render_markdown (not memoized)", uncached, args.repeat)
+    timed("render_markdown (memoized)", lambda: render.render_markdown(answer), args.repeat)
+    finish = statistics.median(streamed() for _ in range(args.repeat)) * 1000
+    print(f"{'IncrementalRenderer.finish() after streaming':<45} {finish:9.2f} ms")
+    print(f"Render time left after the stream ends: {old / finish:.0f}x less")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure designer and CLI startup time.
+
+Runs each target in a fresh interpreter with -X importtime and reports the
+median wall time over several runs plus the slowest imports (cumulative),
+so import-time regressions show up before they slow down every --reload:
+
+  * app  - import main (the designer app, as uvicorn loads it)
+  * cli  - python -m appdesigner --help
+  * serve - uvicorn main:app from spawn until /health answers (with --serve)
+
+No API key is set, the app must start without one.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 15] [--serve]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / 'appdesigner'
+
+def clean_env(work_dir: Path) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k not in ('ANTHROPIC_API_KEY', 'LLM_TRANSPORT')}
+    env.update(HOME=str(work_dir), MANAGED_APP_DIR=str(ROOT / 'starter'), LOGS_DIR=str(work_dir))
+    return env
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """(self us, cumulative us, module) for every line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def run_target(args: List[str], cwd: Path, env: Dict[str, str]) -> Tuple[float, List[Tuple[int, int, str]]]:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, env=env,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+def time_to_health(env: Dict[str, str], port: int) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port),
+                                '--log-level', 'warning'], cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 30:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                time.sleep(0.01)
+        raise RuntimeError("uvicorn did not answer /health within 30s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def report(label: str, timings: List[float], imports: List[Tuple[int, int, str]], top: int):
+    print(f"\n{label}: median {statistics.median(timings) * 1000:.0f} ms "
+          f"(min {min(timings) * 1000:.0f}, max {max(timings) * 1000:.0f}, {len(timings)} runs)")
+    if not imports:
+        return
+    print(f"  {'cumulative ms':>13} {'self ms':>8}  module")
+    for self_us, cumulative_us, name in sorted(imports, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:13.1f} {self_us / 1000:8.1f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="Slowest imports to list")
+    parser.add_argument('--serve', action='store_true', help="Also time uvicorn until /health answers")
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="appdesigner_startup_") as work_dir:
+        env = clean_env(Path(work_dir))
+        targets = {
+            "app (import main)": (['-c', 'import main'], APP_DIR),
+            "cli (python -m appdesigner --help)": (['-m', 'appdesigner', '--help'], ROOT),
+        }
+        for label, (target, cwd) in targets.items():
+            timings, imports = [], []
+            for _ in range(args.runs):
+                elapsed, imports = run_target(target, cwd, env)
+                timings.append(elapsed)
+            report(label, timings, imports, args.top)
+
+        if args.serve:
+            timings = [time_to_health(env, args.port) for _ in range(args.runs)]
+            report("serve (uvicorn spawn to /health)", timings, [], args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark the ignore-aware tree walker against the old os.walk scan.
+
+Builds a synthetic managed directory (100k files by default, most of them in
+node_modules/.venv/__pycache__ like a real project) and times:
+
+  * os.walk over everything + serial reads (the previous get_managed_files)
+  * walk_tree with ignore pruning + parallel reads (the current one)
+
+Usage: python benchmarks/bench_treewalk.py [--files 100000] [--keep DIR]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'appdesigner'))
+
+from treewalk import walk_tree, read_files_parallel  # noqa: E402
+
+EXTENSIONS = ['.py', '.js', '.html', '.css', '.json', '.txt', '.md']
+FILE_BODY = "def handler(request):\n    return {'status': 'ok'}\n" * 4
+
+def build_tree(root: Path, total_files: int) -> None:
+    """Create a tree where ~30% of the files are project sources."""
+    layout = [
+        ('src', 0.30, '.py'),
+        ('node_modules', 0.50, '.js'),
+        ('.venv/lib/site-packages', 0.15, '.py'),
+        ('src/__pycache__', 0.05, '.pyc'),
+    ]
+    (root / '.gitignore').write_text("dist/\n*.log\n")
+    for prefix, share, suffix in layout:
+        count = int(total_files * share)
+        for i in range(count):
+            directory = root / prefix / f"pkg{i // 1000:03d}" / f"mod{(i // 50) % 20:02d}"
+            if i % 50 == 0:
+                directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"file{i:06d}{suffix}").write_text(FILE_BODY)
+
+def old_scan(root: Path) -> int:
+    """The previous implementation: os.walk everything, read serially."""
+    count = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = Path(dirpath) / name
+            if path.suffix in EXTENSIONS:
+                path.read_text(encoding='utf-8')
+                count += 1
+    return count
+
+def new_scan(root: Path) -> int:
+    paths = {
+        rel: entry.path
+        for rel, entry in walk_tree(root)
+        if os.path.splitext(entry.name)[1] in EXTENSIONS
+    }
+    results = read_files_parallel(paths, lambda p: Path(p).read_text(encoding='utf-8'))
+    return sum(1 for ok, _ in results.values() if ok)
+
+def timed(label: str, func, root: Path) -> float:
+    start = time.perf_counter()
+    count = func(root)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f}s  ({count} files read)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=100_000)
+    parser.add_argument('--keep', type=Path, help="Build (or reuse) the tree here instead of a temp dir")
+    args = parser.parse_args()
+
+    root = args.keep or Path(tempfile.mkdtemp(prefix="appdesigner_bench_"))
+    try:
+        if not (root / 'src').exists():
+            print(f"Building {args.files} files under {root} ...")
+            start = time.perf_counter()
+            build_tree(root, args.files)
+            print(f"Built in {time.perf_counter() - start:.1f}s")
+
+        old = timed("os.walk + serial reads", old_scan, root)
+        new = timed("walk_tree (pruned) + parallel reads", new_scan, root)
+        print(f"Speedup: {old / new:.1f}x")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Local stand-in for the Anthropic Messages API, for load tests.
+
+Serves POST /v1/messages (plain JSON and SSE streaming) with the responses
+of the synthetic transport: change prompts get a small edit of their first
+file, planning prompts a plan and questions a short markdown answer.
+Latency, output speed and error injection are configurable:
+
+  * --latency             seconds before the first token
+  * --tokens-per-second   streaming speed, 0 sends everything at once
+  * --rate-limit-rate     fraction of requests answered with 429
+  * --overload-rate       fraction of requests answered with 529
+
+Point the designer at it with ANTHROPIC_BASE_URL=http://127.0.0.1:PORT.
+
+Usage: python benchmarks/fake_anthropic.py [--port 8089] [--latency 1.0]
+                                           [--tokens-per-second 80]
+                                           [--rate-limit-rate 0] [--overload-rate 0]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'appdesigner'))
+
+from transport import SyntheticTransport  # noqa: E402
+
+class FakeAnthropicConfig:
+    def __init__(self, latency: float = 1.0, tokens_per_second: float = 80.0, chunk_chars: int = 40,
+                 rate_limit_rate: float = 0.0, overload_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_chars = chunk_chars
+        self.rate_limit_rate = rate_limit_rate
+        self.overload_rate = overload_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "overloaded": 0, "in_flight": 0,
+                      "max_in_flight": 0}
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def roll(self) -> Optional[int]:
+        """Pick an injected error status for the next request, if any."""
+        with self.lock:
+            value = self.random.random()
+        if value < self.rate_limit_rate:
+            return 429
+        if value < self.rate_limit_rate + self.overload_rate:
+            return 529
+        return None
+
+def make_handler(config: FakeAnthropicConfig):
+    synthetic = SyntheticTransport()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("request-id", f"req_{uuid.uuid4().hex[:24]}")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_event(self, event: str, data: Dict[str, Any]):
+            payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                with config.lock:
+                    self.send_json(200, dict(config.stats))
+            else:
+                self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.split('?')[0] != '/v1/messages':
+                self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found"}})
+                return
+            config.count("requests")
+            status = config.roll()
+            if status == 429:
+                config.count("rate_limited")
+                self.send_json(429, {"type": "error", "error": {"type": "rate_limit_error",
+                                                                 "message": "Injected rate limit"}},
+                               {"retry-after": "1"})
+                return
+            if status == 529:
+                config.count("overloaded")
+                self.send_json(529, {"type": "error", "error": {"type": "overloaded_error",
+                                                                 "message": "Injected overload"}})
+                return
+
+            prompt = "".join(
+                block if isinstance(block, str) else block.get("text", "")
+                for message in body.get("messages", [])
+                for block in ([message["content"]] if isinstance(message["content"], str) else message["content"])
+            )
+            system = body.get("system") or ""
+            if isinstance(system, list):
+                system = "".join(block.get("text", "") for block in system)
+            text = synthetic.respond(prompt)
+            usage = {"input_tokens": (len(system) + len(prompt)) // 4, "output_tokens": len(text) // 4}
+
+            config.count("in_flight")
+            try:
+                time.sleep(config.latency)
+                if body.get("stream"):
+                    config.count("streamed")
+                    self.stream(body, text, usage)
+                else:
+                    if config.tokens_per_second:
+                        time.sleep(usage["output_tokens"] / config.tokens_per_second)
+                    self.send_json(200, self.message(body, text, usage))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                config.count("in_flight", -1)
+
+        def message(self, body: Dict[str, Any], text: str, usage: Dict[str, int]) -> Dict[str, Any]:
+            return {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": usage,
+            }
+
+        def stream(self, body: Dict[str, Any], text: str, usage: Dict[str, int]):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            start = self.message(body, "", dict(usage, output_tokens=1))
+            start["content"] = []
+            start["stop_reason"] = None
+            self.send_event("message_start", {"type": "message_start", "message": start})
+            self.send_event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                    "content_block": {"type": "text", "text": ""}})
+            for i in range(0, len(text), config.chunk_chars):
+                chunk = text[i:i + config.chunk_chars]
+                if config.tokens_per_second:
+                    time.sleep(len(chunk) / 4 / config.tokens_per_second)
+                self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                        "delta": {"type": "text_delta", "text": chunk}})
+            self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self.send_event("message_delta", {"type": "message_delta",
+                                              "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                              "usage": {"output_tokens": usage["output_tokens"]}})
+            self.send_event("message_stop", {"type": "message_stop"})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+def start_server(port: int = 0, config: Optional[FakeAnthropicConfig] = None) -> ThreadingHTTPServer:
+    """Start the fake API on a background thread. Port 0 picks a free one (see server.server_port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config or FakeAnthropicConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-anthropic", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=1.0)
+    parser.add_argument('--tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--overload-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    config = FakeAnthropicConfig(args.latency, args.tokens_per_second, rate_limit_rate=args.rate_limit_rate,
+                                 overload_rate=args.overload_rate, seed=args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"Fake Anthropic API on http://127.0.0.1:{args.port} (stats at /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Load test a designer process with simulated browser sessions.
+
+Each session follows the real UI traffic pattern:
+
+  * polls /api/logs once per second (script.js)
+  * loads the file tree and expands a few directories (filetree.js)
+  * opens files and submits instructions with a random think time between them
+
+Sessions are ramped through several concurrency levels; for each level the
+report gives throughput, p50/p95/p99 latency per endpoint, the error rate
+and the log poll rate the sessions actually achieved, followed by the
+saturation curve (throughput and p99 against sessions).
+
+By default a designer is started on a synthetic project with the LLM served
+by benchmarks/fake_anthropic.py, so no API key is used. Pass --url to load
+an already running designer instead.
+
+Usage: python benchmarks/loadtest.py [--sessions 1,5,10,25,50] [--duration 30]
+                                     [--think-time 20] [--llm-latency 2]
+                                     [--tokens-per-second 80] [--overload-rate 0]
+                                     [--url http://127.0.0.1:8000] [--json out.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_e2e import APP_DIR, build_project, percentile, write_app_logs  # noqa: E402
+from fake_anthropic import FakeAnthropicConfig, start_server  # noqa: E402
+
+LOG_POLL_INTERVAL = 1.0
+ENDPOINTS = ["GET /api/logs", "GET /api/files", "GET /api/file", "POST /api/process-user-instructions"]
+
+class Recorder:
+    """Collects (endpoint, latency, ok) samples of one concurrency level."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.log_polls = 0
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+            if ok and method == "POST":
+                # Overloaded instructions come back as 200 with an error flag
+                ok = not response.json().get('error')
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.samples[name].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[name] += 1
+        return response
+
+async def session(client: httpx.AsyncClient, recorder: Recorder, deadline: float, args, rng: random.Random):
+    """One simulated browser tab."""
+    async def poll_logs():
+        next_poll = time.monotonic()
+        while time.monotonic() < deadline:
+            await recorder.call(client, "GET /api/logs", "GET", "/api/logs")
+            recorder.log_polls += 1
+            # setInterval keeps a fixed rate; a slow response delays only the next tick
+            next_poll += LOG_POLL_INTERVAL
+            await asyncio.sleep(max(0.0, next_poll - time.monotonic()))
+
+    async def browse_and_instruct():
+        files: List[str] = []
+        response = await recorder.call(client, "GET /api/files", "GET", "/api/files")
+        directories = [item['path'] for item in (response.json() if response is not None and response.status_code == 200 else [])
+                       if item.get('type') == 'directory']
+        for directory in rng.sample(directories, min(args.expand, len(directories))):
+            response = await recorder.call(client, "GET /api/files", "GET", "/api/files", params={'path': directory})
+            if response is not None and response.status_code == 200:
+                for item in response.json():
+                    if item.get('type') == 'directory':
+                        sub = await recorder.call(client, "GET /api/files", "GET", "/api/files", params={'path': item['path']})
+                        if sub is not None and sub.status_code == 200:
+                            files.extend(i['path'] for i in sub.json() if i.get('type') == 'file')
+                    else:
+                        files.append(item['path'])
+        counter = 0
+        while files:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+            if time.monotonic() >= deadline:
+                return
+            selected = rng.sample(files, min(args.instruction_files, len(files)))
+            for path in selected[:2]:
+                await recorder.call(client, "GET /api/file", "GET", "/api/file", params={'path': path})
+            counter += 1
+            await recorder.call(client, "POST /api/process-user-instructions", "POST", "/api/process-user-instructions",
+                                json={'instruction': 'Add a comment', 'counter': counter, 'files': selected})
+
+    await asyncio.gather(poll_logs(), browse_and_instruct())
+
+async def run_level(url: str, sessions: int, args) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=sessions * 2 + 10, max_keepalive_connections=sessions * 2 + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        rng = random.Random(sessions)
+        # Stagger session starts over the first poll interval like tabs opened at different times
+        async def staggered(i: int):
+            await asyncio.sleep(rng.random() * LOG_POLL_INTERVAL)
+            await session(client, recorder, deadline, args, random.Random(i))
+        await asyncio.gather(*(staggered(i) for i in range(sessions)))
+        elapsed = time.monotonic() - started
+    return recorder, elapsed
+
+def summarize(sessions: int, recorder: Recorder, elapsed: float) -> Dict:
+    total = sum(len(v) for v in recorder.samples.values())
+    errors = sum(recorder.errors.values())
+    result = {
+        "sessions": sessions,
+        "requests": total,
+        "throughput": total / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "log_poll_hz": recorder.log_polls / elapsed / sessions,
+        "endpoints": {},
+    }
+    for name in ENDPOINTS:
+        latencies = recorder.samples.get(name)
+        if not latencies:
+            continue
+        result["endpoints"][name] = {
+            "count": len(latencies),
+            "errors": recorder.errors.get(name, 0),
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return result
+
+def print_level(result: Dict):
+    print(f"\n{result['sessions']} sessions: {result['throughput']:.1f} req/s, "
+          f"{result['error_rate']:.1%} errors, logs polled at {result['log_poll_hz']:.2f} Hz per session")
+    print(f"  {'endpoint':<36} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in result["endpoints"].items():
+        print(f"  {name:<36} {stats['count']:6d} {stats['errors']:6d} "
+              f"{stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+
+def print_curve(results: List[Dict], width: int = 40):
+    """ASCII saturation curves: throughput and worst p99 against sessions."""
+    print("\nSaturation curve")
+    max_throughput = max(r["throughput"] for r in results) or 1
+    worst = [max((s["p99_ms"] for s in r["endpoints"].values() if s), default=0) for r in results]
+    logs_p99 = [r["endpoints"].get("GET /api/logs", {}).get("p99_ms", 0) for r in results]
+    max_p99 = max(worst) or 1
+    print(f"  {'sessions':>8}  {'req/s':>7}  {'throughput':<{width}}  {'logs p99':>9}  {'worst p99':>9}  p99")
+    for result, p99, logs in zip(results, worst, logs_p99):
+        bar = '#' * int(width * result["throughput"] / max_throughput)
+        p99_bar = '*' * int(width * p99 / max_p99)
+        print(f"  {result['sessions']:8d}  {result['throughput']:7.1f}  {bar:<{width}}  {logs:9.0f}  {p99:9.0f}  {p99_bar}")
+
+def start_designer(args, work_dir: Path, llm_url: str) -> Tuple[subprocess.Popen, str]:
+    project = work_dir / "project"
+    build_project(project, args.files)
+    logs_dir = work_dir / "logs"
+    logs_dir.mkdir()
+    write_app_logs(work_dir / "app_logs", args.log_lines, 0)
+    env = dict(
+        os.environ,
+        MANAGED_APP_DIR=str(project),
+        LOGS_DIR=str(logs_dir),
+        APP_LOGS_DIR=str(work_dir / "app_logs"),
+        HOME=str(work_dir),
+        ANTHROPIC_API_KEY='load-test',
+        ANTHROPIC_BASE_URL=llm_url,
+        LLM_TRANSPORT='anthropic',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(args.port),
+         '--log-level', 'warning'],
+        cwd=APP_DIR, env=env, stdout=open(work_dir / 'designer.log', 'w'), stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError(f"Designer exited, see {work_dir / 'designer.log'}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Designer did not become healthy")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', default='1,5,10,25,50', type=lambda s: [int(x) for x in s.split(',') if x])
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds per concurrency level")
+    parser.add_argument('--think-time', type=float, default=20.0, help="Mean seconds between instructions")
+    parser.add_argument('--expand', type=int, default=3, help="Directories each session expands")
+    parser.add_argument('--instruction-files', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--url', help="Load this designer instead of starting one")
+    parser.add_argument('--port', type=int, default=8765, help="Port of the designer started by the test")
+    parser.add_argument('--files', type=int, default=500, help="Files in the synthetic project")
+    parser.add_argument('--log-lines', type=int, default=5000)
+    parser.add_argument('--llm-latency', type=float, default=2.0)
+    parser.add_argument('--tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--overload-rate', type=float, default=0.0)
+    parser.add_argument('--json', type=Path, help="Write the results here")
+    parser.add_argument('--keep', action='store_true', help="Keep the project and designer log")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="appdesigner_load_"))
+    designer = None
+    fake = None
+    try:
+        url = args.url
+        if not url:
+            config = FakeAnthropicConfig(args.llm_latency, args.tokens_per_second,
+                                         rate_limit_rate=args.rate_limit_rate, overload_rate=args.overload_rate)
+            fake = start_server(0, config)
+            designer, url = start_designer(args, work_dir, f"http://127.0.0.1:{fake.server_port}")
+            print(f"Designer on {url}, fake LLM on port {fake.server_port}")
+
+        results = []
+        for sessions in args.sessions:
+            recorder, elapsed = asyncio.run(run_level(url, sessions, args))
+            result = summarize(sessions, recorder, elapsed)
+            results.append(result)
+            print_level(result)
+        print_curve(results)
+        if fake:
+            print(f"\nFake LLM: {config.stats}")
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if designer:
+            designer.terminate()
+            designer.wait(timeout=10)
+        if fake:
+            fake.shutdown()
+        if args.keep:
+            print(f"Project and designer log kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()